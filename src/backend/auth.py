@@ -1,20 +1,87 @@
 """Authentication utilities for Rate Card Pro."""
 import time
 import os
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import jwt
-from passlib.hash import bcrypt
+from passlib.context import CryptContext
+
+import metrics
 
 SECRET = os.environ.get("RC_JWT_SECRET", "dev-secret-change-in-production")
 ALG = "HS256"
 TTL = 3600 * 8  # 8 hours
+TOKEN_CACHE_SIZE = int(os.environ.get("RC_TOKEN_CACHE_SIZE", "10000"))
+BCRYPT_ROUNDS = int(os.environ.get("RC_BCRYPT_ROUNDS", "12"))
+LOGIN_WORKERS = int(os.environ.get("RC_LOGIN_WORKERS", "2"))
+LOGIN_MAX_PENDING = int(os.environ.get("RC_LOGIN_MAX_PENDING", "32"))
+
+# min == max == default, so any hash with a different cost "needs update"
+# and is transparently rehashed on the next successful login.
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
 
 def hash_pw(password: str) -> str:
     """Hash a password using bcrypt."""
-    return bcrypt.hash(password)
+    return pwd_context.hash(password)
 
 def verify_pw(password: str, password_hash: str) -> bool:
     """Verify a password against a hash."""
-    return bcrypt.verify(password, password_hash)
+    return pwd_context.verify(password, password_hash)
+
+class LoginBusy(Exception):
+    """Raised when the login concurrency budget is exhausted."""
+
+class PasswordVerifier:
+    """Runs bcrypt on its own small thread pool with a bounded queue.
+
+    bcrypt releases the GIL, so a few dedicated threads keep a 9am login
+    burst off the request workers; once `max_pending` logins are queued,
+    further attempts fail fast with LoginBusy instead of piling up.
+    """
+
+    def __init__(self, workers=LOGIN_WORKERS, max_pending=LOGIN_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._slots = asyncio.Semaphore(max_pending)
+        self._executor = None
+
+    async def verify(self, password, password_hash):
+        """Return (ok, new_hash); new_hash is set when the cost changed."""
+        if self._slots.locked():
+            raise LoginBusy()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="rc-bcrypt"
+            )
+        async with self._slots:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executor, self._verify, password, password_hash
+            )
+
+    @staticmethod
+    def _verify(password, password_hash):
+        start = time.perf_counter()
+        try:
+            return pwd_context.verify_and_update(password, password_hash)
+        finally:
+            metrics.bcrypt_seconds.observe(time.perf_counter() - start)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self._slots = asyncio.Semaphore(self.max_pending)
+
+password_verifier = PasswordVerifier()
 
 def issue_jwt(email: str, role: str) -> str:
     """Issue a JWT token for a user."""
@@ -30,3 +97,82 @@ def issue_jwt(email: str, role: str) -> str:
 def decode_jwt(jwt_token: str) -> dict:
     """Decode and verify a JWT token."""
     return jwt.decode(jwt_token, SECRET, algorithms=[ALG])
+
+class TokenCache:
+    """Bounded LRU of already-verified tokens, keyed by SHA-256 of the token.
+
+    A hit skips the HS256 signature check but still honours `exp`. Revoked
+    tokens (logout) are remembered until they would have expired anyway.
+    """
+
+    def __init__(self, maxsize=TOKEN_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._verified = OrderedDict()
+        self._revoked = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token):
+        return hashlib.sha256(token.encode()).digest()
+
+    def verify(self, token):
+        """Return the token's claims, verifying the signature only on a miss."""
+        key = self._key(token)
+        now = time.time()
+        with self._lock:
+            if key in self._revoked:
+                raise jwt.InvalidTokenError("Token has been revoked")
+            cached = self._verified.get(key)
+            if cached is not None and cached["exp"] > now:
+                self._verified.move_to_end(key)
+                self.hits += 1
+                return cached
+            self._verified.pop(key, None)
+            self.misses += 1
+
+        claims = decode_jwt(token)
+        if "exp" not in claims:
+            # Never cache a token that would stay valid forever
+            return claims
+        with self._lock:
+            self._verified[key] = claims
+            if len(self._verified) > self.maxsize:
+                self._verified.popitem(last=False)
+        return claims
+
+    def revoke(self, token):
+        """Reject `token` from now on (logout)."""
+        key = self._key(token)
+        try:
+            exp = decode_jwt(token)["exp"]
+        except jwt.InvalidTokenError:
+            exp = time.time() + TTL
+        with self._lock:
+            self._verified.pop(key, None)
+            now = time.time()
+            for k in [k for k, e in self._revoked.items() if e <= now]:
+                del self._revoked[k]
+            self._revoked[key] = exp
+
+    def clear(self):
+        """Forget every verified token (e.g. after a secret rotation)."""
+        with self._lock:
+            self._verified.clear()
+
+    def stats(self):
+        return {"size": len(self._verified), "revoked": len(self._revoked),
+                "hits": self.hits, "misses": self.misses}
+
+token_cache = TokenCache()
+
+def verify_jwt(jwt_token: str) -> dict:
+    """Decode a JWT token, using the verified-token cache."""
+    return token_cache.verify(jwt_token)
+
+def rotate_secret(new_secret: str):
+    """Switch the signing secret; tokens signed with the old one stop working."""
+    global SECRET
+    SECRET = new_secret
+    token_cache.clear()
@@ -0,0 +1,886 @@
+"""Load benchmarks for the Rate Card Pro backend.
+
+Usage:
+    python bench.py pool [--requests 4000] [--threads 8]
+    python bench.py concurrency [--clients 500] [--rounds 4]
+    python bench.py plans
+    python bench.py pdf [--quotes 200]
+    python bench.py auth [--calls 100000]
+    python bench.py login [--logins 64] [--readers 50] [--cost 10]
+    python bench.py roles [--tiers 20000] [--queries 2000] [--limit 20]
+    python bench.py serialize [--items 1000] [--runs 200]
+    python bench.py mix [--users 50] [--requests 5000] [--out results.json] [--compare base.json]
+
+Each benchmark runs against throwaway SQLite files in a temp directory,
+so it never touches RC_DB_PATH.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+
+def _workdir(db_name):
+    """Point the backend at throwaway storage; call before importing it."""
+    workdir = tempfile.mkdtemp(prefix="rc-bench-")
+    os.environ["RC_DB_PATH"] = os.path.join(workdir, db_name)
+    os.environ["RC_PDF_CACHE_DIR"] = os.path.join(workdir, "pdf_cache")
+    return workdir
+
+
+def _seed(conn, n_requests=500, items_per_request=10, am_emails=("am@example.com",)):
+    """Insert request-shaped rows matching what POST /requests writes."""
+    cursor = conn.cursor()
+    for i in range(n_requests):
+        subtotal = 5000.0 * items_per_request
+        cursor.execute("""
+            INSERT INTO requests(name, project_code, client_name, am_email, state,
+                                 subtotal, tax, grand_total)
+            VALUES(?, ?, ?, ?, 'draft', ?, ?, ?)
+        """, (f"Quote {i}", f"PRJ-{i % 50}", f"Client {i % 20}", am_emails[i % len(am_emails)],
+              subtotal, subtotal * 0.12, subtotal * 1.12))
+        rid = cursor.lastrowid
+        cursor.executemany("""
+            INSERT INTO request_items(request_id, description, qty, rate, subtotal, position)
+            VALUES(?, ?, 1, 5000, 5000, ?)
+        """, [(rid, f"Line {j}", j) for j in range(items_per_request)])
+        cursor.execute("""
+            INSERT INTO approval_events(request_id, actor_email, action)
+            VALUES(?, 'am@example.com', 'create')
+        """, (rid,))
+    conn.commit()
+
+
+def _handle(conn, i, n_requests):
+    """One simulated request: 80% get_request reads, 20% review-style writes."""
+    rid = i % n_requests + 1
+    if i % 5:
+        conn.execute("SELECT * FROM requests WHERE id=?", (rid,)).fetchone()
+        conn.execute("SELECT * FROM request_items WHERE request_id=? ORDER BY position", (rid,)).fetchall()
+        conn.execute("SELECT * FROM approval_events WHERE request_id=? ORDER BY at DESC", (rid,)).fetchall()
+    else:
+        conn.execute("UPDATE requests SET updated_at=CURRENT_TIMESTAMP WHERE id=?", (rid,))
+        conn.execute("""
+            INSERT INTO approval_events(request_id, actor_email, action)
+            VALUES(?, 'fd@example.com', 'review')
+        """, (rid,))
+        conn.commit()
+
+
+def _run(label, checkout, checkin, total, threads, n_requests):
+    """Drive `total` simulated requests across `threads` workers."""
+    errors = []
+    counter = iter(range(total))
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            conn = checkout()
+            try:
+                _handle(conn, i, n_requests)
+            except sqlite3.OperationalError as e:
+                errors.append(str(e))
+            finally:
+                checkin(conn)
+
+    start = time.perf_counter()
+    pool_threads = [threading.Thread(target=worker) for _ in range(threads)]
+    for t in pool_threads:
+        t.start()
+    for t in pool_threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    print(f"{label:<28} {total / elapsed:>10.0f} req/s   errors={len(errors)}")
+    return total / elapsed
+
+
+def bench_pool(args):
+    """Compare connect-per-request (rollback journal) with the WAL pool."""
+    workdir = _workdir("pooled.sqlite")
+    import database
+
+    database.init_db()
+    with database.pool.connection() as conn:
+        _seed(conn)
+
+    # Baseline: the pre-pool behaviour, fresh connection + default journal.
+    baseline_path = os.path.join(workdir, "baseline.sqlite")
+    database.DB_PATH = baseline_path
+    database.init_db()
+    conn = sqlite3.connect(baseline_path)
+    conn.execute("PRAGMA journal_mode=DELETE")
+    _seed(conn)
+    conn.close()
+
+    def fresh_connection():
+        conn = sqlite3.connect(baseline_path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    before = _run("connect-per-request", fresh_connection, lambda c: c.close(),
+                  args.requests, args.threads, 500)
+    after = _run("pooled WAL connections", database.pool.acquire, database.pool.release,
+                 args.requests, args.threads, 500)
+    print(f"speedup: {after / before:.2f}x")
+    database.pool.close_all()
+
+
+async def asgi_request(app, method, path, headers=None, body=None):
+    """Call an ASGI app in-process and return (status, headers, body bytes)."""
+    path, _, query = path.partition("?")
+    raw = json.dumps(body).encode() if body is not None else b""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+                   + [(b"content-type", b"application/json"),
+                      (b"content-length", str(len(raw)).encode())],
+        "client": ("127.0.0.1", 0),
+        "server": ("testserver", 80),
+    }
+    sent = False
+    response = {"status": 500, "headers": [], "body": b""}
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": raw, "more_body": False}
+        await asyncio.sleep(3600)
+        return {"type": "http.disconnect"}
+
+    complete = asyncio.Event()
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = message.get("headers", [])
+        elif message["type"] == "http.response.body":
+            response["body"] += message.get("body", b"")
+            if not message.get("more_body"):
+                complete.set()
+
+    # Return once the response is complete, like a client would; background
+    # tasks (e.g. PDF pre-rendering after approve) keep running in the app.
+    task = asyncio.ensure_future(app(scope, receive, send))
+    _in_flight.add(task)
+    task.add_done_callback(_in_flight.discard)
+    waiter = asyncio.ensure_future(complete.wait())
+    await asyncio.wait({task, waiter}, return_when=asyncio.FIRST_COMPLETED)
+    waiter.cancel()
+    if task.done() and not complete.is_set():
+        task.result()  # re-raise an app error
+    return response["status"], response["headers"], response["body"]
+
+
+_in_flight = set()  # app calls still running background tasks
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def _sync_app():
+    """The pre-async handlers: sync `def` endpoints on the anyio threadpool,
+    each opening and closing its own connection."""
+    from fastapi import Depends, FastAPI
+    import main
+    from database import DB_PATH
+    from security import require
+
+    app = FastAPI()
+
+    def get_db():
+        # check_same_thread=False: FastAPI closes the dependency on another worker
+        conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @app.get("/requests")
+    def list_requests(claims=Depends(require()), conn=Depends(get_db)):
+        rows, _ = main._list_requests(conn, claims)
+        return rows
+
+    @app.get("/requests/{rid}")
+    def get_request(rid: int, claims=Depends(require()), conn=Depends(get_db)):
+        return main._get_request(conn, rid, claims)
+
+    @app.post("/requests")
+    def create_request(payload: main.RequestCreate, claims=Depends(require("AM")),
+                       conn=Depends(get_db)):
+        return main._create_request(conn, payload, claims)
+
+    return app
+
+
+async def _drive(app, clients, rounds, tokens, n_requests):
+    """Fire `clients` concurrent callers, `rounds` requests each."""
+    latencies = []
+    quote = {"name": "Bench quote", "items": [{"description": "Dev", "qty": 10, "rate": 6500}]}
+
+    async def client(c):
+        headers = {"Authorization": f"Bearer {tokens[c % len(tokens)]}"}
+        for r in range(rounds):
+            kind = (c + r) % 10
+            start = time.perf_counter()
+            if kind == 0:
+                status, _, _ = await asgi_request(app, "POST", "/requests", headers, quote)
+            elif kind < 4:
+                status, _, _ = await asgi_request(app, "GET", "/requests", headers)
+            else:
+                # Seeded quotes are dealt round-robin, so this one is ours.
+                rid = (c % len(tokens) + len(tokens) * r) % n_requests + 1
+                status, _, _ = await asgi_request(app, "GET", f"/requests/{rid}", headers)
+            latencies.append(time.perf_counter() - start)
+            assert status == 200, status
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(c) for c in range(clients)))
+    return time.perf_counter() - start, latencies
+
+
+def bench_concurrency(args):
+    """Compare p50/p99 latency of async handlers vs the old sync handlers."""
+    _workdir("concurrency.sqlite")
+    import database
+    import main
+    from auth import issue_jwt
+
+    am_emails = tuple(f"am{i}@example.com" for i in range(50))
+    database.init_db()
+    with database.pool.connection() as conn:
+        _seed(conn, n_requests=500, am_emails=am_emails)
+    tokens = [issue_jwt(email, "AM") for email in am_emails]
+
+    for label, app in (("sync def + threadpool", _sync_app()), ("async def + DB executor", main.app)):
+        elapsed, latencies = asyncio.run(_drive(app, args.clients, args.rounds, tokens, 500))
+        database.db_executor.shutdown()
+        print(f"{label:<26} {len(latencies) / elapsed:>8.0f} req/s   "
+              f"p50={_percentile(latencies, 50) * 1000:7.1f}ms   "
+              f"p99={_percentile(latencies, 99) * 1000:7.1f}ms")
+    database.pool.close_all()
+
+
+def _approve_all(conn):
+    """Mark every seeded request approved with a v1 snapshot."""
+    conn.execute("UPDATE requests SET state='approved', approval_version=1")
+    conn.execute("""
+        INSERT INTO approval_snapshot(request_id, version_no, locked_subtotal, locked_tax,
+                                      locked_grand_total, locked_currency)
+        SELECT id, 1, subtotal, tax, grand_total, currency FROM requests
+    """)
+    conn.commit()
+
+
+def _inline_pdf_app():
+    """The pre-pool PDF route: render inline on the anyio threadpool."""
+    from fastapi import FastAPI, Response
+    from database import pool
+    from pdf import render_quote
+    from storage import store
+
+    app = FastAPI()
+
+    @app.get("/healthz")
+    def health():
+        return {"status": "ok"}
+
+    @app.get("/pdf/{rid}")
+    def generate_pdf(rid: int):
+        with pool.connection() as conn:
+            request, items = store.load_quote(conn, rid)
+        content, media_type = render_quote(request, items)
+        return Response(content=content, media_type=media_type)
+
+    return app
+
+
+async def _render_burst(app, quotes):
+    """Request `quotes` PDFs at once while probing /healthz every 10ms."""
+    probes = []
+    done = asyncio.Event()
+
+    async def probe():
+        while not done.is_set():
+            start = time.perf_counter()
+            await asgi_request(app, "GET", "/healthz")
+            probes.append(time.perf_counter() - start)
+            await asyncio.sleep(0.01)
+
+    async def fetch(rid):
+        status, _, _ = await asgi_request(app, "GET", f"/pdf/{rid}")
+        assert status == 200, status
+
+    prober = asyncio.ensure_future(probe())
+    start = time.perf_counter()
+    await asyncio.gather(*(fetch(rid) for rid in range(1, quotes + 1)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await prober
+    return elapsed, probes
+
+
+def bench_pdf(args):
+    """Render N quotes concurrently: inline vs the worker process pool."""
+    _workdir("pdf.sqlite")
+    import database
+    import main
+    import pdf
+
+    database.init_db()
+    with database.pool.connection() as conn:
+        _seed(conn, n_requests=args.quotes, items_per_request=40)
+        _approve_all(conn)
+    try:
+        import weasyprint  # noqa: F401
+    except ImportError:
+        print("note: WeasyPrint not installed, timing the HTML fallback only")
+
+    for label, app in (("inline (threadpool)", _inline_pdf_app()), ("process pool", main.app)):
+        elapsed, probes = asyncio.run(_render_burst(app, args.quotes))
+        pdf.renderer.shutdown()
+        database.db_executor.shutdown()
+        print(f"{label:<22} {args.quotes / elapsed:>8.1f} renders/s   "
+              f"/healthz p99 during burst={_percentile(probes, 99) * 1000:7.1f}ms")
+    database.pool.close_all()
+
+
+def bench_auth(args):
+    """Per-request auth overhead: full HS256 verify vs the token cache."""
+    import auth
+    from security import require
+
+    token = auth.issue_jwt("fd@example.com", "FD")
+    header = f"Bearer {token}"
+    dependency = require("FD")
+
+    def timed(label, fn):
+        start = time.perf_counter()
+        for _ in range(args.calls):
+            fn()
+        per_call = (time.perf_counter() - start) / args.calls * 1e6
+        print(f"{label:<32} {per_call:8.2f} us/call")
+
+    async def through_dependency():
+        for _ in range(args.calls):
+            await dependency(header)
+
+    timed("decode_jwt (no cache)", lambda: auth.decode_jwt(token))
+    timed("verify_jwt (cached)", lambda: auth.verify_jwt(token))
+    start = time.perf_counter()
+    asyncio.run(through_dependency())
+    per_call = (time.perf_counter() - start) / args.calls * 1e6
+    print(f"{'require(FD) dependency':<32} {per_call:8.2f} us/call")
+    print(f"cache: {auth.token_cache.stats()}")
+
+
+def bench_roles(args):
+    """Typeahead latency on /roles: LIKE scan vs the in-memory index vs FTS5."""
+    _workdir("roles.sqlite")
+    import database
+    from catalog import RoleCatalog, enable_fts
+
+    database.init_db()
+    words = ("Junior", "Senior", "Lead", "Principal", "Staff", "Associate")
+    crafts = ("Developer", "Designer", "Engineer", "Analyst", "Manager", "Architect", "Writer")
+    with database.pool.connection() as conn:
+        conn.executemany(
+            "INSERT INTO role_tiers(name, hourly_rate) VALUES(?, ?)",
+            [(f"{words[i % 6]} {crafts[i // 6 % 7]} {i}", 1000 + i) for i in range(args.tiers)],
+        )
+        conn.commit()
+        enable_fts(conn)
+        memory, fts = RoleCatalog(backend="memory"), RoleCatalog(backend="fts5")
+        index = memory.load(conn)
+        fts.load(conn)
+
+        # What a picker sends while someone types "senior developer" and "architect"
+        keystrokes = ["senior developer"[:n] for n in range(1, 17)] + ["architect"[:n] for n in range(1, 10)]
+        queries = [keystrokes[i % len(keystrokes)] for i in range(args.queries)]
+
+        def timed(label, fn):
+            start = time.perf_counter()
+            for q in queries:
+                fn(q)
+            per_query = (time.perf_counter() - start) / len(queries) * 1e3
+            print(f"{label:<28} {per_query:8.3f} ms/query")
+
+        timed("LIKE '%q%' (old)", lambda q: conn.execute(
+            "SELECT * FROM role_tiers WHERE active=1 AND name LIKE ? ORDER BY name", (f"%{q}%",)
+        ).fetchall())
+        timed("in-memory index", lambda q: index.search(q, args.limit))
+        timed("fts5 (>=3 chars)", lambda q: fts.search_fts(conn, q, args.limit)
+              if fts.uses_fts(q) else fts.cached().search(q, args.limit))
+    database.pool.close_all()
+
+
+def bench_serialize(args):
+    """GET /requests/{id} on a large quote: encoding time and payload size."""
+    _workdir("serialize.sqlite")
+    import gzip
+    import database
+    import main
+    import responses
+    from auth import issue_jwt
+    from fastapi.encoders import jsonable_encoder
+
+    database.init_db()
+    with database.pool.connection() as conn:
+        _seed(conn, n_requests=1, items_per_request=args.items)
+        claims = {"sub": "am@example.com", "role": "AM"}
+
+        def legacy():
+            # The old path: sqlite3.Row -> dict copies -> jsonable_encoder -> stdlib json
+            request = conn.execute("SELECT * FROM requests WHERE id=1").fetchone()
+            items = conn.execute("SELECT * FROM request_items WHERE request_id=1 ORDER BY position").fetchall()
+            events = conn.execute("SELECT * FROM approval_events WHERE request_id=1 ORDER BY at DESC").fetchall()
+            content = {"request": dict(request), "items": [dict(i) for i in items],
+                       "events": [dict(e) for e in events]}
+            return json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False,
+                              separators=(",", ":")).encode()
+
+        def stdlib_json():
+            content = main._get_request(conn, 1, claims)
+            return json.dumps(content, separators=(",", ":")).encode()
+
+        def timed(label, fn):
+            fn()
+            start = time.perf_counter()
+            for _ in range(args.runs):
+                body = fn()
+            per_run = (time.perf_counter() - start) / args.runs * 1e3
+            print(f"{label:<40} {per_run:8.2f} ms {len(body):>9} bytes")
+            return body
+
+        body = timed("Row + jsonable_encoder + json (old)", legacy)
+        timed("dict_row + json", stdlib_json)
+        timed(f"dict_row + {'orjson' if responses.orjson else 'json'} (FastJSONResponse)",
+              lambda: responses.dumps(main._get_request(conn, 1, claims)))
+        timed(f"gzip level {responses.GZIP_LEVEL}",
+              lambda: gzip.compress(body, compresslevel=responses.GZIP_LEVEL))
+        if responses.brotli is not None:
+            timed(f"brotli quality {responses.BROTLI_QUALITY}",
+                  lambda: responses.brotli.compress(body, quality=responses.BROTLI_QUALITY))
+
+    async def over_http():
+        headers = {"Authorization": f"Bearer {issue_jwt('am@example.com', 'AM')}"}
+        for coding in ("identity", "gzip", "br"):
+            status, response_headers, payload = await asgi_request(
+                main.app, "GET", "/requests/1", {**headers, "Accept-Encoding": coding})
+            encoding = dict(response_headers).get(b"content-encoding", b"identity").decode()
+            print(f"GET /requests/1, Accept-Encoding {coding:<8} -> {status}, "
+                  f"{encoding:<8} {len(payload):>9} bytes")
+
+    asyncio.run(over_http())
+    database.db_executor.shutdown()
+    database.pool.close_all()
+
+
+def _legacy_login_app():
+    """main.app, but with the old login: sync def verifying bcrypt inline."""
+    from fastapi import FastAPI, HTTPException
+    import main
+    from auth import issue_jwt, verify_pw
+    from database import get_connection
+
+    app = FastAPI()
+
+    @app.post("/auth/login")
+    def login(req: main.LoginRequest):
+        conn = get_connection()
+        user = conn.execute("SELECT * FROM users WHERE email=? AND active=1", (req.email,)).fetchone()
+        conn.close()
+        if not user or not verify_pw(req.password, user["password_hash"]):
+            raise HTTPException(status_code=401, detail="Invalid credentials")
+        return {"token": issue_jwt(user["email"], user["role"])}
+
+    app.include_router(main.app.router)
+    return app
+
+
+async def _login_storm(app, logins, readers, token):
+    """Fire a burst of logins while readers hammer GET /requests/{rid}."""
+    login_latencies, read_latencies = [], []
+    rejected = 0
+    done = asyncio.Event()
+    headers = {"Authorization": f"Bearer {token}"}
+    credentials = {"email": "am@example.com", "password": "am123"}
+
+    async def log_in():
+        nonlocal rejected
+        start = time.perf_counter()
+        status, _, _ = await asgi_request(app, "POST", "/auth/login", body=credentials)
+        login_latencies.append(time.perf_counter() - start)
+        rejected += status == 429
+
+    async def reader(c):
+        while not done.is_set():
+            start = time.perf_counter()
+            await asgi_request(app, "GET", f"/requests/{c % 100 + 1}", headers)
+            read_latencies.append(time.perf_counter() - start)
+
+    reading = [asyncio.ensure_future(reader(c)) for c in range(readers)]
+    start = time.perf_counter()
+    await asyncio.gather(*(log_in() for _ in range(logins)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await asyncio.gather(*reading)
+    return elapsed, login_latencies, read_latencies, rejected
+
+
+def bench_login(args):
+    """Mixed traffic during a login burst: inline bcrypt vs the login pool."""
+    _workdir("login.sqlite")
+    os.environ["RC_BCRYPT_ROUNDS"] = str(args.cost)
+    import auth
+    import database
+    import main
+
+    database.init_db()
+    with database.pool.connection() as conn:
+        _seed(conn, n_requests=100)
+        conn.execute("""
+            INSERT INTO users(email, name, role, password_hash) VALUES(?, ?, 'AM', ?)
+        """, ("am@example.com", "Account Manager", auth.hash_pw("am123")))
+        conn.commit()
+    token = auth.issue_jwt("am@example.com", "AM")
+
+    for label, app in (("inline bcrypt", _legacy_login_app()), ("login pool", main.app)):
+        elapsed, logins, reads, rejected = asyncio.run(
+            _login_storm(app, args.logins, args.readers, token)
+        )
+        auth.password_verifier.shutdown()
+        database.db_executor.shutdown()
+        print(f"{label:<14} logins: {len(logins) / elapsed:6.1f}/s p99={_percentile(logins, 99) * 1000:7.1f}ms "
+              f"429s={rejected:<3}  reads: {len(reads) / elapsed:7.0f}/s "
+              f"p50={_percentile(reads, 50) * 1000:6.1f}ms p99={_percentile(reads, 99) * 1000:6.1f}ms")
+    database.pool.close_all()
+
+
+# Relative weight of each operation in `bench.py mix`
+DEFAULT_MIX = {"login": 2, "create": 10, "list": 30, "get": 30, "submit": 8,
+               "review": 6, "approve": 6, "pdf": 8}
+MIX_ENDPOINTS = {
+    "login": "POST /auth/login",
+    "create": "POST /requests",
+    "list": "GET /requests",
+    "get": "GET /requests/{rid}",
+    "submit": "POST /requests/{rid}/submit",
+    "review": "POST /approvals/{rid}/review",
+    "approve": "POST /approvals/{rid}/approve",
+    "pdf": "GET /pdf/{rid}",
+}
+
+
+def _parse_mix(text):
+    mix = dict(DEFAULT_MIX)
+    for part in filter(None, (text or "").split(",")):
+        name, _, weight = part.partition("=")
+        if name not in MIX_ENDPOINTS:
+            sys.exit(f"unknown operation in --mix: {name}")
+        mix[name] = int(weight)
+    return mix
+
+
+def _seed_mix(conn, n_ams, n_quotes, password_hash):
+    """seed_admin-shaped users, role tiers and quotes spread over every workflow state."""
+    ams = [f"am{i}@example.com" for i in range(n_ams)]
+    conn.executemany("""
+        INSERT INTO users(email, name, role, password_hash, active) VALUES(?, ?, ?, ?, 1)
+    """, [(email, f"Account Manager {i}", "AM", password_hash) for i, email in enumerate(ams)]
+         + [("fd@example.com", "Finance Director", "FD", password_hash)])
+    conn.executemany("INSERT INTO role_tiers(name, hourly_rate, active) VALUES(?, ?, 1)", [
+        ("Junior Developer", 3500), ("Senior Developer", 6500), ("Tech Lead", 8500),
+        ("Project Manager", 7500), ("UX Designer", 5500), ("QA Engineer", 4500),
+    ])
+    conn.commit()
+    _seed(conn, n_requests=n_quotes, am_emails=ams)
+    # A third each: draft, submitted, approved (v1 snapshot)
+    conn.execute("UPDATE requests SET state='submitted' WHERE id % 3 = 1")
+    conn.execute("UPDATE requests SET state='approved', approval_version=1 WHERE id % 3 = 2")
+    conn.execute("""
+        INSERT INTO approval_snapshot(request_id, version_no, locked_subtotal, locked_tax,
+                                      locked_grand_total, locked_currency)
+        SELECT id, 1, subtotal, tax, grand_total, currency FROM requests WHERE state='approved'
+    """)
+    conn.commit()
+    rows = conn.execute("SELECT id, am_email, state FROM requests").fetchall()
+    return ams, rows
+
+
+async def _replay(app, args, mix, ams, rows, tokens):
+    """Run `args.users` virtual users through a weighted, seeded operation mix."""
+    drafts = {email: [] for email in ams}
+    submitted, reviewed, approved = [], [], []
+    own = {email: [] for email in ams}
+    for rid, email, state in rows:
+        own[email].append(rid)
+        {"draft": drafts[email], "submitted": submitted, "approved": approved}[state].append(rid)
+    names, weights = list(mix), list(mix.values())
+    quote = {"name": "Mix quote", "client_name": "Client 1", "project_code": "PRJ-1",
+             "items": [{"description": f"Line {j}", "qty": 1, "rate": 5000} for j in range(10)]}
+    samples = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+    per_user = args.requests // args.users
+
+    async def user(u):
+        rng = random.Random(args.seed * 1000 + u)
+        email = ams[u % len(ams)]
+        am = {"Authorization": f"Bearer {tokens[email]}"}
+        fd = {"Authorization": f"Bearer {tokens['fd@example.com']}"}
+        for _ in range(per_user):
+            op = rng.choices(names, weights)[0]
+            # Operations whose input pool is empty fall back to a read
+            if op == "submit" and not drafts[email] or op == "review" and not submitted \
+                    or op == "approve" and not reviewed or op == "pdf" and not approved:
+                op = "list"
+            if op == "login":
+                call = ("POST", "/auth/login", None, {"email": email, "password": "bench"})
+            elif op == "create":
+                call = ("POST", "/requests", am, quote)
+            elif op == "list":
+                call = ("GET", "/requests?limit=50", rng.choice((am, fd)), None)
+            elif op == "get":
+                call = ("GET", f"/requests/{rng.choice(own[email])}", am, None)
+            elif op == "submit":
+                call = ("POST", f"/requests/{drafts[email].pop()}/submit", am, None)
+            elif op == "review":
+                rid = submitted.pop(rng.randrange(len(submitted)))
+                call = ("POST", f"/approvals/{rid}/review", fd, {"note": "mix"})
+            elif op == "approve":
+                rid = reviewed.pop(rng.randrange(len(reviewed)))
+                call = ("POST", f"/approvals/{rid}/approve", fd, {})
+            else:
+                call = ("GET", f"/pdf/{rng.choice(approved)}", fd, None)
+            method, path, headers, body = call
+            start = time.perf_counter()
+            status, _, payload = await asgi_request(app, method, path, headers, body)
+            samples[op].append(time.perf_counter() - start)
+            if status != 200:
+                errors[op] += 1
+                continue
+            rid = int(path.split("/")[2]) if op in ("submit", "review", "approve") else None
+            if op == "create":
+                rid = json.loads(payload)["id"]
+                own[email].append(rid)
+                drafts[email].append(rid)
+            elif op == "submit":
+                submitted.append(rid)
+            elif op == "review":
+                reviewed.append(rid)
+            elif op == "approve":
+                approved.append(rid)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user(u) for u in range(args.users)))
+    return time.perf_counter() - start, samples, errors
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _compare(result, baseline_path):
+    """Print per-endpoint changes against a saved result."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nvs {baseline_path} (commit {baseline['meta'].get('commit')}):")
+    for endpoint, now in result["endpoints"].items():
+        before = baseline["endpoints"].get(endpoint)
+        if not before:
+            continue
+        deltas = "  ".join(
+            f"{key} {(now[key] - before[key]) / before[key] * 100:+6.1f}%"
+            for key in ("rps", "p50_ms", "p95_ms", "p99_ms") if before[key]
+        )
+        print(f"  {endpoint:<30} {deltas}")
+
+
+def bench_mix(args):
+    """Realistic traffic mix against the full app: throughput and latency per endpoint."""
+    _workdir("mix.sqlite")
+    os.environ["RC_BCRYPT_ROUNDS"] = str(args.cost)
+    import auth
+    import database
+    import main
+
+    mix = _parse_mix(args.mix)
+    database.init_db()
+    with database.pool.connection() as conn:
+        ams, rows = _seed_mix(conn, args.ams, args.quotes, auth.hash_pw("bench"))
+    tokens = {email: auth.issue_jwt(email, "AM") for email in ams}
+    tokens["fd@example.com"] = auth.issue_jwt("fd@example.com", "FD")
+
+    elapsed, samples, errors = asyncio.run(_replay(main.app, args, mix, ams, rows, tokens))
+    main.renderer.shutdown()
+    auth.password_verifier.shutdown()
+    database.db_executor.shutdown()
+    database.pool.close_all()
+
+    total = sum(len(v) for v in samples.values())
+    result = {
+        "meta": {
+            "commit": _git_commit(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": sys.version.split()[0],
+            "sqlite": sqlite3.sqlite_version,
+            "args": {k: v for k, v in vars(args).items() if k != "func"},
+            "mix": mix,
+        },
+        "total": {"requests": total, "seconds": round(elapsed, 3),
+                  "rps": round(total / elapsed, 1), "errors": sum(errors.values())},
+        "endpoints": {},
+    }
+    print(f"{'endpoint':<30} {'count':>6} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>6}")
+    for op, latencies in samples.items():
+        if not latencies:
+            continue
+        stats = {
+            "count": len(latencies),
+            "rps": round(len(latencies) / elapsed, 1),
+            "p50_ms": round(_percentile(latencies, 50) * 1000, 2),
+            "p95_ms": round(_percentile(latencies, 95) * 1000, 2),
+            "p99_ms": round(_percentile(latencies, 99) * 1000, 2),
+            "errors": errors[op],
+        }
+        result["endpoints"][MIX_ENDPOINTS[op]] = stats
+        print(f"{MIX_ENDPOINTS[op]:<30} {stats['count']:>6} {stats['rps']:>8} {stats['p50_ms']:>8} "
+              f"{stats['p95_ms']:>8} {stats['p99_ms']:>8} {stats['errors']:>6}")
+    print(f"{'total':<30} {total:>6} {result['total']['rps']:>8} in {elapsed:.2f}s")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"saved {args.out}")
+    if args.compare:
+        _compare(result, args.compare)
+
+
+async def _exercise(app, am_token, fd_token):
+    """Walk one quote through every endpoint that touches the hot tables."""
+    am = {"Authorization": f"Bearer {am_token}"}
+    fd = {"Authorization": f"Bearer {fd_token}"}
+    quote = {"name": "Plan check", "client_name": "Client 1", "project_code": "PRJ-1",
+             "items": [{"description": "Dev", "qty": 2, "rate": 6500}]}
+
+    _, headers, body = await asgi_request(app, "POST", "/requests", am, quote)
+    rid = json.loads(body)["id"]
+    _, _, body = await asgi_request(app, "POST", "/requests/bulk", am, {"requests": [quote] * 3})
+    bulk_ids = [r["id"] for r in json.loads(body)["results"]]
+    _, headers, _ = await asgi_request(app, "GET", "/requests?limit=5", am)
+    cursor = dict(headers).get(b"x-next-cursor", b"").decode()
+    await asgi_request(app, "GET", f"/requests?limit=5&cursor={cursor}", am)
+    await asgi_request(app, "GET", "/requests?client_name=Client%201&from=2000-01-01&to=2999-01-01", am)
+    await asgi_request(app, "GET", f"/requests/{rid}", am)
+    await asgi_request(app, "POST", f"/requests/{rid}/submit", am)
+    await asgi_request(app, "POST", f"/approvals/{rid}/review", fd, {"note": "ok"})
+    await asgi_request(app, "POST", f"/approvals/{rid}/approve", fd, {})
+    for bulk_id in bulk_ids:
+        await asgi_request(app, "POST", f"/requests/{bulk_id}/submit", am)
+    await asgi_request(app, "POST", f"/approvals/{bulk_ids[0]}/reject", fd, {})
+    await asgi_request(app, "POST", "/approvals/batch", fd, {"decisions": [
+        {"id": bulk_ids[1], "action": "approve"}, {"id": bulk_ids[2], "action": "reject"},
+        {"id": bulk_ids[0], "action": "approve"},
+    ]})
+    await asgi_request(app, "GET", "/requests?limit=5", fd)
+    await asgi_request(app, "GET", "/requests?state=approved&limit=5", fd)
+    await asgi_request(app, "GET", f"/requests/{rid}", fd)
+    await asgi_request(app, "GET", f"/pdf/{rid}", fd)
+    await asgi_request(app, "GET", "/pdf/export?from=2000-01-01", fd)
+
+
+def check_plans(args):
+    """Run the query-plan regression test (tests/test_query_plans.py)."""
+    backend = os.path.dirname(os.path.abspath(__file__))
+    sys.exit(subprocess.call([sys.executable, "-m", "unittest", "-v", "tests.test_query_plans"],
+                             cwd=backend))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    pool = sub.add_parser("pool", help="connection pool vs connect-per-request")
+    pool.add_argument("--requests", type=int, default=4000)
+    pool.add_argument("--threads", type=int, default=8)
+    pool.set_defaults(func=bench_pool)
+
+    conc = sub.add_parser("concurrency", help="async handlers vs sync handlers under load")
+    conc.add_argument("--clients", type=int, default=500)
+    conc.add_argument("--rounds", type=int, default=4)
+    conc.set_defaults(func=bench_concurrency)
+
+    plans = sub.add_parser("plans", help="assert hot queries use an index")
+    plans.set_defaults(func=check_plans)
+
+    pdf = sub.add_parser("pdf", help="concurrent PDF rendering, inline vs process pool")
+    pdf.add_argument("--quotes", type=int, default=200)
+    pdf.set_defaults(func=bench_pdf)
+
+    auth = sub.add_parser("auth", help="JWT verification cost with and without the cache")
+    auth.add_argument("--calls", type=int, default=100000)
+    auth.set_defaults(func=bench_auth)
+
+    login = sub.add_parser("login", help="mixed traffic during a login burst")
+    login.add_argument("--logins", type=int, default=64)
+    login.add_argument("--readers", type=int, default=50)
+    login.add_argument("--cost", type=int, default=10, help="bcrypt rounds")
+    login.set_defaults(func=bench_login)
+
+    roles = sub.add_parser("roles", help="role-tier typeahead: LIKE vs in-memory index vs FTS5")
+    roles.add_argument("--tiers", type=int, default=20000)
+    roles.add_argument("--queries", type=int, default=2000)
+    roles.add_argument("--limit", type=int, default=20, help="matches a picker shows")
+    roles.set_defaults(func=bench_roles)
+
+    serialize = sub.add_parser("serialize", help="JSON encoding and compression of a large quote")
+    serialize.add_argument("--items", type=int, default=1000)
+    serialize.add_argument("--runs", type=int, default=200)
+    serialize.set_defaults(func=bench_serialize)
+
+    mix = sub.add_parser("mix", help="realistic traffic mix, per-endpoint p50/p95/p99, JSON results")
+    mix.add_argument("--users", type=int, default=50, help="concurrent virtual users")
+    mix.add_argument("--requests", type=int, default=5000, help="total requests across users")
+    mix.add_argument("--ams", type=int, default=20, help="seeded account managers")
+    mix.add_argument("--quotes", type=int, default=3000, help="seeded quotes")
+    mix.add_argument("--mix", help="weights, e.g. login=2,create=10,list=30 (others keep defaults)")
+    mix.add_argument("--cost", type=int, default=10, help="bcrypt rounds")
+    mix.add_argument("--seed", type=int, default=1, help="RNG seed for the operation sequence")
+    mix.add_argument("--out", help="write results as JSON")
+    mix.add_argument("--compare", help="JSON results of an earlier run to diff against")
+    mix.set_defaults(func=bench_mix)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
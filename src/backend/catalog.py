@@ -0,0 +1,159 @@
+"""In-memory role-tier catalog with a typeahead index for GET /roles."""
+import os
+import json
+import heapq
+import bisect
+import time
+import hashlib
+import threading
+from collections import defaultdict
+
+ROLES_TTL = float(os.environ.get("RC_ROLES_TTL", "60"))  # seconds before reloading
+ROLES_BACKEND = os.environ.get("RC_ROLES_BACKEND", "memory")  # "memory" or "fts5"
+
+def _grams(text, n):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+class RoleIndex:
+    """Immutable snapshot of the active role tiers.
+
+    Matches are collected one rank at a time so a `limit` can stop early:
+    name and word prefixes come from bisecting sorted keys, and only the
+    remaining substring matches go through the n-gram index (every 1-, 2-
+    and 3-gram of each name), which verifies just the names containing
+    all of the query's grams instead of scanning the catalog.
+    """
+
+    def __init__(self, rows, indexed=True):
+        self.roles = [dict(r) for r in rows]  # ordered by name
+        self._names = [r["name"].lower() for r in self.roles]
+        self._name_keys = sorted((name, pos) for pos, name in enumerate(self._names))
+        self._word_keys = sorted(
+            (word, pos) for pos, name in enumerate(self._names) for word in name.split()
+        )
+        self._grams = defaultdict(set)
+        if indexed:
+            for pos, name in enumerate(self._names):
+                for n in (1, 2, 3):
+                    for gram in _grams(name, n):
+                        self._grams[gram].add(pos)
+        body = json.dumps(self.roles, sort_keys=True).encode()
+        self.etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+    def search(self, q, limit=None):
+        """Active tiers whose name contains `q`, best matches first."""
+        q = q.strip().lower()
+        if not q:
+            return self.roles[:limit]
+        found, seen = [], set()
+
+        def take(positions):
+            fresh = {pos for pos in positions if pos not in seen}
+            if limit is not None:
+                fresh = heapq.nsmallest(limit - len(found), fresh)
+            seen.update(fresh)
+            found.extend(sorted(fresh))
+            return limit is not None and len(found) >= limit
+
+        prefixed = [pos for _, pos in _prefixed(self._name_keys, q)]
+        if (take(p for p in prefixed if self._names[p] == q) or take(prefixed)
+                or take(pos for _, pos in _prefixed(self._word_keys, q))):
+            return [self.roles[pos] for pos in found]
+        postings = sorted((self._grams.get(g, set()) for g in _grams(q, min(len(q), 3))), key=len)
+        take(pos for pos in postings[0].intersection(*postings[1:]) if q in self._names[pos])
+        return [self.roles[pos] for pos in found]
+
+def _prefixed(keys, q):
+    """The (key, pos) entries of sorted `keys` whose key starts with `q`."""
+    start = bisect.bisect_left(keys, (q,))
+    end = bisect.bisect_left(keys, (q + "\U0010ffff",), start)
+    return keys[start:end]
+
+class RoleCatalog:
+    """Process-wide RoleIndex, reloaded after `invalidate()` or ROLES_TTL.
+
+    Writes through this app call `invalidate()`; the TTL bounds staleness
+    for writes made by other processes. With RC_ROLES_BACKEND=fts5 the
+    full list is still served from memory, but queries of three or more
+    characters go to an FTS5 trigram table, for catalogs too large to
+    n-gram index in every worker; shorter queries then match name and
+    word prefixes only.
+    """
+
+    def __init__(self, ttl=ROLES_TTL, backend=ROLES_BACKEND):
+        if backend not in ("memory", "fts5"):
+            raise ValueError(f"Unknown RC_ROLES_BACKEND: {backend}")
+        self.ttl = ttl
+        self.fts = backend == "fts5"
+        self._index = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def cached(self):
+        """The current index, or None if it must be (re)loaded."""
+        index = self._index
+        if index is not None and time.monotonic() - self._loaded_at < self.ttl:
+            return index
+        return None
+
+    def load(self, conn):
+        with self._lock:
+            index = self.cached()
+            if index is None:
+                rows = conn.execute(
+                    "SELECT * FROM role_tiers WHERE active=1 ORDER BY name"
+                ).fetchall()
+                index = RoleIndex(rows, indexed=not self.fts)
+                self._index, self._loaded_at = index, time.monotonic()
+            return index
+
+    def invalidate(self):
+        self._index = None
+
+    def uses_fts(self, q):
+        return self.fts and len(q.strip()) >= 3  # the trigram tokenizer needs 3 chars
+
+    def search_fts(self, conn, q, limit=None):
+        q = q.strip()
+        phrase = '"' + q.replace('"', '""') + '"'
+        like = q.lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        # Same ranking as RoleIndex.search, computed in SQL so LIMIT applies there
+        rows = conn.execute("""
+            SELECT r.* FROM role_tiers_fts f JOIN role_tiers r ON r.id = f.rowid
+            WHERE role_tiers_fts MATCH ? AND r.active=1
+            ORDER BY CASE
+                WHEN lower(r.name) = ? THEN 0
+                WHEN lower(r.name) LIKE ? || '%' ESCAPE '\\' THEN 1
+                WHEN ' ' || lower(r.name) LIKE '% ' || ? || '%' ESCAPE '\\' THEN 2
+                ELSE 3 END, r.name
+            LIMIT ?
+        """, (phrase, q.lower(), like, like, -1 if limit is None else limit)).fetchall()
+        return [dict(r) for r in rows]
+
+def enable_fts(conn):
+    """Create the FTS5 trigram index over role_tiers and the triggers that keep it in sync."""
+    statements = (
+        """CREATE VIRTUAL TABLE IF NOT EXISTS role_tiers_fts USING fts5(
+            name, content='role_tiers', content_rowid='id', tokenize='trigram')""",
+        """CREATE TRIGGER IF NOT EXISTS trg_role_tiers_fts_insert AFTER INSERT ON role_tiers BEGIN
+            INSERT INTO role_tiers_fts(rowid, name) VALUES(NEW.id, NEW.name);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_role_tiers_fts_delete AFTER DELETE ON role_tiers BEGIN
+            INSERT INTO role_tiers_fts(role_tiers_fts, rowid, name) VALUES('delete', OLD.id, OLD.name);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_role_tiers_fts_update AFTER UPDATE OF name ON role_tiers BEGIN
+            INSERT INTO role_tiers_fts(role_tiers_fts, rowid, name) VALUES('delete', OLD.id, OLD.name);
+            INSERT INTO role_tiers_fts(rowid, name) VALUES(NEW.id, NEW.name);
+        END""",
+        "INSERT INTO role_tiers_fts(role_tiers_fts) VALUES('rebuild')",
+    )
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for statement in statements:
+            conn.execute(statement)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+role_catalog = RoleCatalog()
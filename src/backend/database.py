@@ -1,17 +1,333 @@
 """Database initialization and schema for Rate Card Pro."""
 import sqlite3
 import os
+import queue
+import asyncio
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import metrics
 
 DB_PATH = os.environ.get("RC_DB_PATH", "./ratecard.sqlite")
+POOL_SIZE = int(os.environ.get("RC_DB_POOL_SIZE", "8"))
+BUSY_TIMEOUT_MS = int(os.environ.get("RC_DB_BUSY_TIMEOUT_MS", "5000"))
+MAX_PENDING = int(os.environ.get("RC_DB_MAX_PENDING", "256"))
+# postgresql://... selects Postgres (see postgres.py); otherwise SQLite at DB_PATH
+DB_URL = os.environ.get("RC_DB_URL", "")
+POSTGRES = DB_URL.startswith(("postgres://", "postgresql://"))
 
-def get_connection():
-    """Get a database connection with row factory."""
-    conn = sqlite3.connect(DB_PATH)
+# Applied to every connection. WAL lets FD reads proceed while an AM write
+# is in flight; NORMAL sync is durable under WAL except on power loss.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-16000",     # ~16 MB page cache per connection
+    "PRAGMA mmap_size=134217728",   # 128 MB memory-mapped reads
+    "PRAGMA temp_store=MEMORY",
+    f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}",
+)
+
+def _configure(conn):
+    """Apply row factory and pragmas to a new connection."""
     conn.row_factory = sqlite3.Row
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
     return conn
 
+def dict_row(cursor, row):
+    """Row factory yielding plain dicts, for rows serialized straight to JSON."""
+    return dict(zip([column[0] for column in cursor.description], row))
+
+def get_connection():
+    """Get a new, unpooled database connection with row factory."""
+    conn = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT_MS / 1000)
+    return _configure(conn)
+
+class ConnectionPool:
+    """Bounded pool of reusable SQLite connections.
+
+    Connections are checked out exclusively, so a request may hop between
+    threadpool workers (FastAPI runs sync dependencies and endpoints on
+    different threads) without two requests ever sharing one connection.
+    """
+
+    def __init__(self, path=None, size=POOL_SIZE):
+        self.path = path or DB_PATH
+        self.size = size
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._lock = threading.Lock()
+        self._created = 0
+        # Callables run on every new pooled connection (e.g. trace callbacks)
+        self.connect_hooks = []
+
+    def _new_connection(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,
+        )
+        _configure(conn)
+        for hook in self.connect_hooks:
+            hook(conn)
+        return conn
+
+    def acquire(self, timeout=None):
+        """Check out a connection, opening one if the pool is not yet full."""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                try:
+                    return self._new_connection()
+                except Exception:
+                    self._created -= 1
+                    raise
+        try:
+            return self._idle.get(timeout=timeout or BUSY_TIMEOUT_MS / 1000)
+        except queue.Empty:
+            raise sqlite3.OperationalError("connection pool exhausted")
+
+    def release(self, conn):
+        """Return a connection, rolling back anything left uncommitted."""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            with self._lock:
+                self._created -= 1
+            return
+        self._idle.put_nowait(conn)
+
+    @contextmanager
+    def connection(self):
+        """Context manager that checks out and returns a connection."""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close_all(self):
+        """Close idle connections (used at shutdown and in benchmarks)."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+if POSTGRES:
+    from postgres import PostgresPool
+    pool = PostgresPool(DB_URL, size=POOL_SIZE, timeout=BUSY_TIMEOUT_MS / 1000)
+else:
+    pool = ConnectionPool()
+pool.connect_hooks.append(lambda conn: conn.set_trace_callback(metrics.count_statement))
+
+class DBExecutor:
+    """Runs blocking database work on dedicated threads for async endpoints.
+
+    One worker per pooled connection, so a queued job never waits on the
+    pool. At most `max_pending` jobs may be queued or running; further
+    callers wait on the semaphore instead of piling onto the executor.
+    """
+
+    def __init__(self, pool, workers=None, max_pending=MAX_PENDING):
+        self.pool = pool
+        self.workers = workers or pool.size
+        self.max_pending = max_pending
+        self._slots = asyncio.Semaphore(max_pending)
+        self._executor = None
+
+    def _call(self, fn, args):
+        with metrics.db_job(), self.pool.connection() as conn:
+            return fn(conn, *args)
+
+    async def run(self, fn, *args):
+        """Await `fn(conn, *args)` on a DB worker with a pooled connection."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="rc-db"
+            )
+        async with self._slots:
+            loop = asyncio.get_running_loop()
+            # Carry the request's contextvars (metrics attribution) onto the worker
+            context = contextvars.copy_context()
+            return await loop.run_in_executor(self._executor, context.run, self._call, fn, args)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self._slots = asyncio.Semaphore(self.max_pending)
+
+db_executor = DBExecutor(pool)
+
+async def run_db(fn, *args):
+    """Run a sync data-access function off the event loop."""
+    return await db_executor.run(fn, *args)
+
+# Pipeline rollup: one row per (state, am_email, client_name, month, currency)
+ROLLUP_KEY = "state, am_email, client_name, month, currency"
+# YYYY-MM of created_at, computed the way each backend's triggers do it
+ROLLUP_MONTH = "to_char(created_at, 'YYYY-MM')" if POSTGRES else "strftime('%Y-%m', created_at)"
+ROLLUP_RECOMPUTE = f"""
+    SELECT state, am_email, COALESCE(client_name, ''), {ROLLUP_MONTH}, currency,
+           COUNT(*), SUM(subtotal), SUM(grand_total)
+    FROM requests
+    GROUP BY state, am_email, COALESCE(client_name, ''), {ROLLUP_MONTH}, currency
+"""
+
+def _rollup_match(row):
+    return f"""state={row}.state AND am_email={row}.am_email
+        AND client_name=COALESCE({row}.client_name, '')
+        AND month=strftime('%Y-%m', {row}.created_at) AND currency={row}.currency"""
+
+def _rollup_add(row):
+    """Trigger body that counts `row` (NEW/OLD) into its rollup group."""
+    return f"""INSERT INTO pipeline_rollup({ROLLUP_KEY}, quote_count, subtotal, grand_total)
+            VALUES({row}.state, {row}.am_email, COALESCE({row}.client_name, ''),
+                   strftime('%Y-%m', {row}.created_at), {row}.currency,
+                   1, {row}.subtotal, {row}.grand_total)
+            ON CONFLICT({ROLLUP_KEY}) DO UPDATE SET
+                quote_count = quote_count + 1,
+                subtotal = subtotal + excluded.subtotal,
+                grand_total = grand_total + excluded.grand_total;"""
+
+def _rollup_remove(row):
+    """Trigger body that takes `row` out of its group, dropping empty groups."""
+    return f"""UPDATE pipeline_rollup SET
+                quote_count = quote_count - 1,
+                subtotal = subtotal - {row}.subtotal,
+                grand_total = grand_total - {row}.grand_total
+            WHERE {_rollup_match(row)};
+            DELETE FROM pipeline_rollup WHERE quote_count <= 0 AND {_rollup_match(row)};"""
+
+# Schema migrations, applied in order on top of the base tables created by
+# init_db. Entry N moves the database to `PRAGMA user_version` N. Append new
+# steps at the end; never edit one that has shipped.
+MIGRATIONS = [
+    # v1: secondary indexes for the hot queries in main.py
+    (
+        # get_request: items ordered by position
+        "CREATE INDEX IF NOT EXISTS idx_request_items_request ON request_items(request_id, position)",
+        # get_request: event log ordered by time
+        "CREATE INDEX IF NOT EXISTS idx_approval_events_request ON approval_events(request_id, at)",
+        # list_requests: AM inbox and FD state filters, keyset on created_at
+        "CREATE INDEX IF NOT EXISTS idx_requests_am_created ON requests(am_email, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_requests_state_created ON requests(state, created_at)",
+    ),
+    # v2: typed totals columns; totals_json keeps only extension fields
+    (
+        "ALTER TABLE requests ADD COLUMN subtotal REAL NOT NULL DEFAULT 0",
+        "ALTER TABLE requests ADD COLUMN tax REAL NOT NULL DEFAULT 0",
+        "ALTER TABLE requests ADD COLUMN grand_total REAL NOT NULL DEFAULT 0",
+        "ALTER TABLE requests ADD COLUMN currency TEXT NOT NULL DEFAULT 'PHP'",
+        """UPDATE requests SET
+            subtotal = COALESCE(json_extract(totals_json, '$.subtotal'), 0),
+            tax = COALESCE(json_extract(totals_json, '$.tax'), 0),
+            grand_total = COALESCE(json_extract(totals_json, '$.grand_total'), 0),
+            currency = COALESCE(json_extract(totals_json, '$.currency'), 'PHP'),
+            totals_json = NULLIF(json_remove(totals_json,
+                '$.subtotal', '$.tax', '$.grand_total', '$.currency'), '{}')
+        WHERE json_valid(totals_json)""",
+        "ALTER TABLE approval_snapshot ADD COLUMN locked_subtotal REAL NOT NULL DEFAULT 0",
+        "ALTER TABLE approval_snapshot ADD COLUMN locked_tax REAL NOT NULL DEFAULT 0",
+        "ALTER TABLE approval_snapshot ADD COLUMN locked_grand_total REAL NOT NULL DEFAULT 0",
+        "ALTER TABLE approval_snapshot ADD COLUMN locked_currency TEXT NOT NULL DEFAULT 'PHP'",
+        """UPDATE approval_snapshot SET
+            locked_subtotal = COALESCE(json_extract(locked_totals_json, '$.subtotal'), 0),
+            locked_tax = COALESCE(json_extract(locked_totals_json, '$.tax'), 0),
+            locked_grand_total = COALESCE(json_extract(locked_totals_json, '$.grand_total'), 0),
+            locked_currency = COALESCE(json_extract(locked_totals_json, '$.currency'), 'PHP'),
+            locked_totals_json = NULLIF(json_remove(locked_totals_json,
+                '$.subtotal', '$.tax', '$.grand_total', '$.currency'), '{}')
+        WHERE json_valid(locked_totals_json)""",
+    ),
+    # v3: pipeline rollup for GET /reports/pipeline, kept current by triggers
+    (
+        """CREATE TABLE IF NOT EXISTS pipeline_rollup(
+            state TEXT NOT NULL,
+            am_email TEXT NOT NULL,
+            client_name TEXT NOT NULL,
+            month TEXT NOT NULL,
+            currency TEXT NOT NULL,
+            quote_count INTEGER NOT NULL DEFAULT 0,
+            subtotal REAL NOT NULL DEFAULT 0,
+            grand_total REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY(state, am_email, client_name, month, currency)
+        ) WITHOUT ROWID""",
+        f"INSERT INTO pipeline_rollup {ROLLUP_RECOMPUTE}",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_rollup_insert AFTER INSERT ON requests BEGIN
+            {_rollup_add("NEW")}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_rollup_update
+        AFTER UPDATE OF state, am_email, client_name, currency, subtotal, grand_total, created_at
+        ON requests BEGIN
+            {_rollup_remove("OLD")}
+            {_rollup_add("NEW")}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_rollup_delete AFTER DELETE ON requests BEGIN
+            {_rollup_remove("OLD")}
+        END""",
+    ),
+    # v4: per-request approval counter, so approving never scans for MAX(version_no)
+    (
+        "ALTER TABLE requests ADD COLUMN approval_version INTEGER NOT NULL DEFAULT 0",
+        """UPDATE requests SET approval_version = (
+            SELECT MAX(version_no) FROM approval_snapshot WHERE request_id = requests.id)
+        WHERE id IN (SELECT request_id FROM approval_snapshot)""",
+    ),
+    # v5: Idempotency-Key responses for retried POSTs (see idempotency.py)
+    (
+        """CREATE TABLE IF NOT EXISTS idempotency_keys(
+            actor_email TEXT NOT NULL,
+            key TEXT NOT NULL,
+            fingerprint TEXT NOT NULL,
+            response TEXT,
+            expires_at INTEGER NOT NULL,
+            PRIMARY KEY(actor_email, key)
+        ) WITHOUT ROWID""",
+        "CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires ON idempotency_keys(expires_at)",
+    ),
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+def migrate(conn):
+    """Apply pending MIGRATIONS and return the resulting schema version.
+
+    Each step runs in its own BEGIN IMMEDIATE transaction together with the
+    user_version bump, so concurrent workers starting up apply it once.
+    """
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version >= SCHEMA_VERSION:
+                conn.rollback()
+                return version
+            for statement in MIGRATIONS[version]:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version={version + 1}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
 def init_db():
     """Initialize database schema."""
+    if POSTGRES:
+        pool.init_schema()
+        print(f"✅ Postgres database initialized successfully (schema v{SCHEMA_VERSION})")
+        return
     conn = get_connection()
     cursor = conn.cursor()
     
@@ -93,8 +409,9 @@ def init_db():
     """)
     
     conn.commit()
+    version = migrate(conn)
     conn.close()
-    print("✅ Database initialized successfully")
+    print(f"✅ Database initialized successfully (schema v{version})")
 
 if __name__ == "__main__":
     init_db()
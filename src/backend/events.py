@@ -0,0 +1,163 @@
+"""Live approval events: an in-process hub that fans approval_events out to SSE streams."""
+import os
+import json
+import asyncio
+
+from database import run_db
+
+KEEPALIVE = float(os.environ.get("RC_EVENTS_KEEPALIVE", "15"))  # seconds between pings
+POLL_INTERVAL = float(os.environ.get("RC_EVENTS_POLL", "5"))  # catch writes from other workers
+QUEUE_SIZE = 1000  # undelivered events per stream before it is dropped
+PAGE_SIZE = 500
+RETRY_MS = 3000  # client reconnect delay sent in the stream
+
+# FD sees the workflow, not AMs creating or editing drafts
+FD_ACTIONS = ("submit", "review", "approve", "reject")
+
+def fetch_events(conn, after_id, am_email=None, limit=PAGE_SIZE):
+    """approval_events rows with id > after_id, joined to their request's owner and state."""
+    where, params = ["e.id > ?"], [after_id]
+    if am_email is not None:
+        where.append("r.am_email=?")
+        params.append(am_email)
+    rows = conn.execute(f"""
+        SELECT e.id, e.request_id, e.actor_email, e.action, e.note, e.at,
+               r.am_email, r.state
+        FROM approval_events e JOIN requests r ON r.id = e.request_id
+        WHERE {' AND '.join(where)}
+        ORDER BY e.id
+        LIMIT ?
+    """, (*params, limit)).fetchall()
+    return [dict(r) for r in rows]
+
+def latest_event_id(conn):
+    return conn.execute("SELECT COALESCE(MAX(id), 0) FROM approval_events").fetchone()[0]
+
+def visible(claims, event):
+    if claims["role"] == "AM":
+        return event["am_email"] == claims["sub"]
+    return event["action"] in FD_ACTIONS
+
+def format_event(event):
+    return f"id: {event['id']}\nevent: approval\ndata: {json.dumps(event)}\n\n"
+
+class Subscription:
+    def __init__(self, claims):
+        self.claims = claims
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+        self.sent = 0  # highest event id written to the stream
+
+class EventHub:
+    """Fans new approval_events rows out to subscribed streams.
+
+    Handlers call `publish()` after committing a write. A single pump task
+    then reads everything newer than its high-water mark once and delivers
+    it to each matching subscriber, so the cost is one indexed query per
+    burst of writes rather than one list query per connected user. The
+    pump also polls every POLL_INTERVAL seconds to pick up events written
+    by other worker processes. It only runs while someone is subscribed.
+    """
+
+    def __init__(self):
+        self._subscribers = set()
+        self._wakeup = None
+        self._task = None
+        self.last_id = 0
+
+    @property
+    def subscribers(self):
+        return len(self._subscribers)
+
+    def publish(self):
+        """Signal that new events were committed."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def subscribe(self, claims, since, head=None):
+        """Register a stream that has seen events up to `since`.
+
+        `head` is the newest event id in the database. A pump started
+        here reads from `head` on, and the stream replays (since, head]
+        itself, so a reconnect never reads its backlog twice or queues
+        it for delivery.
+        """
+        sub = Subscription(claims)
+        sub.sent = since
+        if self._task is None or self._task.done():
+            self.last_id = since if head is None else head
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._pump())
+        self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        self._subscribers.discard(sub)
+
+    async def _pump(self):
+        while self._subscribers:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            while self._subscribers:
+                events = await run_db(fetch_events, self.last_id)
+                for event in events:
+                    self._deliver(event)
+                if events:
+                    self.last_id = events[-1]["id"]
+                if len(events) < PAGE_SIZE:
+                    break
+
+    def _deliver(self, event):
+        for sub in list(self._subscribers):
+            if not visible(sub.claims, event):
+                continue
+            try:
+                sub.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Too far behind: end the stream, the client resumes from Last-Event-ID
+                self._subscribers.discard(sub)
+                sub.queue.get_nowait()
+                sub.queue.put_nowait(None)
+
+    async def stream(self, claims, last_event_id=None):
+        """Yield SSE frames for `claims`, replaying from `last_event_id` when given."""
+        head = await run_db(latest_event_id)
+        since = head if last_event_id is None else last_event_id
+        sub = self.subscribe(claims, since, head)
+        try:
+            yield f"retry: {RETRY_MS}\n\n"
+            if last_event_id is not None:
+                # Live events queued meanwhile are skipped below by id
+                am_email = claims["sub"] if claims["role"] == "AM" else None
+                while True:
+                    events = await run_db(fetch_events, sub.sent, am_email)
+                    for event in events:
+                        sub.sent = event["id"]
+                        if visible(claims, event):
+                            yield format_event(event)
+                    if len(events) < PAGE_SIZE:
+                        break
+            while True:
+                try:
+                    event = await asyncio.wait_for(sub.queue.get(), KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if event is None:
+                    return
+                if event["id"] <= sub.sent:
+                    continue
+                sub.sent = event["id"]
+                yield format_event(event)
+        finally:
+            self.unsubscribe(sub)
+
+    def shutdown(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._subscribers.clear()
+
+event_hub = EventHub()
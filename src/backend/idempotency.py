@@ -0,0 +1,178 @@
+"""Idempotency-Key support for the write endpoints.
+
+A client that may retry a POST sends `Idempotency-Key: <unique string>`.
+The first request with a key runs the handler and records its response
+in `idempotency_keys` (one row per caller and key, expiring after
+IDEMPOTENCY_TTL). A retry with the same key gets that response back,
+marked `Idempotent-Replayed: true`, without running the handler again.
+
+Reusing a key for a different request (another endpoint or body) is a
+422; retrying while the first request is still running is a 409. Failed
+requests are not recorded, so they can be retried with the same key.
+
+The handler's writes and its recorded response commit in one
+transaction. A reservation without a response is only held for
+IDEMPOTENCY_LEASE seconds, so if the process dies mid-request, a retry
+can take the key over once the lease runs out and run the handler again.
+"""
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional
+
+from fastapi import Depends, Header, HTTPException, Request
+
+from database import run_db
+from storage import store
+from responses import dumps
+from security import require
+
+IDEMPOTENCY_TTL = int(os.environ.get("RC_IDEMPOTENCY_TTL", "86400"))  # seconds a key is remembered
+IDEMPOTENCY_LEASE = int(os.environ.get("RC_IDEMPOTENCY_LEASE", "60"))  # seconds a run may hold a key
+CACHE_SIZE = int(os.environ.get("RC_IDEMPOTENCY_CACHE_SIZE", "10000"))  # responses kept in memory
+MAX_KEY_LENGTH = 255
+PURGE_INTERVAL = 300  # seconds between sweeps of expired rows
+
+class IdempotencyKey:
+    """A caller's key plus a fingerprint of the request it was first used for."""
+
+    __slots__ = ("actor", "key", "fingerprint")
+
+    def __init__(self, actor, key, fingerprint):
+        self.actor, self.key, self.fingerprint = actor, key, fingerprint
+
+def fingerprint(method, path, body):
+    return hashlib.sha256(b"\0".join((method.encode(), path.encode(), body))).hexdigest()[:32]
+
+class IdempotencyStore:
+    """idempotency_keys rows, fronted by an LRU of completed responses.
+
+    Hits in the LRU are answered on the event loop without touching the
+    database; other workers' keys are found in the table. A key is
+    reserved (committed with no response) before the handler runs, so a
+    concurrent retry sees it in progress rather than running twice.
+    """
+
+    def __init__(self, ttl=IDEMPOTENCY_TTL, maxsize=CACHE_SIZE, lease=IDEMPOTENCY_LEASE):
+        self.ttl = ttl
+        self.lease = lease
+        self.maxsize = maxsize
+        self._responses = OrderedDict()  # (actor, key) -> (fingerprint, body, expires_at)
+        self._lock = threading.Lock()
+        self._purged_at = 0.0
+
+    def cached(self, key):
+        """The stored body for `key` if it is in the LRU, else None."""
+        with self._lock:
+            entry = self._responses.get((key.actor, key.key))
+            if entry is None or entry[2] <= time.time():
+                self._responses.pop((key.actor, key.key), None)
+                return None
+            self._responses.move_to_end((key.actor, key.key))
+        return self._check(key, entry[0], entry[1])
+
+    def _remember(self, key, fp, body, expires_at):
+        with self._lock:
+            self._responses[(key.actor, key.key)] = (fp, body, expires_at)
+            self._responses.move_to_end((key.actor, key.key))
+            if len(self._responses) > self.maxsize:
+                self._responses.popitem(last=False)
+
+    @staticmethod
+    def _check(key, fp, body):
+        if fp != key.fingerprint:
+            raise HTTPException(status_code=422,
+                                detail="Idempotency-Key was already used for a different request")
+        if body is None:
+            raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is in progress",
+                                headers={"Retry-After": "1"})
+        return body
+
+    async def run(self, key, fn, *args):
+        """Run `fn(conn, *args)` on the DB executor at most once per key.
+
+        Returns `(result, None)` when it ran, or `(None, body)` with the
+        JSON body recorded by the run that did.
+        """
+        body = self.cached(key)
+        if body is not None:
+            return None, body
+        return await run_db(self._execute, key, fn, args)
+
+    def _execute(self, conn, key, fn, args):
+        now = time.time()
+        if now - self._purged_at > PURGE_INTERVAL:
+            self._purged_at = now
+            conn.execute("DELETE FROM idempotency_keys WHERE expires_at <= ?", (int(now),))
+        expires_at = int(now) + self.ttl
+        leased_until = int(now) + self.lease
+        # Claims the key, or takes over an expired row (a response past its
+        # TTL, or a reservation whose run died) left for the sweep
+        reserved = conn.execute("""
+            INSERT INTO idempotency_keys(actor_email, key, fingerprint, expires_at)
+            VALUES(?, ?, ?, ?)
+            ON CONFLICT(actor_email, key) DO UPDATE SET
+                fingerprint = excluded.fingerprint, response = NULL, expires_at = excluded.expires_at
+            WHERE idempotency_keys.expires_at <= ?
+            RETURNING 1
+        """, (key.actor, key.key, key.fingerprint, leased_until, int(now))).fetchone()
+        conn.commit()
+        if reserved is None:
+            row = conn.execute("""
+                SELECT fingerprint, response, expires_at FROM idempotency_keys
+                WHERE actor_email=? AND key=?
+            """, (key.actor, key.key)).fetchone()
+            if row is None:  # the first request failed and released it just now
+                row = (key.fingerprint, None, 0)
+            body = self._check(key, row[0], row[1] and row[1].encode())
+            self._remember(key, row[0], body, row[2])
+            return None, body
+
+        try:
+            # fn's own transaction nests in this one, so its writes commit
+            # only together with the response
+            with store.transaction(conn):
+                result = fn(conn, *args)
+                body = dumps(result)
+                owned = conn.execute("""
+                    UPDATE idempotency_keys SET response=?, expires_at=?
+                    WHERE actor_email=? AND key=? AND expires_at=?
+                    RETURNING 1
+                """, (body.decode(), expires_at, key.actor, key.key, leased_until)).fetchone()
+                if owned is None:
+                    # The lease ran out and a retry took the key over
+                    raise HTTPException(status_code=409,
+                                        detail="A request with this Idempotency-Key is in progress",
+                                        headers={"Retry-After": "1"})
+        except BaseException:
+            conn.rollback()
+            conn.execute("DELETE FROM idempotency_keys WHERE actor_email=? AND key=? AND expires_at=?",
+                         (key.actor, key.key, leased_until))
+            conn.commit()
+            raise
+        self._remember(key, key.fingerprint, body, expires_at)
+        return result, None
+
+idempotency_store = IdempotencyStore()
+
+@lru_cache(maxsize=None)
+def idempotency_key(role: str = None):
+    """Dependency returning the request's IdempotencyKey, or None without the header.
+
+    Shares `require(role)` with the endpoint, so the token is checked once.
+    """
+    async def dependency(request: Request, idempotency_key: Optional[str] = Header(None),
+                         claims=Depends(require(role))):
+        if idempotency_key is None:
+            return None
+        if not idempotency_key.strip() or len(idempotency_key) > MAX_KEY_LENGTH:
+            raise HTTPException(status_code=400,
+                                detail=f"Idempotency-Key must be 1-{MAX_KEY_LENGTH} characters")
+        body = await request.body()
+        return IdempotencyKey(claims["sub"], idempotency_key,
+                              fingerprint(request.method, request.url.path, body))
+
+    return dependency
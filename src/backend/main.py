@@ -1,16 +1,46 @@
 """FastAPI backend for Rate Card Pro."""
-from fastapi import FastAPI, Depends, HTTPException, Response
+from fastapi import FastAPI, BackgroundTasks, Depends, Header, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Literal, Optional
 import json
-from datetime import datetime
+import base64
+import asyncio
+import zipfile
+import collections
+import logging
+from datetime import datetime, timedelta
 
-from database import get_connection, init_db
-from auth import issue_jwt, verify_pw, hash_pw
+from database import POSTGRES, init_db, pool, db_executor, run_db
+from auth import LoginBusy, issue_jwt, hash_pw, password_verifier, token_cache, verify_jwt
 from security import require
+from reports import GROUP_COLUMNS, pipeline_report
+from events import event_hub
+from responses import CompressionMiddleware, FastJSONResponse
+from metrics import MetricsMiddleware, registry
+from catalog import enable_fts, role_catalog
+from workflow import TransitionError
+from storage import store
+from idempotency import idempotency_key, idempotency_store
+from pdf import EXTENSIONS, ZipStream, exports, pdf_cache, renderer, track_export
 
-app = FastAPI(title="Rate Card Pro API")
+logger = logging.getLogger(__name__)
+
+app = FastAPI(title="Rate Card Pro API", default_response_class=FastJSONResponse)
+
+BULK_LIMIT = 1000  # max quotes per POST /requests/bulk
+
+REQUEST_FIELDS = (
+    "id", "name", "project_code", "client_name", "am_email", "state",
+    "subtotal", "tax", "grand_total", "currency", "approval_version",
+    "totals_json", "notes", "created_at", "updated_at",
+)
+TOTAL_COLUMNS = ("subtotal", "tax", "grand_total", "currency")
+EXPORT_WINDOW = renderer.workers * 2  # renders in flight during a ZIP export
+FD_VISIBLE_STATES = ("submitted", "fd_review", "approved", "rejected")
+
+app.add_middleware(CompressionMiddleware)
 
 # CORS for development
 app.add_middleware(
@@ -21,6 +51,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+def _may_profile(scope):
+    """?profile=1 is for FD only."""
+    authorization = dict(scope["headers"]).get(b"authorization", b"").decode("latin-1")
+    if not authorization.startswith("Bearer "):
+        return False
+    try:
+        return verify_jwt(authorization[7:])["role"] == "FD"
+    except Exception:
+        return False
+
+# Outermost, so latency covers compression and CORS as well
+app.add_middleware(MetricsMiddleware, authorize_profile=_may_profile)
+
 # Pydantic models
 class LoginRequest(BaseModel):
     email: str
@@ -38,33 +81,77 @@ class RequestCreate(BaseModel):
     items: List[RequestItem] = []
     notes: Optional[str] = None
 
+class RequestListQuery(BaseModel):
+    state: Optional[str] = None
+    client_name: Optional[str] = None
+    project_code: Optional[str] = None
+    date_from: Optional[str] = None
+    date_to: Optional[str] = None
+    cursor: Optional[str] = None
+    limit: int = 100
+    fields: Optional[List[str]] = None
+
+class BulkRequestCreate(BaseModel):
+    requests: List[RequestCreate]
+
 class ApprovalAction(BaseModel):
     note: Optional[str] = None
     totals_delta: Optional[dict] = None
 
+class BatchDecision(BaseModel):
+    id: int
+    action: Literal["approve", "reject"]
+    note: Optional[str] = None
+
+class ApprovalBatch(BaseModel):
+    decisions: List[BatchDecision]
+
 # Startup
 @app.on_event("startup")
 async def startup():
+    if role_catalog.fts and POSTGRES:
+        raise RuntimeError("RC_ROLES_BACKEND=fts5 needs SQLite; use memory with Postgres")
     init_db()
+    if role_catalog.fts:
+        with pool.connection() as conn:
+            enable_fts(conn)
+
+@app.on_event("shutdown")
+async def shutdown():
+    event_hub.shutdown()
+    password_verifier.shutdown()
+    renderer.shutdown()
+    db_executor.shutdown()
+    pool.close_all()
 
 # Health check
 @app.get("/healthz")
 def health():
     return {"status": "ok"}
 
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus metrics: per-route latency, SQL counts and DB time, render and bcrypt time."""
+    return Response(registry.render(), media_type="text/plain; version=0.0.4")
+
 # Auth endpoints
 @app.post("/auth/login")
-def login(req: LoginRequest):
+async def login(req: LoginRequest):
     """Authenticate user and return JWT token."""
-    conn = get_connection()
-    user = conn.execute(
-        "SELECT * FROM users WHERE email=? AND active=1", 
-        (req.email,)
-    ).fetchone()
-    conn.close()
+    user = await run_db(store.find_user, req.email)
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
     
-    if not user or not verify_pw(req.password, user["password_hash"]):
+    try:
+        ok, new_hash = await password_verifier.verify(req.password, user["password_hash"])
+    except LoginBusy:
+        raise HTTPException(status_code=429, detail="Too many logins in progress",
+                            headers={"Retry-After": "1"})
+    if not ok:
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    if new_hash:
+        # bcrypt cost changed since this hash was made
+        await run_db(store.update_password_hash, user["id"], new_hash)
     
     token = issue_jwt(user["email"], user["role"])
     return {
@@ -74,23 +161,24 @@ def login(req: LoginRequest):
         "name": user["name"]
     }
 
+@app.post("/auth/logout")
+async def logout(authorization: str = Header(None), claims=Depends(require())):
+    """Revoke the caller's token."""
+    token_cache.revoke(authorization.split()[1])
+    return {"ok": True}
+
+@app.get("/auth/token-cache")
+async def token_cache_stats(claims=Depends(require("FD"))):
+    """Verified-token cache size and hit/miss counters (FD only)."""
+    return token_cache.stats()
+
 @app.post("/seed_admin")
 def seed_admin():
     """One-time helper to seed admin users."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    # Create FD user
-    cursor.execute("""
-        INSERT OR IGNORE INTO users(email, name, role, password_hash, active) 
-        VALUES(?, ?, ?, ?, 1)
-    """, ("fd@example.com", "Finance Director", "FD", hash_pw("admin123")))
-    
-    # Create AM user
-    cursor.execute("""
-        INSERT OR IGNORE INTO users(email, name, role, password_hash, active) 
-        VALUES(?, ?, ?, ?, 1)
-    """, ("am@example.com", "Account Manager", "AM", hash_pw("am123")))
+    users = [
+        ("fd@example.com", "Finance Director", "FD", hash_pw("admin123")),
+        ("am@example.com", "Account Manager", "AM", hash_pw("am123")),
+    ]
     
     # Seed role tiers
     tiers = [
@@ -101,368 +189,536 @@ def seed_admin():
         ("UX Designer", 5500),
         ("QA Engineer", 4500),
     ]
-    for name, rate in tiers:
-        cursor.execute("""
-            INSERT OR IGNORE INTO role_tiers(name, hourly_rate, active) 
-            VALUES(?, ?, 1)
-        """, (name, rate))
-    
-    conn.commit()
-    conn.close()
+    with pool.connection() as conn:
+        store.seed(conn, users, tiers)
+    role_catalog.invalidate()
     return {"ok": True, "message": "Admin users and role tiers seeded"}
 
 # Role tiers
 @app.get("/roles")
-def get_roles(q: str = ""):
-    """Get role tiers, optionally filtered by query."""
-    conn = get_connection()
-    if q:
-        roles = conn.execute(
-            "SELECT * FROM role_tiers WHERE active=1 AND name LIKE ? ORDER BY name",
-            (f"%{q}%",)
-        ).fetchall()
+async def get_roles(
+    response: Response,
+    q: str = "",
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    if_none_match: Optional[str] = Header(None),
+):
+    """Get active role tiers, optionally filtered by query.
+
+    Served from the in-memory catalog: matches on `q` are ranked exact,
+    name prefix, word prefix, then substring; `limit` caps the matches
+    a typeahead needs. Responses carry the
+    catalog's ETag; send it back in `If-None-Match` to get a `304`.
+    """
+    catalog = role_catalog.cached() or await run_db(role_catalog.load)
+    headers = {"ETag": catalog.etag, "Cache-Control": "no-cache"}
+    if _etag_matches(if_none_match, catalog.etag):
+        return Response(status_code=304, headers=headers)
+    if role_catalog.uses_fts(q):
+        roles = await run_db(role_catalog.search_fts, q, limit)
     else:
-        roles = conn.execute(
-            "SELECT * FROM role_tiers WHERE active=1 ORDER BY name"
-        ).fetchall()
-    conn.close()
-    return [dict(r) for r in roles]
+        roles = catalog.search(q, limit)
+    response.headers.update(headers)
+    return roles
 
 # Requests endpoints
+async def _run_write(fn, *args, key=None):
+    """run_db for handlers that log approval_events; wakes the event stream.
+
+    With an Idempotency-Key `key`, a retry gets the first run's response
+    back as a Response, without running `fn` again.
+    """
+    if key is None:
+        result = await run_db(fn, *args)
+    else:
+        result, replayed = await idempotency_store.run(key, fn, *args)
+        if replayed is not None:
+            return Response(replayed, media_type="application/json",
+                            headers={"Idempotent-Replayed": "true"})
+    event_hub.publish()
+    return result
+
 @app.post("/requests")
-def create_request(payload: RequestCreate, claims=Depends(require("AM"))):
-    """Create a new request (AM only)."""
-    conn = get_connection()
-    cursor = conn.cursor()
+async def create_request(payload: RequestCreate, claims=Depends(require("AM")),
+                         key=Depends(idempotency_key("AM"))):
+    """Create a new request (AM only). Retries may send an Idempotency-Key."""
+    return await _run_write(_create_request, payload, claims, key=key)
+
+def _create_request(conn, payload, claims):
+    items, totals = _price_items(payload)
+    with store.transaction(conn):
+        request_id = store.insert_request(conn, payload, claims["sub"], items, totals)
+    
+    return {"id": request_id, "state": "draft", "totals": totals}
+
+def _price_items(payload):
+    """Item rows for store.insert_request, and the request totals."""
+    # Build item rows and the subtotal in one pass over the payload
+    rows = []
+    subtotal = 0
+    for idx, item in enumerate(payload.items):
+        line_total = item.qty * item.rate
+        subtotal += line_total
+        rows.append((item.description, item.qty, item.rate, line_total, idx))
     
-    # Calculate totals
-    subtotal = sum(item.qty * item.rate for item in payload.items)
     totals = {
         "subtotal": subtotal,
         "tax": subtotal * 0.12,  # 12% VAT
         "grand_total": subtotal * 1.12
     }
-    
-    # Insert request
-    cursor.execute("""
-        INSERT INTO requests(name, project_code, client_name, am_email, state, totals_json, notes)
-        VALUES(?, ?, ?, ?, 'draft', ?, ?)
-    """, (payload.name, payload.project_code, payload.client_name, 
-          claims["sub"], json.dumps(totals), payload.notes))
-    
-    request_id = cursor.lastrowid
-    
-    # Insert items
-    for idx, item in enumerate(payload.items):
-        cursor.execute("""
-            INSERT INTO request_items(request_id, description, qty, rate, subtotal, position)
-            VALUES(?, ?, ?, ?, ?, ?)
-        """, (request_id, item.description, item.qty, item.rate, 
-              item.qty * item.rate, idx))
-    
-    # Log event
-    cursor.execute("""
-        INSERT INTO approval_events(request_id, actor_email, action)
-        VALUES(?, ?, 'create')
-    """, (request_id, claims["sub"]))
-    
-    conn.commit()
-    conn.close()
-    
-    return {"id": request_id, "state": "draft", "totals": totals}
+    return rows, totals
+
+@app.post("/requests/bulk")
+async def create_requests_bulk(payload: BulkRequestCreate, claims=Depends(require("AM")),
+                               key=Depends(idempotency_key("AM"))):
+    """Create many requests in one transaction (AM only).
+
+    Each quote is inserted under its own savepoint, so one bad quote is
+    reported in `results` without discarding the rest of the batch.
+    """
+    if len(payload.requests) > BULK_LIMIT:
+        raise HTTPException(status_code=413, detail=f"At most {BULK_LIMIT} requests per batch")
+    return await _run_write(_create_requests_bulk, payload, claims, key=key)
+
+def _create_requests_bulk(conn, payload, claims):
+    results = []
+    
+    with store.transaction(conn):
+        for index, request in enumerate(payload.requests):
+            items, totals = _price_items(request)
+            try:
+                with store.savepoint(conn, "bulk_item"):
+                    request_id = store.insert_request(conn, request, claims["sub"], items, totals)
+            except store.Error as e:
+                results.append({"index": index, "ok": False, "error": str(e)})
+                continue
+            results.append({"index": index, "ok": True, "id": request_id,
+                            "state": "draft", "totals": totals})
+    
+    created = sum(1 for r in results if r["ok"])
+    return {"created": created, "failed": len(results) - created, "results": results}
 
 @app.get("/requests")
-def list_requests(claims=Depends(require())):
-    """List requests based on user role."""
-    conn = get_connection()
+async def list_requests(
+    state: Optional[str] = None,
+    client_name: Optional[str] = None,
+    project_code: Optional[str] = None,
+    date_from: Optional[str] = Query(None, alias="from"),
+    date_to: Optional[str] = Query(None, alias="to"),
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+    claims=Depends(require()),
+):
+    """List requests based on user role, newest first.
+
+    Paginated by keyset on (created_at, id): pass the `X-Next-Cursor`
+    response header back as `cursor` to fetch the next page.
+    """
+    query = RequestListQuery(
+        state=state, client_name=client_name, project_code=project_code,
+        date_from=date_from, date_to=date_to, cursor=cursor, limit=limit,
+        fields=_parse_fields(fields),
+    )
+    rows, next_cursor = await run_db(_list_requests, claims, query)
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return FastJSONResponse(rows, headers=headers)
+
+def _parse_fields(fields):
+    """Validate a comma-separated `fields=` projection against the schema."""
+    if not fields:
+        return None
+    names = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in names if f not in REQUEST_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    # id and created_at are always returned; the cursor is built from them
+    return ["id", "created_at"] + [f for f in names if f not in ("id", "created_at")]
+
+def _encode_cursor(created_at, rid):
+    return base64.urlsafe_b64encode(json.dumps([created_at, rid]).encode()).decode()
+
+def _decode_cursor(cursor):
+    try:
+        created_at, rid = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return str(created_at), int(rid)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _parse_day(value, name, days=0):
+    """Validate a YYYY-MM-DD parameter, optionally shifted by `days`."""
+    try:
+        day = datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"'{name}' must be YYYY-MM-DD")
+    return (day + timedelta(days=days)).strftime("%Y-%m-%d")
+
+def _list_requests(conn, claims, query=None):
+    query = query or RequestListQuery()
     
     if claims["role"] == "AM":
         # AM sees only their own requests
-        requests = conn.execute("""
-            SELECT * FROM requests WHERE am_email=? ORDER BY created_at DESC
-        """, (claims["sub"],)).fetchall()
-    else:
+        am_email = claims["sub"]
+        states = (query.state,) if query.state else None
+    elif not query.state:
         # FD sees submitted/reviewed/approved requests
-        requests = conn.execute("""
-            SELECT * FROM requests 
-            WHERE state IN ('submitted', 'fd_review', 'approved', 'rejected')
-            ORDER BY created_at DESC
-        """).fetchall()
-    
-    conn.close()
-    return [dict(r) for r in requests]
+        am_email, states = None, FD_VISIBLE_STATES
+    elif query.state not in FD_VISIBLE_STATES:
+        return [], None
+    else:
+        am_email, states = None, (query.state,)
+    
+    # Fetch one extra row to learn whether there is a next page
+    requests = store.list_requests(
+        conn, query.limit + 1, am_email=am_email, states=states,
+        client_name=query.client_name or None, project_code=query.project_code or None,
+        created_from=query.date_from and _parse_day(query.date_from, "from"),
+        created_before=query.date_to and _parse_day(query.date_to, "to", days=1),
+        after=query.cursor and _decode_cursor(query.cursor), columns=query.fields,
+    )
+    
+    next_cursor = None
+    if len(requests) > query.limit:
+        requests = requests[:query.limit]
+        last = requests[-1]
+        next_cursor = _encode_cursor(last["created_at"], last["id"])
+    
+    return requests, next_cursor
 
 @app.get("/requests/{rid}")
-def get_request(rid: int, claims=Depends(require())):
+async def get_request(rid: int, claims=Depends(require())):
     """Get request details with items."""
-    conn = get_connection()
-    
-    request = conn.execute("SELECT * FROM requests WHERE id=?", (rid,)).fetchone()
-    if not request:
-        conn.close()
+    return FastJSONResponse(await run_db(_get_request, rid, claims))
+
+def _get_request(conn, rid, claims):
+    found = store.get_request(conn, rid)
+    if not found:
         raise HTTPException(status_code=404, detail="Request not found")
+    request, items, events = found
     
     # Check authorization
     if claims["role"] == "AM" and request["am_email"] != claims["sub"]:
-        conn.close()
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    items = conn.execute("""
-        SELECT * FROM request_items WHERE request_id=? ORDER BY position
-    """, (rid,)).fetchall()
-    
-    events = conn.execute("""
-        SELECT * FROM approval_events WHERE request_id=? ORDER BY at DESC
-    """, (rid,)).fetchall()
-    
-    conn.close()
-    
-    return {
-        "request": dict(request),
-        "items": [dict(i) for i in items],
-        "events": [dict(e) for e in events]
-    }
+    return {"request": request, "items": items, "events": events}
 
 @app.post("/requests/{rid}/submit")
-def submit_request(rid: int, claims=Depends(require("AM"))):
+async def submit_request(rid: int, claims=Depends(require("AM")),
+                         key=Depends(idempotency_key("AM"))):
     """Submit request for FD approval (AM only)."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    # Verify ownership and state
-    cursor.execute("""
-        UPDATE requests SET state='submitted', updated_at=CURRENT_TIMESTAMP
-        WHERE id=? AND am_email=? AND state='draft'
-    """, (rid, claims["sub"]))
-    
-    if cursor.rowcount == 0:
-        conn.close()
-        raise HTTPException(status_code=400, detail="Cannot submit this request")
-    
-    # Log event
-    cursor.execute("""
-        INSERT INTO approval_events(request_id, actor_email, action)
-        VALUES(?, ?, 'submit')
-    """, (rid, claims["sub"]))
-    
-    conn.commit()
-    conn.close()
-    
-    return {"id": rid, "state": "submitted"}
+    return await _run_write(_submit_request, rid, claims, key=key)
+
+def _submit_request(conn, rid, claims):
+    return _transition(conn, rid, "submit", claims, owner=claims["sub"])
 
 @app.post("/approvals/{rid}/review")
-def review_request(rid: int, action: ApprovalAction, claims=Depends(require("FD"))):
+async def review_request(rid: int, action: ApprovalAction, claims=Depends(require("FD")),
+                         key=Depends(idempotency_key("FD"))):
     """FD reviews and optionally edits totals."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    request = cursor.execute("SELECT * FROM requests WHERE id=?", (rid,)).fetchone()
-    if not request:
-        conn.close()
-        raise HTTPException(status_code=404, detail="Request not found")
-    
-    # Update totals if provided
-    if action.totals_delta:
-        current_totals = json.loads(request["totals_json"] or "{}")
-        new_totals = {**current_totals, **action.totals_delta}
-        cursor.execute("""
-            UPDATE requests SET totals_json=?, state='fd_review', updated_at=CURRENT_TIMESTAMP
-            WHERE id=?
-        """, (json.dumps(new_totals), rid))
-    else:
-        cursor.execute("""
-            UPDATE requests SET state='fd_review', updated_at=CURRENT_TIMESTAMP WHERE id=?
-        """, (rid,))
-    
-    # Log event
-    cursor.execute("""
-        INSERT INTO approval_events(request_id, actor_email, action, note)
-        VALUES(?, ?, 'review', ?)
-    """, (rid, claims["sub"], action.note))
-    
-    conn.commit()
-    conn.close()
-    
-    return {"id": rid, "state": "fd_review"}
+    return await _run_write(_review_request, rid, action, claims, key=key)
+
+def _review_request(conn, rid, action, claims):
+    totals, extras = _split_totals(action.totals_delta or {})
+    return _transition(conn, rid, "review", claims, note=action.note,
+                       totals=totals, extras=extras)
+
+def _split_totals(delta):
+    """Split a totals_delta into typed column updates and extension fields."""
+    columns = {}
+    for name in TOTAL_COLUMNS:
+        if name not in delta:
+            continue
+        value = delta[name]
+        if name == "currency":
+            if not isinstance(value, str) or len(value) != 3:
+                raise HTTPException(status_code=400, detail="currency must be a 3-letter code")
+            columns[name] = value.upper()
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            columns[name] = value
+        else:
+            raise HTTPException(status_code=400, detail=f"{name} must be a number")
+    extras = {k: v for k, v in delta.items() if k not in TOTAL_COLUMNS}
+    return columns, extras
 
 @app.post("/approvals/{rid}/approve")
-def approve_request(rid: int, action: ApprovalAction, claims=Depends(require("FD"))):
-    """FD approves request and creates snapshot."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    request = cursor.execute("SELECT * FROM requests WHERE id=?", (rid,)).fetchone()
-    if not request:
-        conn.close()
-        raise HTTPException(status_code=404, detail="Request not found")
-    
-    # Update state
-    cursor.execute("""
-        UPDATE requests SET state='approved', updated_at=CURRENT_TIMESTAMP WHERE id=?
-    """, (rid,))
-    
-    # Create approval snapshot
-    version = cursor.execute("""
-        SELECT COALESCE(MAX(version_no), 0) + 1 
-        FROM approval_snapshot WHERE request_id=?
-    """, (rid,)).fetchone()[0]
-    
-    cursor.execute("""
-        INSERT INTO approval_snapshot(request_id, version_no, locked_totals_json)
-        VALUES(?, ?, ?)
-    """, (rid, version, request["totals_json"]))
-    
-    # Log event
-    cursor.execute("""
-        INSERT INTO approval_events(request_id, actor_email, action, note)
-        VALUES(?, ?, 'approve', ?)
-    """, (rid, claims["sub"], action.note))
-    
-    conn.commit()
-    conn.close()
-    
-    return {"id": rid, "state": "approved", "version": version}
+async def approve_request(rid: int, action: ApprovalAction, background_tasks: BackgroundTasks,
+                          claims=Depends(require("FD")), key=Depends(idempotency_key("FD"))):
+    """FD approves request and creates snapshot. Retries may send an Idempotency-Key."""
+    result = await _run_write(_approve_request, rid, action, claims, key=key)
+    if isinstance(result, Response):
+        return result  # replayed; the first run already warmed the PDF
+    # Runs after the response is sent, once the snapshot is committed
+    background_tasks.add_task(_warm_pdf, rid, result["version"])
+    return result
+
+def _approve_request(conn, rid, action, claims):
+    return _transition(conn, rid, "approve", claims, note=action.note)
 
 @app.post("/approvals/{rid}/reject")
-def reject_request(rid: int, action: ApprovalAction, claims=Depends(require("FD"))):
+async def reject_request(rid: int, action: ApprovalAction, claims=Depends(require("FD")),
+                         key=Depends(idempotency_key("FD"))):
     """FD rejects request."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        UPDATE requests SET state='rejected', updated_at=CURRENT_TIMESTAMP WHERE id=?
-    """, (rid,))
-    
-    if cursor.rowcount == 0:
-        conn.close()
-        raise HTTPException(status_code=404, detail="Request not found")
-    
-    # Log event
-    cursor.execute("""
-        INSERT INTO approval_events(request_id, actor_email, action, note)
-        VALUES(?, ?, 'reject', ?)
-    """, (rid, claims["sub"], action.note))
-    
-    conn.commit()
-    conn.close()
-    
-    return {"id": rid, "state": "rejected"}
+    return await _run_write(_reject_request, rid, action, claims, key=key)
+
+def _reject_request(conn, rid, action, claims):
+    return _transition(conn, rid, "reject", claims, note=action.note)
+
+def _transition(conn, rid, action, claims, **kwargs):
+    try:
+        return store.apply_transition(conn, rid, action, claims["sub"], **kwargs)
+    except TransitionError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+@app.post("/approvals/batch")
+async def decide_batch(payload: ApprovalBatch, background_tasks: BackgroundTasks,
+                       claims=Depends(require("FD")), key=Depends(idempotency_key("FD"))):
+    """Approve or reject many requests in one transaction (FD only).
+
+    Each decision runs under its own savepoint, so a quote in the wrong
+    state is reported in `results` without discarding the rest.
+    """
+    if len(payload.decisions) > BULK_LIMIT:
+        raise HTTPException(status_code=413, detail=f"At most {BULK_LIMIT} decisions per batch")
+    result = await _run_write(_decide_batch, payload, claims, key=key)
+    if isinstance(result, Response):
+        return result
+    for r in result["results"]:
+        if r["ok"] and r["state"] == "approved":
+            background_tasks.add_task(_warm_pdf, r["id"], r["version"])
+    return result
+
+def _decide_batch(conn, payload, claims):
+    results = []
+    
+    with store.transaction(conn):
+        for decision in payload.decisions:
+            try:
+                with store.savepoint(conn, "batch_item"):
+                    result = store.transition(conn, decision.id, decision.action, claims["sub"],
+                                              note=decision.note)
+            except (TransitionError, store.IntegrityError) as e:
+                status = getattr(e, "status_code", 409)
+                results.append({"id": decision.id, "ok": False, "status": status, "error": str(e)})
+                continue
+            results.append({"id": decision.id, "ok": True, **result})
+    
+    counts = collections.Counter(r["state"] for r in results if r["ok"])
+    return {"approved": counts["approved"], "rejected": counts["rejected"],
+            "failed": sum(1 for r in results if not r["ok"]), "results": results}
+
+@app.get("/events/stream")
+async def stream_events(last_event_id: Optional[str] = Header(None), claims=Depends(require())):
+    """Server-sent stream of new approval events visible to the caller.
+
+    AMs get every event on their own quotes; FD gets submit, review,
+    approve and reject events. Reconnecting with `Last-Event-ID` replays
+    the events missed since that id before going live.
+    """
+    since = None
+    if last_event_id:
+        try:
+            since = int(last_event_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid Last-Event-ID")
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(event_hub.stream(claims, since), media_type="text/event-stream",
+                             headers=headers)
+
+@app.get("/reports/pipeline")
+async def get_pipeline_report(
+    group_by: str = "state",
+    state: Optional[str] = None,
+    am_email: Optional[str] = None,
+    client_name: Optional[str] = None,
+    month_from: Optional[str] = Query(None, alias="from"),
+    month_to: Optional[str] = Query(None, alias="to"),
+    claims=Depends(require()),
+):
+    """Pipeline count and value per group, summed from the rollup table.
+
+    `group_by` is a comma-separated subset of state, am_email, client_name
+    and month; rows are always split by currency. `from`/`to` are YYYY-MM.
+    AMs only see their own quotes; FD sees everything past draft.
+    """
+    columns = [c.strip() for c in group_by.split(",") if c.strip()]
+    unknown = [c for c in columns if c not in GROUP_COLUMNS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown group_by: {', '.join(unknown)}")
+    filters = {
+        "state": state,
+        "am_email": am_email,
+        "client_name": client_name,
+        "month_from": _parse_month(month_from, "from") if month_from else None,
+        "month_to": _parse_month(month_to, "to") if month_to else None,
+    }
+    if claims["role"] == "AM":
+        if am_email not in (None, claims["sub"]):
+            return []
+        filters["am_email"] = claims["sub"]
+    elif not state:
+        filters["state"] = FD_VISIBLE_STATES
+    elif state not in FD_VISIBLE_STATES:
+        return []
+    return await run_db(pipeline_report, list(dict.fromkeys(columns)), filters)
+
+def _parse_month(value, name):
+    try:
+        return datetime.strptime(value, "%Y-%m").strftime("%Y-%m")
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"'{name}' must be YYYY-MM")
+
+@app.get("/pdf/export")
+async def export_pdfs(
+    state: str = "approved",
+    date_from: Optional[str] = Query(None, alias="from"),
+    date_to: Optional[str] = Query(None, alias="to"),
+    claims=Depends(require("FD")),
+):
+    """Stream a ZIP of quote PDFs approved in a date range (FD only).
+
+    PDFs are rendered in parallel (cached ones are reused) and written to
+    the response as they finish, so the archive is never held in memory.
+    Poll `/pdf/exports/{X-Export-Id}` for progress.
+    """
+    if state != "approved":
+        raise HTTPException(status_code=400, detail="Only approved quotes can be exported")
+    quotes = await run_db(_export_quotes, date_from, date_to)
+    progress = track_export(len(quotes))
+    headers = {
+        "Content-Disposition": 'attachment; filename="quotes.zip"',
+        "X-Export-Id": progress.id,
+        "X-Export-Total": str(len(quotes)),
+    }
+    return StreamingResponse(_zip_quotes(quotes, progress), media_type="application/zip",
+                             headers=headers)
+
+@app.get("/pdf/exports/{export_id}")
+async def get_export_progress(export_id: str, claims=Depends(require("FD"))):
+    """Progress of a running or recently finished export (FD only)."""
+    progress = exports.get(export_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Export not found")
+    return progress.as_dict()
+
+def _export_quotes(conn, date_from, date_to):
+    """Approved requests whose latest approval falls in [from, to]."""
+    return store.approved_quotes(
+        conn,
+        approved_from=date_from and _parse_day(date_from, "from"),
+        approved_before=date_to and _parse_day(date_to, "to", days=1),
+    )
+
+async def _zip_quotes(quotes, progress):
+    """Yield a ZIP archive of the quotes' PDFs, one member at a time."""
+    sink = ZipStream()
+    archive = zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED)
+    pending = collections.deque()
+    remaining = iter(quotes)
+    errors = []
+
+    def schedule():
+        quote = next(remaining, None)
+        if quote is not None:
+            task = asyncio.ensure_future(
+                renderer.read(quote["id"], quote["version_no"], _quote_loader(quote["id"]))
+            )
+            pending.append((quote, task))
+
+    # Keep a window of renders in flight ahead of the one being written
+    for _ in range(EXPORT_WINDOW):
+        schedule()
+    try:
+        while pending:
+            quote, task = pending.popleft()
+            schedule()
+            try:
+                entry, content = await task
+            except Exception as e:
+                errors.append(f"{quote['id']}: {e}")
+                progress.failed += 1
+                continue
+            archive.writestr(_export_name(quote, entry), content)
+            progress.done += 1
+            yield sink.drain()
+        if errors:
+            archive.writestr("errors.txt", "\n".join(errors) + "\n")
+        archive.close()
+        yield sink.drain()
+        progress.finish("done")
+    finally:
+        if progress.status == "running":
+            progress.finish("cancelled")
+        for _, task in pending:
+            task.cancel()
+
+def _export_name(quote, entry):
+    slug = "".join(c if c.isalnum() else "-" for c in quote["name"]).strip("-")[:60]
+    return f"{quote['id']:06d}-v{quote['version_no']}-{slug}{EXTENSIONS[entry.media_type]}"
 
 @app.get("/pdf/{rid}")
-def generate_pdf(rid: int):
-    """Generate PDF for approved request."""
-    conn = get_connection()
-    
-    request = conn.execute("""
-        SELECT * FROM requests WHERE id=? AND state='approved'
-    """, (rid,)).fetchone()
-    
-    if not request:
-        conn.close()
-        raise HTTPException(status_code=404, detail="Request not found or not approved")
-    
-    items = conn.execute("""
-        SELECT description, qty, rate, subtotal 
-        FROM request_items WHERE request_id=? ORDER BY position
-    """, (rid,)).fetchall()
-    
-    conn.close()
-    
-    totals = json.loads(request["totals_json"] or "{}")
-    
-    # Generate PDF HTML
-    html = f"""
-    <html>
-    <head>
-        <style>
-            body {{ 
-                font-family: 'Inter', -apple-system, sans-serif; 
-                background: #F2F7F2; 
-                color: #111; 
-                padding: 40px;
-            }}
-            h1 {{ color: #386641; margin-bottom: 10px; }}
-            .accent {{ color: #D4AC0D; }}
-            .meta {{ margin-bottom: 30px; color: #666; }}
-            table {{ 
-                width: 100%; 
-                border-collapse: collapse; 
-                background: white;
-                margin: 20px 0;
-            }}
-            th, td {{ 
-                border: 1px solid #ddd; 
-                padding: 12px; 
-                text-align: left;
-            }}
-            th {{ 
-                background: #386641; 
-                color: white; 
-            }}
-            .total-row {{ 
-                background: #F2F7F2; 
-                font-weight: bold;
-            }}
-            .grand-total {{ 
-                font-size: 24px; 
-                color: #D4AC0D; 
-                margin-top: 20px;
-            }}
-        </style>
-    </head>
-    <body>
-        <h1>Rate Card Pro — Approved Quote</h1>
-        <div class="meta">
-            <p><strong>Quote:</strong> {request['name']}</p>
-            <p><strong>Project Code:</strong> {request['project_code'] or 'N/A'}</p>
-            <p><strong>Client:</strong> {request['client_name'] or 'N/A'}</p>
-            <p><strong>Account Manager:</strong> {request['am_email']}</p>
-        </div>
-        
-        <table>
-            <thead>
-                <tr>
-                    <th>Description</th>
-                    <th style="text-align: right;">Qty</th>
-                    <th style="text-align: right;">Rate (₱)</th>
-                    <th style="text-align: right;">Subtotal (₱)</th>
-                </tr>
-            </thead>
-            <tbody>
-                {''.join(f'''
-                <tr>
-                    <td>{item['description']}</td>
-                    <td style="text-align: right;">{item['qty']}</td>
-                    <td style="text-align: right;">{item['rate']:,.2f}</td>
-                    <td style="text-align: right;">{item['subtotal']:,.2f}</td>
-                </tr>
-                ''' for item in items)}
-                <tr class="total-row">
-                    <td colspan="3" style="text-align: right;">Subtotal:</td>
-                    <td style="text-align: right;">₱{totals.get('subtotal', 0):,.2f}</td>
-                </tr>
-                <tr class="total-row">
-                    <td colspan="3" style="text-align: right;">Tax (12%):</td>
-                    <td style="text-align: right;">₱{totals.get('tax', 0):,.2f}</td>
-                </tr>
-            </tbody>
-        </table>
-        
-        <div class="grand-total">
-            <strong>Grand Total: ₱{totals.get('grand_total', 0):,.2f}</strong>
-        </div>
-    </body>
-    </html>
+async def generate_pdf(rid: int, if_none_match: Optional[str] = Header(None)):
+    """Generate PDF for approved request.
+
+    Served from the on-disk cache when the current approval version has
+    already been rendered; clients revalidate with If-None-Match. Cache
+    misses are rendered on the worker process pool.
     """
+    version = await run_db(store.approved_version, rid)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Request not found or not approved")
     
-    # Generate PDF using WeasyPrint
+    entry = pdf_cache.get(rid, version)
+    if entry and _etag_matches(if_none_match, entry.etag):
+        return Response(status_code=304, headers=_pdf_headers(entry))
+    entry, content = await renderer.read(rid, version, _quote_loader(rid))
+    return Response(content=content, media_type=entry.media_type, headers=_pdf_headers(entry))
+
+@app.post("/pdf/{rid}/jobs", status_code=202)
+async def create_pdf_job(rid: int, claims=Depends(require("FD"))):
+    """Queue a background render and return its job id (FD only)."""
+    version = await run_db(store.approved_version, rid)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Request not found or not approved")
+    try:
+        job = renderer.submit(rid, version, _quote_loader(rid))
+    except OverflowError:
+        raise HTTPException(status_code=503, detail="Render queue is full, retry later")
+    return job.as_dict()
+
+@app.get("/pdf/jobs/{job_id}")
+async def get_pdf_job(job_id: str, claims=Depends(require("FD"))):
+    """Return job status, or the rendered document once it is done (FD only)."""
+    job = renderer.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status == "failed":
+        return JSONResponse(status_code=500, content=job.as_dict())
+    if job.status != "done":
+        return JSONResponse(status_code=202, content=job.as_dict())
+    # Re-resolve through the cache in case the file was evicted meanwhile
+    entry, content = await renderer.read(job.rid, job.version, _quote_loader(job.rid))
+    return Response(content=content, media_type=entry.media_type, headers=_pdf_headers(entry))
+
+def _quote_loader(rid):
+    """Async callable the renderer awaits on a cache miss."""
+    return lambda: run_db(store.load_quote, rid)
+
+def _etag_matches(if_none_match, etag):
+    """True if an If-None-Match header value covers `etag`."""
+    if not if_none_match:
+        return False
+    tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+def _pdf_headers(entry):
+    return {"ETag": entry.etag, "Cache-Control": "private, no-cache"}
+
+async def _warm_pdf(rid, version):
+    """Render a freshly approved quote in the background."""
+    pdf_cache.invalidate(rid, keep_version=version)
     try:
-        from weasyprint import HTML
-        pdf_bytes = HTML(string=html).write_pdf()
-        return Response(content=pdf_bytes, media_type="application/pdf")
-    except ImportError:
-        # Fallback: return HTML if WeasyPrint not available
-        return Response(content=html, media_type="text/html")
+        await renderer.render(rid, version, _quote_loader(rid))
+    except Exception:
+        logger.exception("PDF pre-render failed for request %s v%s", rid, version)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,262 @@
+"""Request metrics in Prometheus text format, and an opt-in sampling profiler.
+
+Per route: latency histogram, SQL statement count and DB executor time.
+Also PDF render time and bcrypt time. SQL run on DB executor threads is
+attributed to the request through a context variable, which DBExecutor
+copies into each job.
+"""
+import os
+import sys
+import time
+import bisect
+import threading
+import contextvars
+import collections
+from contextlib import contextmanager
+from urllib.parse import parse_qs
+
+PROFILE_INTERVAL = float(os.environ.get("RC_PROFILE_INTERVAL_MS", "1")) / 1000
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+class Counter:
+    """Monotonic counter with a fixed label set."""
+
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[n] for n in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labels, key)} {value}"
+
+class Histogram:
+    """Cumulative-bucket histogram with a fixed label set."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[n] for n in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def samples(self):
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        names = self.labels + ("le",)
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                yield f"{self.name}_bucket{_format_labels(names, key + (bound,))} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labels, key)} {series[-1]}"
+            yield f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}"
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name, help, labels=()):
+        metric = Counter(name, help, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, help, labels, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format (0.0.4)."""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+http_requests = registry.counter(
+    "rc_http_requests_total", "HTTP requests handled.", ("method", "route", "status"))
+http_seconds = registry.histogram(
+    "rc_http_request_duration_seconds", "Time to the last response byte.", ("method", "route"))
+db_statements = registry.counter(
+    "rc_db_statements_total", "SQL statements executed, by route.", ("method", "route"))
+db_seconds = registry.histogram(
+    "rc_db_seconds", "Time a request spent in DB executor jobs.", ("method", "route"))
+pdf_render_seconds = registry.histogram(
+    "rc_pdf_render_seconds", "Quote render time in the worker process.", ("media_type",))
+bcrypt_seconds = registry.histogram(
+    "rc_bcrypt_seconds", "Password hash verification time.",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 1, 2))
+
+class RequestStats:
+    """What one request has done so far, shared with the threads working for it."""
+
+    def __init__(self, profiler=None):
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.profiler = profiler
+
+_current = contextvars.ContextVar("rc_request_stats", default=None)
+
+def count_statement(sql):
+    """sqlite3 trace callback: attribute one statement to the current request."""
+    stats = _current.get()
+    if stats is not None:
+        stats.statements += 1
+    else:
+        db_statements.inc(method="", route="background")
+
+@contextmanager
+def db_job():
+    """Time a DB executor job and let the profiler sample its thread."""
+    stats = _current.get()
+    if stats is None:
+        yield
+        return
+    if stats.profiler is not None:
+        stats.profiler.add_thread()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.db_seconds += time.perf_counter() - start
+        if stats.profiler is not None:
+            stats.profiler.remove_thread()
+
+class SamplingProfiler:
+    """Samples the stacks of the threads serving one request.
+
+    Output is in collapsed-stack format ("outer;inner;leaf count" per
+    line), which flamegraph.pl, speedscope and inferno read directly. The
+    event loop thread is shared, so its samples also include whatever
+    other requests were doing at the time.
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.samples = collections.Counter()
+        self._threads = collections.Counter({threading.get_ident(): 1})
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rc-profiler", daemon=True)
+
+    def add_thread(self):
+        self._threads[threading.get_ident()] += 1
+
+    def remove_thread(self):
+        self._threads[threading.get_ident()] -= 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for ident, active in list(self._threads.items()):
+                frame = frames.get(ident)
+                if active <= 0 or frame is None or ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.samples[";".join(reversed(stack))] += 1
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+class MetricsMiddleware:
+    """Records per-route metrics; serves a profile for `?profile=1` when allowed.
+
+    `authorize_profile(scope)` decides who may profile; a profiled request
+    still runs in full, but its response is replaced by the stack dump.
+    """
+
+    def __init__(self, app, authorize_profile=lambda scope: False):
+        self.app = app
+        self.authorize_profile = authorize_profile
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        profiler = None
+        if b"profile=" in scope["query_string"]:
+            query = parse_qs(scope["query_string"].decode("latin-1"))
+            if query.get("profile") == ["1"] and self.authorize_profile(scope):
+                profiler = SamplingProfiler()
+        stats = RequestStats(profiler)
+        token = _current.set(stats)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_recorded(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body" and not message.get("more_body"):
+                route = _route(scope)
+                http_seconds.observe(time.perf_counter() - start, method=scope["method"], route=route)
+                http_requests.inc(method=scope["method"], route=route, status=status)
+            if profiler is None:
+                await send(message)
+
+        if profiler is not None:
+            profiler.start()
+        try:
+            await self.app(scope, receive, send_recorded)
+        finally:
+            _current.reset(token)
+            route = _route(scope)
+            db_statements.inc(stats.statements, method=scope["method"], route=route)
+            db_seconds.observe(stats.db_seconds, method=scope["method"], route=route)
+            if profiler is not None:
+                profiler.stop()
+        if profiler is not None:
+            body = profiler.collapsed().encode()
+            await send({"type": "http.response.start", "status": 200, "headers": [
+                (b"content-type", b"text/plain; charset=utf-8"),
+                (b"content-length", str(len(body)).encode()),
+                (b"x-profile-samples", str(sum(profiler.samples.values())).encode()),
+            ]})
+            await send({"type": "http.response.body", "body": body})
+
+def _route(scope):
+    """Route template for labels (e.g. /requests/{rid}), never the raw path."""
+    route = scope.get("route")
+    return getattr(route, "path", "unmatched")
@@ -0,0 +1,181 @@
+"""Storage parity check: one API scenario against SQLite and Postgres.
+
+    python parity.py --pg-url postgresql://localhost/ratecard_parity [--reset]
+
+Each backend runs the scenario in its own subprocess (the backend is
+chosen at import from RC_DB_URL) on an empty database: a temporary
+SQLite file, and the given Postgres database, which must not hold the
+rate-card tables yet unless --reset drops them first. Responses are
+normalized (timestamps, tokens, JSON text spacing) and compared step
+by step; the exit status is 1 if any step differs.
+
+A throwaway server is enough, e.g.
+    docker run --rm -e POSTGRES_HOST_AUTH_METHOD=trust -p 5432:5432 postgres:15-alpine
+with --pg-url postgresql://postgres@localhost/postgres.
+"""
+import os
+import re
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+
+TABLES = ("approval_events", "approval_snapshot", "request_items", "pipeline_rollup",
+          "requests", "role_tiers", "users", "idempotency_keys")
+TIMESTAMP = re.compile(r"^\d{4}-\d\d-\d\d \d\d:\d\d:\d\d$")
+VOLATILE_KEYS = ("token",)
+JSON_TEXT_KEYS = ("totals_json", "locked_totals_json")
+
+def _normalize(value, key=None):
+    if isinstance(value, dict):
+        return {k: _normalize(v, k) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_normalize(v) for v in value]
+    if key in VOLATILE_KEYS:
+        return "<volatile>"
+    if isinstance(value, str):
+        if key in JSON_TEXT_KEYS:
+            return json.loads(value)
+        if TIMESTAMP.match(value):
+            return "<timestamp>"
+    return value
+
+def run_scenario():
+    """Drive main.app through the workflow; returns the normalized transcript."""
+    from fastapi.testclient import TestClient
+    import main
+
+    steps = []
+    with TestClient(main.app) as client:
+        def call(step, method, path, headers=None, **kwargs):
+            response = client.request(method, path, headers=headers, **kwargs)
+            if response.headers.get("content-type", "").startswith("application/json"):
+                body = response.json()
+            else:
+                body = response.headers.get("content-type")
+            steps.append({"step": step, "status": response.status_code,
+                          "cursor": "x-next-cursor" in response.headers,
+                          "body": _normalize(body)})
+            return body
+
+        call("seed", "POST", "/seed_admin")
+        call("seed again", "POST", "/seed_admin")
+        call("bad login", "POST", "/auth/login", json={"email": "am@example.com", "password": "x"})
+        am = {"Authorization": "Bearer " + call(
+            "am login", "POST", "/auth/login", json={"email": "am@example.com", "password": "am123"})["token"]}
+        fd = {"Authorization": "Bearer " + call(
+            "fd login", "POST", "/auth/login", json={"email": "fd@example.com", "password": "admin123"})["token"]}
+
+        call("roles", "GET", "/roles")
+        call("roles search", "GET", "/roles", params={"q": "dev", "limit": 5})
+
+        ids = []
+        for n, client_name in enumerate(("Acme", "Globex", "Acme", "Initech", "Globex")):
+            body = {"name": f"Quote {n}", "project_code": f"P{n % 2}", "client_name": client_name,
+                    "items": [{"description": "Build", "qty": n + 1, "rate": 6500},
+                              {"description": "QA", "qty": 2.5, "rate": 4500}]}
+            ids.append(call(f"create {n}", "POST", "/requests", json=body, headers=am)["id"])
+        bulk = {"requests": [{"name": f"Bulk {n}", "client_name": "Umbrella",
+                              "items": [{"description": "Ops", "qty": 1, "rate": 1000 * n}]}
+                             for n in range(3)]}
+        ids += [r["id"] for r in call("bulk create", "POST", "/requests/bulk", json=bulk,
+                                      headers=am)["results"]]
+
+        keyed = {**am, "Idempotency-Key": "parity-1"}
+        ids.append(call("create keyed", "POST", "/requests", json=bulk["requests"][0], headers=keyed)["id"])
+        call("create keyed retry", "POST", "/requests", json=bulk["requests"][0], headers=keyed)
+        call("create keyed reuse", "POST", "/requests", json=bulk["requests"][1], headers=keyed)
+
+        call("am list", "GET", "/requests", headers=am)
+        call("am list page", "GET", "/requests", params={"limit": 3, "fields": "name,state"}, headers=am)
+        call("fd list drafts", "GET", "/requests", params={"state": "draft"}, headers=fd)
+        call("fd list", "GET", "/requests", headers=fd)
+
+        for rid in ids:
+            call(f"submit {rid}", "POST", f"/requests/{rid}/submit", headers=am)
+        call("submit twice", "POST", f"/requests/{ids[0]}/submit", headers=am)
+        call("review", "POST", f"/approvals/{ids[0]}/review", headers=fd,
+             json={"note": "trim", "totals_delta": {"grand_total": 9000, "discount": 5}})
+        call("review bad", "POST", f"/approvals/{ids[0]}/review", headers=fd,
+             json={"totals_delta": {"currency": "peso"}})
+        call("approve", "POST", f"/approvals/{ids[0]}/approve", json={"note": "ok"}, headers=fd)
+        call("reopen", "POST", f"/approvals/{ids[0]}/review", headers=fd,
+             json={"totals_delta": {"po": "PO-1", "discount": None}})
+        call("approve again", "POST", f"/approvals/{ids[0]}/approve", json={}, headers=fd)
+        call("reject", "POST", f"/approvals/{ids[1]}/reject", json={"note": "no"}, headers=fd)
+        call("approve missing", "POST", "/approvals/999999/approve", json={}, headers=fd)
+        decisions = [{"id": rid, "action": "approve" if n % 2 else "reject"}
+                     for n, rid in enumerate(ids[2:])]
+        decisions += [{"id": ids[1], "action": "approve"}, {"id": 999999, "action": "reject"}]
+        call("batch", "POST", "/approvals/batch", json={"decisions": decisions}, headers=fd)
+
+        for rid in ids[:3]:
+            call(f"get {rid}", "GET", f"/requests/{rid}", headers=fd)
+        call("get missing", "GET", "/requests/999999", headers=fd)
+        call("fd list approved", "GET", "/requests", params={"state": "approved"}, headers=fd)
+        call("fd list dates", "GET", "/requests",
+             params={"from": "2000-01-01", "to": "2999-12-31", "client_name": "Acme"}, headers=fd)
+        call("report state", "GET", "/reports/pipeline", headers=fd)
+        call("report client", "GET", "/reports/pipeline",
+             params={"group_by": "am_email,client_name"}, headers=fd)
+        call("report am", "GET", "/reports/pipeline", params={"group_by": "state,month"}, headers=am)
+        call("pdf", "GET", f"/pdf/{ids[0]}")
+        call("pdf not approved", "GET", f"/pdf/{ids[1]}")
+    return steps
+
+def _prepare_postgres(url, reset):
+    import psycopg
+    with psycopg.connect(url, autocommit=True) as conn:
+        existing = conn.execute(
+            "SELECT COUNT(*) FROM information_schema.tables"
+            " WHERE table_schema = current_schema() AND table_name = ANY(%s)",
+            (list(TABLES),)).fetchone()[0]
+        if existing and not reset:
+            raise SystemExit("Postgres database already has rate-card tables; pass --reset to drop them")
+        conn.execute(f"DROP TABLE IF EXISTS {', '.join(TABLES)} CASCADE")
+
+def _run_backend(label, env, workdir):
+    out = os.path.join(workdir, f"{label}.json")
+    child_env = {**os.environ, **env, "RC_PDF_CACHE_DIR": os.path.join(workdir, f"{label}-pdf")}
+    child_env.pop("RC_ROLES_BACKEND", None)
+    subprocess.run([sys.executable, __file__, "--scenario", out], env=child_env, check=True,
+                   stdout=subprocess.DEVNULL)
+    with open(out) as f:
+        return json.load(f)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare API behaviour on SQLite and Postgres.")
+    parser.add_argument("--pg-url", default=os.environ.get("RC_PARITY_PG_URL"))
+    parser.add_argument("--reset", action="store_true", help="drop existing rate-card tables first")
+    parser.add_argument("--scenario", help=argparse.SUPPRESS)  # child mode: transcript path
+    args = parser.parse_args()
+
+    if args.scenario:
+        with open(args.scenario, "w") as f:
+            json.dump(run_scenario(), f)
+        return 0
+    if not args.pg_url:
+        parser.error("--pg-url (or RC_PARITY_PG_URL) is required")
+
+    _prepare_postgres(args.pg_url, args.reset)
+    with tempfile.TemporaryDirectory() as workdir:
+        sqlite_steps = _run_backend("sqlite", {"RC_DB_URL": "", "RC_DB_PATH": os.path.join(
+            workdir, "parity.sqlite")}, workdir)
+        pg_steps = _run_backend("postgres", {"RC_DB_URL": args.pg_url}, workdir)
+
+    differences = 0
+    for sqlite_step, pg_step in zip(sqlite_steps, pg_steps):
+        if sqlite_step != pg_step:
+            differences += 1
+            print(f"DIFF {sqlite_step['step']}")
+            print(f"  sqlite:   {json.dumps(sqlite_step, sort_keys=True)}")
+            print(f"  postgres: {json.dumps(pg_step, sort_keys=True)}")
+    if len(sqlite_steps) != len(pg_steps):
+        differences += 1
+        print(f"DIFF step count: sqlite={len(sqlite_steps)} postgres={len(pg_steps)}")
+    print(f"{len(sqlite_steps)} steps, {differences} differing")
+    return 1 if differences else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,445 @@
+"""PDF rendering, render worker pool and on-disk cache for approved quotes."""
+import os
+import time
+import uuid
+import asyncio
+import hashlib
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import metrics
+
+CACHE_DIR = os.environ.get("RC_PDF_CACHE_DIR", "./pdf_cache")
+CACHE_MAX_BYTES = int(os.environ.get("RC_PDF_CACHE_MAX_MB", "256")) * 1024 * 1024
+
+RENDER_WORKERS = int(os.environ.get("RC_PDF_WORKERS", str(os.cpu_count() or 2)))
+MAX_JOBS = int(os.environ.get("RC_PDF_MAX_JOBS", "1000"))
+JOB_TTL = 3600  # seconds a finished job stays retrievable
+
+EXTENSIONS = {"application/pdf": ".pdf", "text/html": ".html"}
+
+def render_html(request, items):
+    """Build the quote HTML from a request row and its item rows."""
+    totals = {k: request[k] for k in ("subtotal", "tax", "grand_total")}
+    
+    html = f"""
+    <html>
+    <head>
+        <style>
+            body {{ 
+                font-family: 'Inter', -apple-system, sans-serif; 
+                background: #F2F7F2; 
+                color: #111; 
+                padding: 40px;
+            }}
+            h1 {{ color: #386641; margin-bottom: 10px; }}
+            .accent {{ color: #D4AC0D; }}
+            .meta {{ margin-bottom: 30px; color: #666; }}
+            table {{ 
+                width: 100%; 
+                border-collapse: collapse; 
+                background: white;
+                margin: 20px 0;
+            }}
+            th, td {{ 
+                border: 1px solid #ddd; 
+                padding: 12px; 
+                text-align: left;
+            }}
+            th {{ 
+                background: #386641; 
+                color: white; 
+            }}
+            .total-row {{ 
+                background: #F2F7F2; 
+                font-weight: bold;
+            }}
+            .grand-total {{ 
+                font-size: 24px; 
+                color: #D4AC0D; 
+                margin-top: 20px;
+            }}
+        </style>
+    </head>
+    <body>
+        <h1>Rate Card Pro — Approved Quote</h1>
+        <div class="meta">
+            <p><strong>Quote:</strong> {request['name']}</p>
+            <p><strong>Project Code:</strong> {request['project_code'] or 'N/A'}</p>
+            <p><strong>Client:</strong> {request['client_name'] or 'N/A'}</p>
+            <p><strong>Account Manager:</strong> {request['am_email']}</p>
+        </div>
+        
+        <table>
+            <thead>
+                <tr>
+                    <th>Description</th>
+                    <th style="text-align: right;">Qty</th>
+                    <th style="text-align: right;">Rate (₱)</th>
+                    <th style="text-align: right;">Subtotal (₱)</th>
+                </tr>
+            </thead>
+            <tbody>
+                {''.join(f'''
+                <tr>
+                    <td>{item['description']}</td>
+                    <td style="text-align: right;">{item['qty']}</td>
+                    <td style="text-align: right;">{item['rate']:,.2f}</td>
+                    <td style="text-align: right;">{item['subtotal']:,.2f}</td>
+                </tr>
+                ''' for item in items)}
+                <tr class="total-row">
+                    <td colspan="3" style="text-align: right;">Subtotal:</td>
+                    <td style="text-align: right;">₱{totals.get('subtotal', 0):,.2f}</td>
+                </tr>
+                <tr class="total-row">
+                    <td colspan="3" style="text-align: right;">Tax (12%):</td>
+                    <td style="text-align: right;">₱{totals.get('tax', 0):,.2f}</td>
+                </tr>
+            </tbody>
+        </table>
+        
+        <div class="grand-total">
+            <strong>Grand Total: ₱{totals.get('grand_total', 0):,.2f}</strong>
+        </div>
+    </body>
+    </html>
+    """
+    return html
+
+def render_quote(request, items):
+    """Render a quote, returning (content bytes, media type)."""
+    html = render_html(request, items)
+    
+    # Generate PDF using WeasyPrint
+    try:
+        from weasyprint import HTML
+        return HTML(string=html).write_pdf(), "application/pdf"
+    except ImportError:
+        # Fallback: return HTML if WeasyPrint not available
+        return html.encode(), "text/html"
+
+def render_quote_timed(request, items):
+    """render_quote for the worker pool; also returns the render time in seconds."""
+    start = time.perf_counter()
+    content, media_type = render_quote(request, items)
+    return content, media_type, time.perf_counter() - start
+
+class CachedPDF:
+    """A rendered quote stored on disk."""
+
+    def __init__(self, path, size, etag, media_type):
+        self.path = path
+        self.size = size
+        self.etag = etag
+        self.media_type = media_type
+
+    def read(self):
+        with open(self.path, "rb") as f:
+            return f.read()
+
+class PDFCache:
+    """Size-bounded LRU cache of rendered quotes keyed by (request_id, version_no).
+
+    Approved quotes are immutable per approval_snapshot version, so an entry
+    never goes stale; a re-approval creates a new version and drops the old
+    ones. ETags are the content hash, so they survive restarts.
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        """Index files left by a previous process, oldest first."""
+        found = []
+        for name in os.listdir(self.directory):
+            stem, ext = os.path.splitext(name)
+            media_type = next((m for m, e in EXTENSIONS.items() if e == ext), None)
+            try:
+                rid, version, digest = stem.split("-")
+                key = (int(rid), int(version.lstrip("v")))
+            except ValueError:
+                continue
+            if media_type is None:
+                continue
+            path = os.path.join(self.directory, name)
+            stat = os.stat(path)
+            found.append((stat.st_mtime, key, CachedPDF(path, stat.st_size, f'"{digest}"', media_type)))
+        for _, key, entry in sorted(found, key=lambda f: f[0]):
+            self._entries[key] = entry
+            self._bytes += entry.size
+        self._evict()
+
+    def get(self, rid, version):
+        """Return the cached entry and mark it recently used, or None."""
+        with self._lock:
+            entry = self._entries.get((rid, version))
+            if entry is not None:
+                self._entries.move_to_end((rid, version))
+            return entry
+
+    def put(self, rid, version, content, media_type):
+        """Store rendered content and return its entry."""
+        digest = hashlib.sha256(content).hexdigest()[:32]
+        name = f"{rid}-v{version}-{digest}{EXTENSIONS[media_type]}"
+        path = os.path.join(self.directory, name)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(content)
+        os.replace(tmp, path)
+
+        entry = CachedPDF(path, len(content), f'"{digest}"', media_type)
+        with self._lock:
+            previous = self._entries.pop((rid, version), None)
+            if previous is not None:
+                self._bytes -= previous.size
+                if previous.path != path:
+                    _unlink(previous.path)
+            self._entries[(rid, version)] = entry
+            self._bytes += entry.size
+            self._evict()
+        return entry
+
+    def invalidate(self, rid, keep_version=None):
+        """Drop every cached version of a request except `keep_version`."""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == rid and k[1] != keep_version]:
+                entry = self._entries.pop(key)
+                self._bytes -= entry.size
+                _unlink(entry.path)
+
+    def discard(self, rid, version, entry):
+        """Drop `entry` if it is still the cached one, e.g. after its file went missing."""
+        with self._lock:
+            if self._entries.get((rid, version)) is entry:
+                del self._entries[(rid, version)]
+                self._bytes -= entry.size
+
+    def _evict(self):
+        # Caller holds the lock (or is __init__)
+        while self._bytes > self.max_bytes and self._entries:
+            _, entry = self._entries.popitem(last=False)
+            self._bytes -= entry.size
+            _unlink(entry.path)
+
+    @property
+    def total_bytes(self):
+        return self._bytes
+
+def _unlink(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+pdf_cache = PDFCache()
+
+class RenderJob:
+    """Status of one asynchronous render."""
+
+    def __init__(self, rid, version):
+        self.id = uuid.uuid4().hex
+        self.rid = rid
+        self.version = version
+        self.status = "queued"
+        self.error = None
+        self.entry = None
+        self.finished_at = None
+
+    def as_dict(self):
+        job = {"id": self.id, "request_id": self.rid, "version": self.version, "status": self.status}
+        if self.error:
+            job["error"] = self.error
+        return job
+
+class RenderService:
+    """Renders quotes in worker processes so WeasyPrint never blocks a request worker.
+
+    At most `workers` renders run at once; further callers wait on the
+    semaphore. Concurrent renders of the same (request_id, version) share
+    one task, and every result lands in the PDF cache.
+
+    `jobs` lives in this process only, so /pdf/jobs/{id} needs every
+    request to reach the worker that created the job: run the API as a
+    single uvicorn worker (see README).
+    """
+
+    def __init__(self, cache, workers=RENDER_WORKERS, max_jobs=MAX_JOBS):
+        self.cache = cache
+        self.workers = workers
+        self.max_jobs = max_jobs
+        self.jobs = {}
+        self._executor = None
+        self._slots = asyncio.Semaphore(workers)
+        self._inflight = {}
+
+    def _pool(self):
+        if self._executor is None:
+            # spawn: forking a process that already runs DB threads is unsafe
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    def _reset_pool(self, broken):
+        # Concurrent renders may all see the same broken pool; only the first
+        # replaces it
+        if self._executor is broken:
+            self._executor = None
+            broken.shutdown(wait=False, cancel_futures=True)
+
+    async def render(self, rid, version, load):
+        """Return the cache entry for a quote, rendering it if needed.
+
+        `load` is an async callable returning (request, items) rows; it is
+        only awaited on a cache miss.
+        """
+        entry = self.cache.get(rid, version)
+        if entry is not None:
+            return entry
+        key = (rid, version)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._render(rid, version, load))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def read(self, rid, version, load):
+        """Return (entry, content bytes) for a quote, rendering it if needed.
+
+        Eviction can unlink a cached file between the lookup and the
+        read; the quote is then rendered again instead of failing.
+        """
+        entry = await self.render(rid, version, load)
+        try:
+            return entry, entry.read()
+        except FileNotFoundError:
+            self.cache.discard(rid, version, entry)
+        entry = await self.render(rid, version, load)
+        return entry, entry.read()
+
+    async def _render(self, rid, version, load):
+        request, items = await load()
+        # Rows go to another process, so send plain dicts
+        request = dict(request)
+        items = [dict(i) for i in items]
+        async with self._slots:
+            loop = asyncio.get_running_loop()
+            executor = self._pool()
+            try:
+                content, media_type, seconds = await loop.run_in_executor(
+                    executor, render_quote_timed, request, items
+                )
+            except BrokenProcessPool:
+                # A worker died (OOM, crash in a native library) and took the
+                # pool with it; start a fresh one and retry this render once
+                self._reset_pool(executor)
+                content, media_type, seconds = await loop.run_in_executor(
+                    self._pool(), render_quote_timed, request, items
+                )
+        metrics.pdf_render_seconds.observe(seconds, media_type=media_type)
+        return self.cache.put(rid, version, content, media_type)
+
+    def submit(self, rid, version, load):
+        """Start a background render and return its job.
+
+        Only queued and running jobs count towards `max_jobs`; finished
+        ones are dropped oldest first to make room.
+        """
+        self._prune()
+        if len(self.jobs) >= self.max_jobs:
+            finished = [j.id for j in self.jobs.values() if j.finished_at]
+            if len(self.jobs) - len(finished) >= self.max_jobs:
+                raise OverflowError("too many render jobs")
+            for job_id in finished[:len(self.jobs) - self.max_jobs + 1]:
+                del self.jobs[job_id]
+        job = RenderJob(rid, version)
+        self.jobs[job.id] = job
+        asyncio.ensure_future(self._run_job(job, load))
+        return job
+
+    async def _run_job(self, job, load):
+        job.status = "running"
+        try:
+            job.entry = await self.render(job.rid, job.version, load)
+            job.status = "done"
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+        job.finished_at = time.monotonic()
+
+    def _prune(self):
+        cutoff = time.monotonic() - JOB_TTL
+        for job_id in [j.id for j in self.jobs.values() if j.finished_at and j.finished_at < cutoff]:
+            del self.jobs[job_id]
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self._slots = asyncio.Semaphore(self.workers)
+
+renderer = RenderService(pdf_cache)
+
+class ZipStream:
+    """Write-only sink that lets zipfile emit an archive chunk by chunk.
+
+    It has no tell()/seek(), so zipfile writes data descriptors instead of
+    seeking back, and the caller drains the bytes after every member.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+class ExportProgress:
+    """Progress of one streamed ZIP export."""
+
+    def __init__(self, total):
+        self.id = uuid.uuid4().hex
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.status = "running"
+        self.finished_at = None
+
+    def finish(self, status):
+        self.status = status
+        self.finished_at = time.monotonic()
+
+    def as_dict(self):
+        return {"id": self.id, "status": self.status, "total": self.total,
+                "done": self.done, "failed": self.failed}
+
+exports = {}
+
+def track_export(total):
+    """Register a new export, dropping ones that finished over JOB_TTL ago."""
+    cutoff = time.monotonic() - JOB_TTL
+    for export_id in [e.id for e in exports.values() if e.finished_at and e.finished_at < cutoff]:
+        del exports[export_id]
+    progress = ExportProgress(total)
+    exports[progress.id] = progress
+    return progress
@@ -0,0 +1,340 @@
+"""Postgres connection pool and schema, behind the same interface as the SQLite pool.
+
+Selected by RC_DB_URL (see database.py). Connections are handed out
+wrapped in PGConnection, which accepts the `?` placeholders and
+sqlite3-style transaction calls the data-access code is written with,
+so that code runs unchanged on either database. psycopg prepares each
+statement server-side once it has run RC_PG_PREPARE_THRESHOLD times on
+a connection, and reuses the plan after that.
+
+Requires `psycopg` and `psycopg_pool` (psycopg 3); they are only
+imported when Postgres is configured.
+"""
+import os
+import re
+import functools
+from contextlib import contextmanager
+
+import psycopg
+from psycopg import pq
+from psycopg.types.string import TextLoader
+from psycopg_pool import ConnectionPool as PsycopgPool
+
+PREPARE_THRESHOLD = int(os.environ.get("RC_PG_PREPARE_THRESHOLD", "0"))  # 0: prepare on first run
+PREPARED_MAX = int(os.environ.get("RC_PG_PREPARED_MAX", "256"))  # prepared statements kept per connection
+
+Error = psycopg.Error
+IntegrityError = psycopg.IntegrityError
+
+_IMPLICIT_BEGIN = ("INSERT", "UPDATE", "DELETE")
+# Quoted string literals and identifiers, with '' / "" escapes
+_QUOTED = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*")""")
+
+@functools.lru_cache(maxsize=1024)
+def _translate(sql):
+    """sqlite3 SQL -> psycopg: `?` placeholders, literal %, BEGIN IMMEDIATE.
+
+    A `?` inside a quoted literal or identifier is left alone. `%` is
+    doubled everywhere: psycopg scans literals for placeholders too and
+    turns `%%` back into `%`.
+    """
+    parts = _QUOTED.split(sql.replace("%", "%%"))
+    parts[::2] = [part.replace("?", "%s") for part in parts[::2]]
+    sql = "".join(parts)
+    if sql.strip().upper() == "BEGIN IMMEDIATE":
+        return "BEGIN"  # writers serialize on row locks instead
+    return sql
+
+class Row(dict):
+    """Result row readable by column name or by position, like sqlite3.Row."""
+
+    __slots__ = ("_values",)
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, slice)):
+            return self._values[key]
+        return dict.__getitem__(self, key)
+
+    def __iter__(self):
+        return iter(self._values)
+
+def row_factory(cursor):
+    names = [c.name for c in cursor.description or ()]
+
+    def make_row(values):
+        row = Row(zip(names, values))
+        row._values = values
+        return row
+    return make_row
+
+class PGCursor:
+    def __init__(self, conn, cursor):
+        self._conn = conn
+        self._cursor = cursor
+
+    def execute(self, sql, params=()):
+        self._conn._before(sql)
+        self._cursor.execute(_translate(sql), params)
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        self._conn._before(sql)
+        self._cursor.executemany(_translate(sql), seq_of_params)
+        return self
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+class PGConnection:
+    """A pooled psycopg connection with the sqlite3.Connection calls the app uses.
+
+    Like sqlite3, a transaction is opened implicitly before the first
+    INSERT/UPDATE/DELETE and lasts until commit() or rollback(); explicit
+    BEGIN and SAVEPOINT statements pass through.
+    """
+
+    def __init__(self, raw):
+        self.raw = raw
+        self._trace = None
+
+    def set_trace_callback(self, callback):
+        self._trace = callback
+
+    @property
+    def in_transaction(self):
+        return self.raw.info.transaction_status != pq.TransactionStatus.IDLE
+
+    def _before(self, sql):
+        if self._trace is not None:
+            self._trace(sql)
+        if not self.in_transaction and sql.lstrip()[:6].upper() in _IMPLICIT_BEGIN:
+            self.raw.execute("BEGIN")
+
+    def cursor(self, dicts=False):
+        """A cursor; `dicts=True` yields plain dict rows (cf. database.dict_row)."""
+        return PGCursor(self, self.raw.cursor(row_factory=psycopg.rows.dict_row if dicts else row_factory))
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
+
+    def commit(self):
+        if self.in_transaction:
+            self.raw.execute("COMMIT")
+
+    def rollback(self):
+        if self.in_transaction:
+            self.raw.execute("ROLLBACK")
+
+def _configure(raw):
+    raw.prepare_threshold = PREPARE_THRESHOLD
+    raw.prepared_max = PREPARED_MAX
+    # Timestamps come back as text, exactly like SQLite's CURRENT_TIMESTAMP
+    raw.adapters.register_loader("timestamp", TextLoader)
+
+class PostgresPool:
+    """psycopg_pool.ConnectionPool exposing database.ConnectionPool's interface."""
+
+    def __init__(self, url, size, timeout):
+        self.url = url
+        self.size = size
+        self.timeout = timeout
+        # Callables run on each checked-out connection (e.g. trace callbacks)
+        self.connect_hooks = []
+        self._pool = None
+
+    def _open(self):
+        if self._pool is None:
+            self._pool = PsycopgPool(
+                self.url, min_size=1, max_size=self.size, timeout=self.timeout,
+                kwargs={"autocommit": True, "row_factory": row_factory,
+                        "options": "-c timezone=UTC"},
+                configure=_configure, open=True,
+            )
+        return self._pool
+
+    @contextmanager
+    def connection(self):
+        """Context manager that checks out and returns a connection."""
+        with self._open().connection() as raw:
+            conn = PGConnection(raw)
+            for hook in self.connect_hooks:
+                hook(conn)
+            try:
+                yield conn
+            finally:
+                conn.rollback()  # anything left uncommitted
+
+    def close_all(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+
+    def init_schema(self):
+        """Create the schema if needed; concurrent workers serialize on an advisory lock."""
+        with self.connection() as conn:
+            conn.execute("BEGIN")
+            conn.execute("SELECT pg_advisory_xact_lock(hashtext('ratecard_schema'))")
+            for statement in SCHEMA:
+                conn.raw.execute(statement)
+            conn.commit()
+
+# Postgres equivalent of the SQLite schema at database.SCHEMA_VERSION,
+# column order included so SELECT * rows match. Every statement is
+# idempotent; extend it alongside each new database.MIGRATIONS step.
+SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS users(
+        id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        email TEXT UNIQUE NOT NULL,
+        name TEXT,
+        role TEXT NOT NULL CHECK(role IN('AM','FD')),
+        password_hash TEXT NOT NULL,
+        active INTEGER NOT NULL DEFAULT 1,
+        created_at TIMESTAMP(0) DEFAULT CURRENT_TIMESTAMP
+    )""",
+    """CREATE TABLE IF NOT EXISTS requests(
+        id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        name TEXT NOT NULL,
+        project_code TEXT,
+        client_name TEXT,
+        am_email TEXT NOT NULL,
+        state TEXT NOT NULL DEFAULT 'draft'
+            CHECK(state IN('draft','submitted','fd_review','approved','rejected')),
+        totals_json TEXT,
+        notes TEXT,
+        created_at TIMESTAMP(0) DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP(0) DEFAULT CURRENT_TIMESTAMP,
+        subtotal DOUBLE PRECISION NOT NULL DEFAULT 0,
+        tax DOUBLE PRECISION NOT NULL DEFAULT 0,
+        grand_total DOUBLE PRECISION NOT NULL DEFAULT 0,
+        currency TEXT NOT NULL DEFAULT 'PHP',
+        approval_version INTEGER NOT NULL DEFAULT 0
+    )""",
+    """CREATE TABLE IF NOT EXISTS request_items(
+        id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        request_id BIGINT NOT NULL REFERENCES requests(id) ON DELETE CASCADE,
+        description TEXT NOT NULL,
+        qty DOUBLE PRECISION NOT NULL DEFAULT 1,
+        rate DOUBLE PRECISION NOT NULL DEFAULT 0,
+        subtotal DOUBLE PRECISION NOT NULL DEFAULT 0,
+        position INTEGER NOT NULL DEFAULT 0
+    )""",
+    """CREATE TABLE IF NOT EXISTS approval_snapshot(
+        id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        request_id BIGINT NOT NULL REFERENCES requests(id) ON DELETE CASCADE,
+        version_no INTEGER NOT NULL DEFAULT 1,
+        locked_totals_json TEXT,
+        approved_at TIMESTAMP(0) DEFAULT CURRENT_TIMESTAMP,
+        locked_subtotal DOUBLE PRECISION NOT NULL DEFAULT 0,
+        locked_tax DOUBLE PRECISION NOT NULL DEFAULT 0,
+        locked_grand_total DOUBLE PRECISION NOT NULL DEFAULT 0,
+        locked_currency TEXT NOT NULL DEFAULT 'PHP',
+        UNIQUE(request_id, version_no)
+    )""",
+    """CREATE TABLE IF NOT EXISTS approval_events(
+        id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        request_id BIGINT NOT NULL REFERENCES requests(id) ON DELETE CASCADE,
+        actor_email TEXT NOT NULL,
+        action TEXT NOT NULL CHECK(action IN('create','submit','review','approve','reject','edit')),
+        note TEXT,
+        at TIMESTAMP(0) DEFAULT CURRENT_TIMESTAMP
+    )""",
+    """CREATE TABLE IF NOT EXISTS role_tiers(
+        id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        name TEXT UNIQUE NOT NULL,
+        hourly_rate DOUBLE PRECISION NOT NULL DEFAULT 0,
+        active INTEGER NOT NULL DEFAULT 1
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_request_items_request ON request_items(request_id, position)",
+    "CREATE INDEX IF NOT EXISTS idx_approval_events_request ON approval_events(request_id, at)",
+    "CREATE INDEX IF NOT EXISTS idx_requests_am_created ON requests(am_email, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_requests_state_created ON requests(state, created_at)",
+    """CREATE TABLE IF NOT EXISTS pipeline_rollup(
+        state TEXT NOT NULL,
+        am_email TEXT NOT NULL,
+        client_name TEXT NOT NULL,
+        month TEXT NOT NULL,
+        currency TEXT NOT NULL,
+        quote_count INTEGER NOT NULL DEFAULT 0,
+        subtotal DOUBLE PRECISION NOT NULL DEFAULT 0,
+        grand_total DOUBLE PRECISION NOT NULL DEFAULT 0,
+        PRIMARY KEY(state, am_email, client_name, month, currency)
+    )""",
+    """CREATE TABLE IF NOT EXISTS idempotency_keys(
+        actor_email TEXT NOT NULL,
+        key TEXT NOT NULL,
+        fingerprint TEXT NOT NULL,
+        response TEXT,
+        expires_at BIGINT NOT NULL,
+        PRIMARY KEY(actor_email, key)
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires ON idempotency_keys(expires_at)",
+    # Same bookkeeping as the SQLite rollup triggers (database.py, migration v3)
+    """CREATE OR REPLACE FUNCTION rc_pipeline_rollup() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            UPDATE pipeline_rollup SET
+                quote_count = quote_count - 1,
+                subtotal = subtotal - OLD.subtotal,
+                grand_total = grand_total - OLD.grand_total
+            WHERE state = OLD.state AND am_email = OLD.am_email
+              AND client_name = COALESCE(OLD.client_name, '')
+              AND month = to_char(OLD.created_at, 'YYYY-MM') AND currency = OLD.currency;
+            DELETE FROM pipeline_rollup
+            WHERE quote_count <= 0 AND state = OLD.state AND am_email = OLD.am_email
+              AND client_name = COALESCE(OLD.client_name, '')
+              AND month = to_char(OLD.created_at, 'YYYY-MM') AND currency = OLD.currency;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            INSERT INTO pipeline_rollup(state, am_email, client_name, month, currency,
+                                        quote_count, subtotal, grand_total)
+            VALUES(NEW.state, NEW.am_email, COALESCE(NEW.client_name, ''),
+                   to_char(NEW.created_at, 'YYYY-MM'), NEW.currency, 1, NEW.subtotal, NEW.grand_total)
+            ON CONFLICT(state, am_email, client_name, month, currency) DO UPDATE SET
+                quote_count = pipeline_rollup.quote_count + 1,
+                subtotal = pipeline_rollup.subtotal + EXCLUDED.subtotal,
+                grand_total = pipeline_rollup.grand_total + EXCLUDED.grand_total;
+        END IF;
+        RETURN NULL;
+    END $$""",
+    """CREATE OR REPLACE TRIGGER trg_rollup
+        AFTER INSERT OR DELETE
+           OR UPDATE OF state, am_email, client_name, currency, subtotal, grand_total, created_at
+        ON requests FOR EACH ROW EXECUTE FUNCTION rc_pipeline_rollup()""",
+    # SQLite functions the shared SQL relies on
+    """CREATE OR REPLACE FUNCTION rc_merge_patch(target jsonb, patch jsonb)
+    RETURNS jsonb LANGUAGE plpgsql IMMUTABLE AS $$
+    DECLARE
+        k text;
+        v jsonb;
+    BEGIN
+        IF jsonb_typeof(patch) IS DISTINCT FROM 'object' THEN
+            RETURN patch;
+        END IF;
+        IF jsonb_typeof(target) IS DISTINCT FROM 'object' THEN
+            target := '{}';
+        END IF;
+        FOR k, v IN SELECT * FROM jsonb_each(patch) LOOP
+            IF v = 'null' THEN
+                target := target - k;
+            ELSE
+                target := jsonb_set(target, ARRAY[k], rc_merge_patch(target -> k, v));
+            END IF;
+        END LOOP;
+        RETURN target;
+    END $$""",
+    """CREATE OR REPLACE FUNCTION json_patch(target text, patch text)
+    RETURNS text LANGUAGE sql IMMUTABLE AS
+    $$ SELECT rc_merge_patch(target::jsonb, patch::jsonb)::text $$""",
+    """CREATE OR REPLACE FUNCTION round(value double precision, places integer)
+    RETURNS double precision LANGUAGE sql IMMUTABLE AS
+    $$ SELECT round(value::numeric, places)::double precision $$""",
+)
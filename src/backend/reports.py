@@ -0,0 +1,97 @@
+"""Pipeline reporting over the pipeline_rollup table.
+
+The rollup is maintained by triggers on `requests` (see migration v3 in
+database.py), so report queries scan groups rather than quotes. `rebuild`
+and `check` recompute it from scratch:
+
+    python reports.py check      # exit 1 if the rollup has drifted
+    python reports.py rebuild
+
+Like the API, they use the database selected by RC_DB_URL / RC_DB_PATH.
+"""
+import sys
+import argparse
+
+from database import ROLLUP_RECOMPUTE, pool
+from storage import store
+
+GROUP_COLUMNS = ("state", "am_email", "client_name", "month")
+TOLERANCE = 0.005  # float drift allowed between rollup and recompute sums
+
+def pipeline_report(conn, group_by, filters):
+    """Sum the rollup over `group_by` columns; results are always split by currency.
+
+    `filters` maps rollup columns to a value (or a tuple of allowed values);
+    `month_from`/`month_to` bound the YYYY-MM month inclusively.
+    """
+    where, params = [], []
+    for column, value in filters.items():
+        if value is None:
+            continue
+        if column == "month_from":
+            where.append("month >= ?")
+            params.append(value)
+        elif column == "month_to":
+            where.append("month <= ?")
+            params.append(value)
+        elif isinstance(value, tuple):
+            where.append(f"{column} IN ({', '.join('?' * len(value))})")
+            params.extend(value)
+        else:
+            where.append(f"{column}=?")
+            params.append(value)
+
+    keys = ", ".join([*group_by, "currency"])
+    rows = conn.execute(f"""
+        SELECT {keys}, SUM(quote_count) AS quote_count,
+               ROUND(SUM(subtotal), 2) AS subtotal, ROUND(SUM(grand_total), 2) AS grand_total
+        FROM pipeline_rollup
+        {'WHERE ' + ' AND '.join(where) if where else ''}
+        GROUP BY {keys}
+        ORDER BY {keys}
+    """, params).fetchall()
+    return [dict(r) for r in rows]
+
+def rebuild_rollup(conn):
+    """Replace the rollup with a full recompute from `requests`."""
+    with store.transaction(conn):
+        conn.execute("DELETE FROM pipeline_rollup")
+        conn.execute(f"INSERT INTO pipeline_rollup {ROLLUP_RECOMPUTE}")
+    return conn.execute("SELECT COUNT(*) FROM pipeline_rollup").fetchone()[0]
+
+def check_rollup(conn):
+    """Compare the rollup with a full recompute; returns the mismatched groups."""
+    conn.execute(store.snapshot_sql)  # one snapshot for both reads
+    try:
+        stored = {tuple(r[:5]): tuple(r[5:]) for r in conn.execute(
+            "SELECT state, am_email, client_name, month, currency, quote_count, subtotal, grand_total"
+            " FROM pipeline_rollup")}
+        expected = {tuple(r[:5]): tuple(r[5:]) for r in conn.execute(ROLLUP_RECOMPUTE)}
+    finally:
+        conn.rollback()
+
+    mismatches = []
+    for key in sorted(stored.keys() | expected.keys()):
+        have, want = stored.get(key), expected.get(key)
+        if have is None or want is None or have[0] != want[0] or any(
+                abs(a - b) > TOLERANCE for a, b in zip(have[1:], want[1:])):
+            mismatches.append({"group": key, "rollup": have, "recompute": want})
+    return mismatches
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the pipeline rollup table.")
+    parser.add_argument("command", choices=("check", "rebuild"))
+    args = parser.parse_args()
+
+    with pool.connection() as conn:
+        if args.command == "rebuild":
+            print(f"rebuilt pipeline_rollup: {rebuild_rollup(conn)} groups")
+            return 0
+        mismatches = check_rollup(conn)
+        for m in mismatches:
+            print(f"MISMATCH {m['group']}: rollup={m['rollup']} recompute={m['recompute']}")
+        print(f"{len(mismatches)} mismatched groups")
+        return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
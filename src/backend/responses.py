@@ -0,0 +1,118 @@
+"""JSON rendering and response compression for the API.
+
+orjson and brotli are optional: without orjson responses are encoded with
+the stdlib json module, and without brotli only gzip is offered.
+"""
+import os
+import json
+import gzip
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.environ.get("RC_COMPRESS_MIN_BYTES", "1024"))
+COMPRESSIBLE_TYPES = ("application/json", "text/html", "text/plain", "text/csv")
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4  # dynamic content: much faster than the default 11, still smaller than gzip
+
+def dumps(content):
+    """Encode `content` as compact UTF-8 JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False,
+                      separators=(",", ":")).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson when it is installed.
+
+    Returned directly from a handler, it also skips FastAPI's
+    jsonable_encoder pass, so the content must already be plain JSON
+    types (e.g. rows fetched with database.dict_row).
+    """
+
+    def render(self, content):
+        return dumps(content)
+
+def _accepted(accept_encoding):
+    """Codings the client accepts, ignoring q=0."""
+    codings = set()
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        if params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            codings.add(name.strip().lower())
+    return codings
+
+class CompressionMiddleware:
+    """Brotli/gzip for complete text responses of at least `minimum_size` bytes.
+
+    Only single-message bodies are compressed: streamed responses (the SSE
+    event stream, ZIP exports) pass through untouched so their chunks are
+    not held back, and PDFs are left alone as already compressed.
+    """
+
+    def __init__(self, app, minimum_size=COMPRESS_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = dict(scope["headers"])
+        accepted = _accepted(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if brotli is not None and "br" in accepted:
+            coding = "br"
+        elif "gzip" in accepted:
+            coding = "gzip"
+        else:
+            return await self.app(scope, receive, send)
+
+        start = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                return await send(message)
+            if start is not None:
+                initial, start = start, None
+                body = message.get("body", b"")
+                if message.get("more_body") or not self._compressible(initial, body):
+                    passthrough = True
+                    await send(initial)
+                    return await send(message)
+                body = (brotli.compress(body, quality=BROTLI_QUALITY) if coding == "br"
+                        else gzip.compress(body, compresslevel=GZIP_LEVEL))
+                raw = [(k, v) for k, v in initial["headers"]
+                       if k.lower() not in (b"content-length", b"vary")]
+                vary = [v for k, v in initial["headers"] if k.lower() == b"vary"]
+                raw += [
+                    (b"content-encoding", coding.encode()),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"vary", b", ".join(vary + [b"Accept-Encoding"])),
+                ]
+                await send({**initial, "headers": raw})
+                return await send({"type": "http.response.body", "body": body})
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
+
+    def _compressible(self, start, body):
+        if len(body) < self.minimum_size:
+            return False
+        headers = dict((k.lower(), v) for k, v in start["headers"])
+        if b"content-encoding" in headers:
+            return False
+        content_type = headers.get(b"content-type", b"").decode("latin-1").split(";")[0].strip()
+        return content_type in COMPRESSIBLE_TYPES
@@ -1,16 +1,22 @@
 """Security dependencies for FastAPI endpoints."""
+from functools import lru_cache
 from fastapi import Header, HTTPException
-from auth import decode_jwt
+from auth import verify_jwt
 
+@lru_cache(maxsize=None)
 def require(role: str = None):
-    """Create a dependency that requires authentication and optionally a specific role."""
-    def dependency(authorization: str = Header(None)):
+    """Create a dependency that requires authentication and optionally a specific role.
+
+    Memoized per role, so every route shares one dependency object and
+    FastAPI resolves it once per request.
+    """
+    async def dependency(authorization: str = Header(None)):
         if not authorization or not authorization.startswith("Bearer "):
             raise HTTPException(status_code=401, detail="Missing or invalid authorization header")
         
         try:
             token = authorization.split()[1]
-            claims = decode_jwt(token)
+            claims = verify_jwt(token)
         except Exception as e:
             raise HTTPException(status_code=401, detail=f"Invalid token: {str(e)}")
         
@@ -0,0 +1,220 @@
+"""Data access for the API handlers: one repository over SQLite or Postgres.
+
+Handlers in main.py call `store` methods through run_db, which passes a
+connection from database.pool. The SQL is written once, in the subset
+both databases accept (postgres.PGConnection translates the `?`
+placeholders); SQLiteStorage and PostgresStorage only supply what
+differs: dict-row cursors, the driver's error classes and how a write
+transaction starts. Domain modules (workflow, reports, events, catalog)
+keep their own queries, in the same portable subset.
+"""
+import sqlite3
+from contextlib import contextmanager
+
+import database
+import workflow
+
+class Storage:
+    begin_sql = "BEGIN"
+    # Opens a read-only transaction whose reads all see one snapshot
+    snapshot_sql = "BEGIN"
+    Error = Exception
+    IntegrityError = Exception
+
+    def dict_cursor(self, conn):
+        """A cursor whose rows are plain dicts, ready for FastJSONResponse."""
+        raise NotImplementedError
+
+    @contextmanager
+    def transaction(self, conn):
+        """BEGIN ... COMMIT around the block, rolled back if it raises.
+
+        Inside a transaction the caller already opened, the block runs
+        under a savepoint instead and the caller commits.
+        """
+        if conn.in_transaction:
+            with self.savepoint(conn, "nested"):
+                yield
+            return
+        conn.execute(self.begin_sql)
+        try:
+            yield
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+    @contextmanager
+    def savepoint(self, conn, name="item"):
+        """Undo the block's writes if it raises, keeping the enclosing transaction."""
+        conn.execute(f"SAVEPOINT {name}")
+        try:
+            yield
+        except BaseException:
+            conn.execute(f"ROLLBACK TO {name}")
+            conn.execute(f"RELEASE {name}")
+            raise
+        conn.execute(f"RELEASE {name}")
+
+    # Users and role tiers
+
+    def find_user(self, conn, email):
+        return conn.execute(
+            "SELECT * FROM users WHERE email=? AND active=1",
+            (email,)
+        ).fetchone()
+
+    def update_password_hash(self, conn, user_id, password_hash):
+        conn.execute("UPDATE users SET password_hash=? WHERE id=?", (password_hash, user_id))
+        conn.commit()
+
+    def seed(self, conn, users, tiers):
+        """Insert (email, name, role, password_hash) users and (name, rate) tiers that are missing."""
+        conn.executemany("""
+            INSERT INTO users(email, name, role, password_hash, active)
+            VALUES(?, ?, ?, ?, 1) ON CONFLICT DO NOTHING
+        """, users)
+        conn.executemany("""
+            INSERT INTO role_tiers(name, hourly_rate, active)
+            VALUES(?, ?, 1) ON CONFLICT DO NOTHING
+        """, tiers)
+        conn.commit()
+
+    # Requests
+
+    def insert_request(self, conn, request, am_email, items, totals):
+        """Insert a request, its (description, qty, rate, subtotal, position) items
+        and the create event; returns the new id. The caller commits."""
+        request_id = conn.execute("""
+            INSERT INTO requests(name, project_code, client_name, am_email, state,
+                                 subtotal, tax, grand_total, notes)
+            VALUES(?, ?, ?, ?, 'draft', ?, ?, ?, ?)
+            RETURNING id
+        """, (request.name, request.project_code, request.client_name, am_email,
+              totals["subtotal"], totals["tax"], totals["grand_total"], request.notes)).fetchone()[0]
+
+        # Items in a single batched statement
+        conn.executemany("""
+            INSERT INTO request_items(request_id, description, qty, rate, subtotal, position)
+            VALUES(?, ?, ?, ?, ?, ?)
+        """, [(request_id, *item) for item in items])
+
+        conn.execute("""
+            INSERT INTO approval_events(request_id, actor_email, action)
+            VALUES(?, ?, 'create')
+        """, (request_id, am_email))
+        return request_id
+
+    def list_requests(self, conn, limit, am_email=None, states=None, client_name=None,
+                      project_code=None, created_from=None, created_before=None,
+                      after=None, columns=None):
+        """Requests newest first, as dicts; `after` is a (created_at, id) keyset position."""
+        where, params = [], []
+        for column, value in (("am_email", am_email), ("client_name", client_name),
+                              ("project_code", project_code)):
+            if value is not None:
+                where.append(f"{column}=?")
+                params.append(value)
+        if states is not None:
+            where.append(f"state IN ({', '.join('?' * len(states))})")
+            params.extend(states)
+        if created_from:
+            where.append("created_at >= ?")
+            params.append(created_from)
+        if created_before:
+            where.append("created_at < ?")
+            params.append(created_before)
+        if after:
+            where.append("(created_at, id) < (?, ?)")
+            params.extend(after)
+
+        return self.dict_cursor(conn).execute(f"""
+            SELECT {', '.join(columns) if columns else '*'} FROM requests
+            {'WHERE ' + ' AND '.join(where) if where else ''}
+            ORDER BY created_at DESC, id DESC
+            LIMIT ?
+        """, (*params, limit)).fetchall()
+
+    def get_request(self, conn, rid):
+        """(request, items, events) as dicts, or None if there is no such request."""
+        cursor = self.dict_cursor(conn)
+        request = cursor.execute("SELECT * FROM requests WHERE id=?", (rid,)).fetchone()
+        if not request:
+            return None
+        items = cursor.execute("""
+            SELECT * FROM request_items WHERE request_id=? ORDER BY position
+        """, (rid,)).fetchall()
+        events = cursor.execute("""
+            SELECT * FROM approval_events WHERE request_id=? ORDER BY at DESC, id DESC
+        """, (rid,)).fetchall()
+        return request, items, events
+
+    def transition(self, conn, rid, action, actor, **kwargs):
+        """workflow.transition inside the caller's transaction."""
+        return workflow.transition(conn, rid, action, actor, **kwargs)
+
+    def apply_transition(self, conn, rid, action, actor, **kwargs):
+        """workflow.transition in a transaction of its own."""
+        with self.transaction(conn):
+            return workflow.transition(conn, rid, action, actor, **kwargs)
+
+    # Approved quotes and PDFs
+
+    def approved_version(self, conn, rid):
+        """Latest approval_snapshot version of an approved request, or None."""
+        row = conn.execute("""
+            SELECT approval_version FROM requests WHERE id=? AND state='approved'
+        """, (rid,)).fetchone()
+        return row[0] if row else None
+
+    def load_quote(self, conn, rid):
+        """The request row and item rows a quote PDF is rendered from."""
+        request = conn.execute("SELECT * FROM requests WHERE id=?", (rid,)).fetchone()
+        items = conn.execute("""
+            SELECT description, qty, rate, subtotal
+            FROM request_items WHERE request_id=? ORDER BY position
+        """, (rid,)).fetchall()
+        return request, items
+
+    def approved_quotes(self, conn, approved_from=None, approved_before=None):
+        """Approved requests whose latest approval falls in [approved_from, approved_before)."""
+        where, params = ["r.state='approved'"], []
+        if approved_from:
+            where.append("s.approved_at >= ?")
+            params.append(approved_from)
+        if approved_before:
+            where.append("s.approved_at < ?")
+            params.append(approved_before)
+        rows = conn.execute(f"""
+            SELECT r.id, r.name, s.version_no, s.approved_at
+            FROM requests r
+            JOIN approval_snapshot s ON s.request_id = r.id AND s.version_no = r.approval_version
+            WHERE {' AND '.join(where)}
+            ORDER BY r.id
+        """, params).fetchall()
+        return [dict(r) for r in rows]
+
+class SQLiteStorage(Storage):
+    # Take the write lock up front, so two writers never deadlock upgrading
+    begin_sql = "BEGIN IMMEDIATE"
+    Error = sqlite3.Error
+    IntegrityError = sqlite3.IntegrityError
+
+    def dict_cursor(self, conn):
+        cursor = conn.cursor()
+        cursor.row_factory = database.dict_row
+        return cursor
+
+class PostgresStorage(Storage):
+    # READ COMMITTED takes a new snapshot per statement
+    snapshot_sql = "BEGIN ISOLATION LEVEL REPEATABLE READ"
+
+    def __init__(self):
+        import postgres
+        self.Error = postgres.Error
+        self.IntegrityError = postgres.IntegrityError
+
+    def dict_cursor(self, conn):
+        return conn.cursor(dicts=True)
+
+store = PostgresStorage() if database.POSTGRES else SQLiteStorage()
@@ -0,0 +1,68 @@
+"""Query-plan regression test: no hot-table statement may full-scan.
+
+    cd src/backend && python -m unittest tests.test_query_plans
+
+Migrates a throwaway SQLite file, walks a quote through every endpoint
+and captures the real SQL via a trace callback on pooled connections, so
+new or edited queries are covered without listing them here. Each
+captured statement is then checked with EXPLAIN QUERY PLAN.
+"""
+import asyncio
+import re
+import sqlite3
+import unittest
+
+from bench import _exercise, _seed, _workdir
+
+# Tables that must never be read with a full scan on a request path
+INDEXED_TABLES = ("requests", "request_items", "approval_events", "approval_snapshot")
+FULL_SCAN = re.compile(r"\bSCAN (%s)\b" % "|".join(INDEXED_TABLES))
+
+DB_PATH = None
+STATEMENTS = set()
+
+
+def setUpModule():
+    global DB_PATH
+    _workdir("plans.sqlite")
+    import database
+    import main
+    from auth import issue_jwt
+
+    database.pool.connect_hooks.append(
+        lambda conn: conn.set_trace_callback(lambda sql: STATEMENTS.add(" ".join(sql.split())))
+    )
+    database.init_db()
+    with database.pool.connection() as conn:
+        _seed(conn, n_requests=200)
+    asyncio.run(_exercise(main.app, issue_jwt("am@example.com", "AM"),
+                          issue_jwt("fd@example.com", "FD")))
+    database.db_executor.shutdown()
+    database.pool.close_all()
+    DB_PATH = database.DB_PATH
+
+
+def hot_statements():
+    """Captured SELECT/UPDATE/DELETE statements that touch an indexed table."""
+    return [sql for sql in sorted(STATEMENTS)
+            if re.match(r"(SELECT|UPDATE|DELETE)\b", sql, re.IGNORECASE)
+            and any(t in sql for t in INDEXED_TABLES)]
+
+
+class QueryPlanTest(unittest.TestCase):
+    def setUp(self):
+        self.conn = sqlite3.connect(DB_PATH)
+        self.addCleanup(self.conn.close)
+
+    def test_statements_captured(self):
+        # Guards the trace hook: an empty capture would pass every plan check
+        self.assertTrue(any(sql.startswith("SELECT") for sql in hot_statements()))
+        self.assertTrue(any(sql.startswith("UPDATE") for sql in hot_statements()))
+
+    def test_no_full_scan(self):
+        for sql in hot_statements():
+            with self.subTest(sql=sql[:100]):
+                plan = [row[3] for row in self.conn.execute("EXPLAIN QUERY PLAN " + sql)]
+                bad = [step for step in plan if FULL_SCAN.search(step)]
+                self.assertFalse(bad, "full table scan:\n  " + "\n  ".join(plan))
+
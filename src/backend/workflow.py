@@ -0,0 +1,82 @@
+"""Approval workflow: the request state machine and its transitions.
+
+Every transition is a single conditional `UPDATE ... RETURNING` on the
+request row: the WHERE clause checks the source state (and ownership),
+so validation and the state change happen in one statement and
+concurrent transitions on the same quote cannot both succeed.
+"""
+import json
+
+# action -> (states it may start from, state it moves to). The action is
+# also the approval_events action logged for the transition.
+TRANSITIONS = {
+    "submit": (("draft",), "submitted"),
+    # Reviewing an approved quote reopens it; approving again makes a new version
+    "review": (("submitted", "fd_review", "approved"), "fd_review"),
+    "approve": (("submitted", "fd_review"), "approved"),
+    "reject": (("submitted", "fd_review"), "rejected"),
+}
+
+class TransitionError(Exception):
+    """A transition that cannot be applied: unknown request (404) or wrong state (409)."""
+
+    def __init__(self, status_code, detail):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+def transition(conn, rid, action, actor, note=None, owner=None, totals=None, extras=None):
+    """Apply `action` to request `rid` inside the caller's transaction.
+
+    `owner` restricts the transition to requests of that AM. `totals` sets
+    typed totals columns and `extras` is merged into totals_json. Approving
+    bumps the request's approval_version and snapshots the totals under it.
+    """
+    sources, target = TRANSITIONS[action]
+    assignments, params = ["state=?", "updated_at=CURRENT_TIMESTAMP"], [target]
+    for column, value in (totals or {}).items():
+        assignments.append(f"{column}=?")
+        params.append(value)
+    if extras:
+        # json_patch merges keys in SQL; the result is NULL when no extras remain
+        assignments.append("totals_json=NULLIF(json_patch(COALESCE(totals_json, '{}'), ?), '{}')")
+        params.append(json.dumps(extras))
+    if target == "approved":
+        assignments.append("approval_version=approval_version + 1")
+
+    where = f"id=? AND state IN ({', '.join('?' * len(sources))})"
+    params.extend([rid, *sources])
+    if owner is not None:
+        where += " AND am_email=?"
+        params.append(owner)
+
+    row = conn.execute(f"""
+        UPDATE requests SET {', '.join(assignments)}
+        WHERE {where}
+        RETURNING approval_version, subtotal, tax, grand_total, currency, totals_json
+    """, params).fetchone()
+    if row is None:
+        _raise_rejected(conn, rid, action, owner)
+
+    result = {"id": rid, "state": target}
+    if target == "approved":
+        conn.execute("""
+            INSERT INTO approval_snapshot(request_id, version_no, locked_subtotal, locked_tax,
+                                          locked_grand_total, locked_currency, locked_totals_json)
+            VALUES(?, ?, ?, ?, ?, ?, ?)
+        """, (rid, row["approval_version"], row["subtotal"], row["tax"], row["grand_total"],
+              row["currency"], row["totals_json"]))
+        result["version"] = row["approval_version"]
+
+    conn.execute("""
+        INSERT INTO approval_events(request_id, actor_email, action, note)
+        VALUES(?, ?, ?, ?)
+    """, (rid, actor, action, note))
+    return result
+
+def _raise_rejected(conn, rid, action, owner):
+    """Explain why the conditional UPDATE matched no row."""
+    row = conn.execute("SELECT state, am_email FROM requests WHERE id=?", (rid,)).fetchone()
+    if row is None or (owner is not None and row["am_email"] != owner):
+        raise TransitionError(404, "Request not found")
+    raise TransitionError(409, f"Cannot {action} a request in state '{row['state']}'")
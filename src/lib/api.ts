@@ -25,7 +25,11 @@ let mockRequests: any[] = [
     client_name: "TechCorp Inc.",
     am_email: "am@example.com",
     state: "submitted",
-    totals_json: JSON.stringify({ subtotal: 520000, tax: 62400, grand_total: 582400 }),
+    subtotal: 520000,
+    tax: 62400,
+    grand_total: 582400,
+    currency: "PHP",
+    totals_json: "{}",
     notes: "Initial quote for mobile app project",
     created_at: new Date("2025-10-10").toISOString(),
     updated_at: new Date("2025-10-15").toISOString(),
@@ -37,7 +41,11 @@ let mockRequests: any[] = [
     client_name: "RetailMax",
     am_email: "am@example.com",
     state: "approved",
-    totals_json: JSON.stringify({ subtotal: 280000, tax: 33600, grand_total: 313600 }),
+    subtotal: 280000,
+    tax: 33600,
+    grand_total: 313600,
+    currency: "PHP",
+    totals_json: "{}",
     notes: "Approved redesign project",
     created_at: new Date("2025-10-05").toISOString(),
     updated_at: new Date("2025-10-12").toISOString(),
@@ -49,7 +57,11 @@ let mockRequests: any[] = [
     client_name: "FinServe Ltd.",
     am_email: "am@example.com",
     state: "draft",
-    totals_json: JSON.stringify({ subtotal: 156000, tax: 18720, grand_total: 174720 }),
+    subtotal: 156000,
+    tax: 18720,
+    grand_total: 174720,
+    currency: "PHP",
+    totals_json: "{}",
     notes: "Draft quote pending client feedback",
     created_at: new Date("2025-10-16").toISOString(),
     updated_at: new Date("2025-10-16").toISOString(),
@@ -145,7 +157,11 @@ export const api = {
       client_name: data.client_name,
       am_email: userEmail,
       state: "draft",
-      totals_json: JSON.stringify({ subtotal, tax, grand_total }),
+      subtotal,
+      tax,
+      grand_total,
+      currency: "PHP",
+      totals_json: "{}",
       notes: data.notes,
       created_at: new Date().toISOString(),
       updated_at: new Date().toISOString(),
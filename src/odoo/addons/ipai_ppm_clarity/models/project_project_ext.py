@@ -68,6 +68,24 @@ class ProjectProjectClarity(models.Model):
         help='Consider resource availability during autoschedule',
     )
 
+    # Last autoschedule run, kept current by incremental updates
+    last_schedule_origin = fields.Datetime(
+        string='Last Schedule Origin',
+        readonly=True,
+        copy=False,
+        help='Start (or finish) date of the last autoschedule run; '
+             'empty if there is no schedule to update incrementally',
+    )
+    last_schedule_from = fields.Selection([
+        ('start', 'Project Start Date'),
+        ('finish', 'Project Finish Date'),
+    ], string='Last Scheduled From', readonly=True, copy=False)
+    last_schedule_tentative = fields.Boolean(
+        string='Last Schedule Tentative',
+        readonly=True,
+        copy=False,
+    )
+
     # Tentative schedule status
     has_tentative_schedule = fields.Boolean(
         string='Has Tentative Schedule',
@@ -182,6 +200,7 @@ class ProjectProjectClarity(models.Model):
         self.ensure_one()
         tasks_with_tentative = self.task_ids.filtered(lambda t: t.tentative_active)
         tasks_with_tentative.publish_tentative_schedule()
+        self.last_schedule_tentative = False
         return {
             'type': 'ir.actions.client',
             'tag': 'display_notification',
@@ -197,6 +216,7 @@ class ProjectProjectClarity(models.Model):
         self.ensure_one()
         tasks_with_tentative = self.task_ids.filtered(lambda t: t.tentative_active)
         tasks_with_tentative.discard_tentative_schedule()
+        self.last_schedule_origin = False
         return {
             'type': 'ir.actions.client',
             'tag': 'display_notification',
@@ -213,6 +233,19 @@ class ProjectProjectClarity(models.Model):
         service = self.env['ipai.autoschedule.service']
         return service.run_autoschedule(self, tentative=False)
 
+    def _update_autoschedule(self, forward_tasks, backward_tasks):
+        """
+        Incrementally reschedule each project in self after a change.
+        See ipai.autoschedule.service.update_autoschedule for the task sets.
+        """
+        service = self.env['ipai.autoschedule.service']
+        for project in self.filtered('last_schedule_origin'):
+            service.update_autoschedule(
+                project,
+                forward_tasks.filtered(lambda t: t.project_id == project).ids,
+                backward_tasks.filtered(lambda t: t.project_id == project).ids,
+            )
+
     def get_wbs_tree(self):
         """
         Get tasks organized as WBS tree for Timeline view.
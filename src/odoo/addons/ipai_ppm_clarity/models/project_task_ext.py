@@ -4,6 +4,9 @@
 from odoo import models, fields, api
 from datetime import datetime, timedelta
 
+# Changing these moves a task's own dates under autoschedule
+SCHEDULE_INPUT_FIELDS = {'duration_days', 'task_type'}
+
 
 class ProjectTaskClarity(models.Model):
     """
@@ -259,6 +262,13 @@ class ProjectTaskClarity(models.Model):
         elif self.task_type == 'phase':
             self.is_summary = False
 
+    def write(self, vals):
+        """Reschedule incrementally when a duration or task type changes."""
+        res = super().write(vals)
+        if SCHEDULE_INPUT_FIELDS.intersection(vals):
+            self.project_id._update_autoschedule(self, self)
+        return res
+
     def action_lock(self):
         """Lock task to prevent autoschedule changes."""
         self.write({'locked': True})
@@ -166,4 +166,21 @@ class TaskDependency(models.Model):
             raise ValidationError(
                 'This dependency would create a circular reference.'
             )
+        dep.project_id._update_autoschedule(dep.successor_id, dep.predecessor_id)
         return dep
+
+    def write(self, vals):
+        """Reschedule incrementally when the type or lag changes."""
+        res = super().write(vals)
+        if {'dependency_type', 'lag_days'}.intersection(vals):
+            self.project_id._update_autoschedule(self.successor_id, self.predecessor_id)
+        return res
+
+    def unlink(self):
+        """Reschedule incrementally once the dependencies are gone."""
+        projects = self.project_id
+        successors = self.successor_id
+        predecessors = self.predecessor_id
+        res = super().unlink()
+        projects._update_autoschedule(successors.exists(), predecessors.exists())
+        return res
@@ -18,12 +18,26 @@ Dependency Types:
 """
 
 from odoo import models, api, fields
+from odoo.exceptions import UserError
 from datetime import datetime, timedelta
 from collections import defaultdict
+from itertools import chain
 import logging
+import math
+
+from . import cpm
+from . import cpm_numpy
 
 _logger = logging.getLogger(__name__)
 
+# project.task fields _apply_schedule stores with bulk SQL: untracked and
+# without write() side effects of their own
+SCHEDULE_FIELDS = (
+    'early_start', 'early_finish', 'late_start', 'late_finish',
+    'float_days', 'is_critical',
+)
+TENTATIVE_FIELDS = ('tentative_start', 'tentative_finish', 'tentative_active')
+
 
 class AutoscheduleService(models.AbstractModel):
     """
@@ -58,20 +72,25 @@ class AutoscheduleService(models.AbstractModel):
         # Build dependency graph
         graph = self._build_dependency_graph(tasks)
 
-        # Determine project start date
-        if project.schedule_from == 'finish' and project.project_finish_date:
+        # Determine project start date; results are day offsets from it
+        schedule_from, origin = self._schedule_origin(project)
+        if schedule_from == 'finish':
             # Backward scheduling from finish date
-            result = self._schedule_from_finish(tasks, graph, project.project_finish_date)
+            result = self._schedule_from_finish(tasks, graph)
         else:
             # Forward scheduling from start date
-            start_date = project.project_start_date or fields.Date.today()
-            result = self._schedule_from_start(tasks, graph, start_date)
+            result = self._schedule_from_start(tasks, graph)
 
         # Calculate critical path
         self._calculate_critical_path(tasks, result)
 
-        # Apply results
-        self._apply_schedule(tasks, result, tentative)
+        # Apply results, and remember them for update_autoschedule
+        self._apply_schedule(tasks, result, tentative, origin)
+        project.write({
+            'last_schedule_origin': origin,
+            'last_schedule_from': schedule_from,
+            'last_schedule_tentative': tentative,
+        })
 
         # Return notification
         critical_count = len([t for t in tasks if result.get(t.id, {}).get('is_critical')])
@@ -81,6 +100,72 @@ class AutoscheduleService(models.AbstractModel):
             'success'
         )
 
+    def update_autoschedule(self, project, forward_task_ids=(), backward_task_ids=()):
+        """
+        Bring the project's last schedule up to date after a change.
+
+        Only tasks reached from the changed ones are recomputed, and
+        propagation stops where dates stop moving (cpm.update_from_start
+        and update_from_finish). Only the tasks whose dates moved are
+        written, into the same fields as the last run (tentative or not).
+        The tasks, dependencies and stored dates are still read and the
+        ScheduleGraph rebuilt on every call, O(n + e); what is saved is
+        the full passes and the writes to tasks that did not move.
+
+        Args:
+            project: project.project record
+            forward_task_ids: tasks whose early dates may have changed
+                (duration edited, predecessor added or removed)
+            backward_task_ids: tasks whose late dates may have changed
+                (duration edited, successor added or removed)
+
+        Returns:
+            project.task recordset of rescheduled tasks, or None if there
+            is no current schedule to update: autoschedule is disabled, or
+            has not run since the project's start, finish or mode changed
+        """
+        schedule_from, origin = self._schedule_origin(project)
+        if (not project.autoschedule_enabled
+                or project.last_schedule_origin != origin
+                or project.last_schedule_from != schedule_from):
+            return None
+
+        tasks = self._get_schedulable_tasks(project)
+        graph = self._build_dependency_graph(tasks)
+        task_ids, durations, edges = self._compact_graph(tasks, graph)
+        schedule_graph = self._run_cpm(cpm.ScheduleGraph, tasks, task_ids, durations, edges)
+
+        # Stored dates as offsets; tasks never scheduled are recomputed
+        dates = [
+            [(value - origin).total_seconds() / 86400 if value else None for value in column]
+            for column in self._read_task_columns(
+                tasks, ['early_start', 'early_finish', 'late_start', 'late_finish'])
+        ]
+        unscheduled = {pos for column in dates for pos, value in enumerate(column) if value is None}
+        position = {task_id: pos for pos, task_id in enumerate(task_ids)}
+        forward = unscheduled.union(position[i] for i in forward_task_ids if i in position)
+        backward = unscheduled.union(position[i] for i in backward_task_ids if i in position)
+
+        if schedule_from == 'finish':
+            changed = cpm.update_from_finish(schedule_graph, dates, backward)
+        else:
+            changed = cpm.update_from_start(schedule_graph, dates, forward, backward)
+
+        result = self._dates_to_result(task_ids, dates)
+        changed_tasks = tasks.browse([task_ids[pos] for pos in sorted(changed)])
+        self._calculate_critical_path(changed_tasks, result)
+        self._apply_schedule(changed_tasks, result, project.last_schedule_tentative, origin)
+        _logger.info(f'Incremental autoschedule for project {project.name}: '
+                     f'{len(changed_tasks)} of {len(tasks)} tasks moved')
+        return changed_tasks
+
+    def _schedule_origin(self, project):
+        """(schedule_from, datetime) a run on `project` schedules from now."""
+        if project.schedule_from == 'finish' and project.project_finish_date:
+            return 'finish', datetime.combine(project.project_finish_date, datetime.min.time())
+        start_date = project.project_start_date or fields.Date.today()
+        return 'start', datetime.combine(start_date, datetime.min.time())
+
     def _get_schedulable_tasks(self, project):
         """Get tasks that can be scheduled."""
         domain = [
@@ -108,27 +193,26 @@ class AutoscheduleService(models.AbstractModel):
             - roots: [task_ids with no predecessors]
             - leaves: [task_ids with no successors]
         """
-        task_ids = set(tasks.ids)
         predecessors = defaultdict(list)
         successors = defaultdict(list)
 
-        dependencies = self.env['ipai.task.dependency'].search([
-            '|',
-            ('predecessor_id', 'in', list(task_ids)),
-            ('successor_id', 'in', list(task_ids)),
-        ])
+        # One query for the whole graph, both ends within the task set
+        Dependency = self.env['ipai.task.dependency']
+        Dependency.check_access('read')
+        Dependency.flush_model(['predecessor_id', 'successor_id', 'dependency_type', 'lag_days'])
+        self.env.cr.execute("""
+            SELECT predecessor_id, successor_id, dependency_type, COALESCE(lag_days, 0)
+            FROM ipai_task_dependency
+            WHERE predecessor_id = ANY(%s) AND successor_id = ANY(%s)
+            ORDER BY id
+        """, [tasks.ids, tasks.ids])
 
-        for dep in dependencies:
-            if dep.predecessor_id.id in task_ids and dep.successor_id.id in task_ids:
-                predecessors[dep.successor_id.id].append(
-                    (dep.predecessor_id.id, dep.dependency_type, dep.lag_days)
-                )
-                successors[dep.predecessor_id.id].append(
-                    (dep.successor_id.id, dep.dependency_type, dep.lag_days)
-                )
+        for pred_id, succ_id, dep_type, lag in self.env.cr.fetchall():
+            predecessors[succ_id].append((pred_id, dep_type, lag))
+            successors[pred_id].append((succ_id, dep_type, lag))
 
-        roots = [t.id for t in tasks if t.id not in predecessors]
-        leaves = [t.id for t in tasks if t.id not in successors]
+        roots = [task_id for task_id in tasks.ids if task_id not in predecessors]
+        leaves = [task_id for task_id in tasks.ids if task_id not in successors]
 
         return {
             'predecessors': dict(predecessors),
@@ -137,262 +221,105 @@ class AutoscheduleService(models.AbstractModel):
             'leaves': leaves,
         }
 
-    def _schedule_from_start(self, tasks, graph, start_date):
+    def _schedule_from_start(self, tasks, graph):
         """
-        Forward scheduling from project start date.
+        Forward scheduling from project start date (offset 0).
 
         Uses Forward Pass to calculate Early Start/Early Finish,
         then Backward Pass for Late Start/Late Finish.
         """
-        task_map = {t.id: t for t in tasks}
-        result = {}
+        task_ids, durations, edges = self._compact_graph(tasks, graph)
+        dates = self._run_cpm(self._cpm_engine().schedule_from_start, tasks, task_ids, durations, edges)
+        return self._dates_to_result(task_ids, dates)
 
-        # Initialize result dict
-        for task in tasks:
-            result[task.id] = {
-                'early_start': None,
-                'early_finish': None,
-                'late_start': None,
-                'late_finish': None,
-                'float_days': 0,
-                'is_critical': False,
-            }
+    def _schedule_from_finish(self, tasks, graph):
+        """
+        Backward scheduling from project finish date (offset 0).
+        Runs the backward pass only; early dates equal late dates.
+        """
+        task_ids, durations, edges = self._compact_graph(tasks, graph)
+        dates = self._run_cpm(self._cpm_engine().schedule_from_finish, tasks, task_ids, durations, edges)
+        return self._dates_to_result(task_ids, dates)
 
-        # Convert start_date to datetime
-        project_start = datetime.combine(start_date, datetime.min.time())
-
-        # === FORWARD PASS ===
-        # Process tasks in topological order
-        processed = set()
-        queue = list(graph['roots'])
-
-        while queue:
-            task_id = queue.pop(0)
-            if task_id in processed:
-                continue
-
-            task = task_map.get(task_id)
-            if not task:
-                continue
-
-            # Check if all predecessors are processed
-            preds = graph['predecessors'].get(task_id, [])
-            if not all(p[0] in processed for p in preds):
-                queue.append(task_id)  # Re-queue
-                continue
-
-            # Calculate Early Start
-            if not preds:
-                # Root task starts at project start
-                early_start = project_start
-            else:
-                # ES = max of all predecessor constraints
-                candidate_starts = []
-                for pred_id, dep_type, lag in preds:
-                    pred_result = result[pred_id]
-                    candidate = self._calculate_dependency_date(
-                        pred_result['early_start'],
-                        pred_result['early_finish'],
-                        dep_type,
-                        lag,
-                        is_start=True
-                    )
-                    if candidate:
-                        candidate_starts.append(candidate)
-
-                early_start = max(candidate_starts) if candidate_starts else project_start
-
-            # Calculate Early Finish
-            duration = task.duration_days or 0
-            if task.is_milestone:
-                duration = 0
-
-            early_finish = early_start + timedelta(days=duration)
-
-            result[task_id]['early_start'] = early_start
-            result[task_id]['early_finish'] = early_finish
-
-            processed.add(task_id)
-
-            # Add successors to queue
-            for succ_id, _, _ in graph['successors'].get(task_id, []):
-                if succ_id not in processed:
-                    queue.append(succ_id)
-
-        # === BACKWARD PASS ===
-        # Find project end (max early finish)
-        all_finishes = [r['early_finish'] for r in result.values() if r['early_finish']]
-        project_end = max(all_finishes) if all_finishes else project_start
-
-        # Process tasks in reverse topological order
-        processed = set()
-        queue = list(graph['leaves'])
-
-        while queue:
-            task_id = queue.pop(0)
-            if task_id in processed:
-                continue
-
-            task = task_map.get(task_id)
-            if not task:
-                continue
-
-            # Check if all successors are processed
-            succs = graph['successors'].get(task_id, [])
-            if not all(s[0] in processed for s in succs):
-                queue.append(task_id)
-                continue
-
-            # Calculate Late Finish
-            if not succs:
-                # Leaf task finishes at project end
-                late_finish = project_end
-            else:
-                # LF = min of all successor constraints
-                candidate_finishes = []
-                for succ_id, dep_type, lag in succs:
-                    succ_result = result[succ_id]
-                    candidate = self._calculate_dependency_date(
-                        succ_result['late_start'],
-                        succ_result['late_finish'],
-                        dep_type,
-                        lag,
-                        is_start=False
-                    )
-                    if candidate:
-                        candidate_finishes.append(candidate)
-
-                late_finish = min(candidate_finishes) if candidate_finishes else project_end
-
-            # Calculate Late Start
-            duration = task.duration_days or 0
-            if task.is_milestone:
-                duration = 0
-
-            late_start = late_finish - timedelta(days=duration)
-
-            result[task_id]['late_start'] = late_start
-            result[task_id]['late_finish'] = late_finish
-
-            processed.add(task_id)
-
-            # Add predecessors to queue
-            for pred_id, _, _ in graph['predecessors'].get(task_id, []):
-                if pred_id not in processed:
-                    queue.append(pred_id)
+    def _cpm_engine(self):
+        """
+        The module running the CPM passes: cpm, or cpm_numpy when the
+        context sets cpm_engine='numpy' (portfolio-scale what-if runs)
+        and NumPy is installed.
+        """
+        if self.env.context.get('cpm_engine') == 'numpy':
+            if cpm_numpy.available():
+                return cpm_numpy
+            _logger.warning('cpm_engine=numpy requested but NumPy is not installed; using cpm')
+        return cpm
 
-        return result
+    def _compact_graph(self, tasks, graph):
+        """
+        Flatten tasks and graph into the positional arrays cpm works on.
 
-    def _schedule_from_finish(self, tasks, graph, finish_date):
+        Returns:
+            (task_ids, durations, edges) where edges are
+            (pred_pos, succ_pos, type, lag) tuples
         """
-        Backward scheduling from project finish date.
-        Starts with backward pass, then forward pass.
+        task_ids = tasks.ids
+        position = {task_id: pos for pos, task_id in enumerate(task_ids)}
+        duration_days, is_milestone = self._read_task_columns(tasks, ['duration_days', 'is_milestone'])
+        durations = [
+            0 if milestone else (duration or 0)
+            for duration, milestone in zip(duration_days, is_milestone)
+        ]
+        edges = [
+            (position[pred_id], position[succ_id], dep_type, lag)
+            for succ_id, preds in graph['predecessors'].items()
+            for pred_id, dep_type, lag in preds
+        ]
+        return task_ids, durations, edges
+
+    def _read_task_columns(self, tasks, fnames):
         """
-        task_map = {t.id: t for t in tasks}
-        result = {}
+        Stored values of `fnames` for `tasks` in one query, instead of
+        per-record reads in prefetch batches.
 
-        for task in tasks:
-            result[task.id] = {
-                'early_start': None,
-                'early_finish': None,
-                'late_start': None,
-                'late_finish': None,
+        Returns:
+            one list per field name, in tasks order
+        """
+        Task = self.env['project.task']
+        Task.flush_model(fnames)
+        self.env.cr.execute(
+            f"SELECT id, {', '.join(fnames)} FROM project_task WHERE id = ANY(%s)",
+            [tasks.ids],
+        )
+        rows = {row[0]: row[1:] for row in self.env.cr.fetchall()}
+        return [
+            [rows[task_id][index] for task_id in tasks.ids]
+            for index in range(len(fnames))
+        ]
+
+    def _run_cpm(self, schedule, tasks, task_ids, durations, edges):
+        """Call a cpm function on the arrays, reporting a cycle with task names."""
+        try:
+            return schedule(durations, edges)
+        except cpm.CycleError as e:
+            names = tasks.browse([task_ids[pos] for pos in e.cycle]).mapped('name')
+            raise UserError(
+                'Cannot autoschedule: circular dependency between tasks '
+                + ' -> '.join(names + names[:1])
+            ) from e
+
+    def _dates_to_result(self, task_ids, dates):
+        """Per-task result dicts of cpm day offsets."""
+        result = {}
+        for task_id, es, ef, ls, lf in zip(task_ids, *dates):
+            result[task_id] = {
+                'early_start': es,
+                'early_finish': ef,
+                'late_start': ls,
+                'late_finish': lf,
                 'float_days': 0,
                 'is_critical': False,
             }
-
-        project_end = datetime.combine(finish_date, datetime.min.time())
-
-        # === BACKWARD PASS FIRST ===
-        processed = set()
-        queue = list(graph['leaves'])
-
-        while queue:
-            task_id = queue.pop(0)
-            if task_id in processed:
-                continue
-
-            task = task_map.get(task_id)
-            if not task:
-                continue
-
-            succs = graph['successors'].get(task_id, [])
-            if not all(s[0] in processed for s in succs):
-                queue.append(task_id)
-                continue
-
-            if not succs:
-                late_finish = project_end
-            else:
-                candidate_finishes = []
-                for succ_id, dep_type, lag in succs:
-                    succ_result = result[succ_id]
-                    candidate = self._calculate_dependency_date(
-                        succ_result['late_start'],
-                        succ_result['late_finish'],
-                        dep_type,
-                        lag,
-                        is_start=False
-                    )
-                    if candidate:
-                        candidate_finishes.append(candidate)
-                late_finish = min(candidate_finishes) if candidate_finishes else project_end
-
-            duration = task.duration_days or 0
-            if task.is_milestone:
-                duration = 0
-
-            late_start = late_finish - timedelta(days=duration)
-
-            result[task_id]['late_start'] = late_start
-            result[task_id]['late_finish'] = late_finish
-            result[task_id]['early_start'] = late_start
-            result[task_id]['early_finish'] = late_finish
-
-            processed.add(task_id)
-
-            for pred_id, _, _ in graph['predecessors'].get(task_id, []):
-                if pred_id not in processed:
-                    queue.append(pred_id)
-
         return result
 
-    def _calculate_dependency_date(self, start, finish, dep_type, lag, is_start):
-        """
-        Calculate date based on dependency type.
-
-        Args:
-            start: Predecessor/Successor start date
-            finish: Predecessor/Successor finish date
-            dep_type: FS, SS, FF, SF
-            lag: Lag days (positive or negative)
-            is_start: True if calculating start (forward), False for finish (backward)
-        """
-        lag_delta = timedelta(days=lag)
-
-        if is_start:
-            # Forward pass - calculating successor start
-            if dep_type == 'FS':
-                return finish + lag_delta if finish else None
-            elif dep_type == 'SS':
-                return start + lag_delta if start else None
-            elif dep_type == 'FF':
-                return finish + lag_delta if finish else None
-            elif dep_type == 'SF':
-                return start + lag_delta if start else None
-        else:
-            # Backward pass - calculating predecessor finish
-            if dep_type == 'FS':
-                return start - lag_delta if start else None
-            elif dep_type == 'SS':
-                return start - lag_delta if start else None
-            elif dep_type == 'FF':
-                return finish - lag_delta if finish else None
-            elif dep_type == 'SF':
-                return finish - lag_delta if finish else None
-
-        return None
-
     def _calculate_critical_path(self, tasks, result):
         """
         Calculate float and mark critical tasks.
@@ -403,42 +330,91 @@ class AutoscheduleService(models.AbstractModel):
             es = task_result.get('early_start')
             ls = task_result.get('late_start')
 
-            if es and ls:
-                float_days = (ls - es).days
+            if es is not None and ls is not None:
+                # Whole days, rounding off float error from fractional durations
+                float_days = math.floor(round(ls - es, 6))
                 task_result['float_days'] = float_days
                 task_result['is_critical'] = (float_days == 0)
             else:
                 task_result['float_days'] = 0
                 task_result['is_critical'] = False
 
-    def _apply_schedule(self, tasks, result, tentative):
-        """Apply schedule results to tasks."""
-        for task in tasks:
-            task_result = result.get(task.id, {})
-
-            es = task_result.get('early_start')
-            ef = task_result.get('early_finish')
-            ls = task_result.get('late_start')
-            lf = task_result.get('late_finish')
-
-            vals = {
-                'early_start': es,
-                'early_finish': ef,
-                'late_start': ls,
-                'late_finish': lf,
-                'float_days': task_result.get('float_days', 0),
-                'is_critical': task_result.get('is_critical', False),
-            }
+    def _apply_schedule(self, tasks, result, tentative, origin):
+        """
+        Apply schedule results to tasks, as datetimes from `origin`.
 
+        CPM and tentative fields are stored in bulk by
+        _write_schedule_fields. Planned dates are tracked and drive other
+        logic, so they go through write(), once per distinct
+        (start, finish) pair rather than once per task.
+        """
+        def to_datetime(offset):
+            return origin + timedelta(days=offset) if offset is not None else False
+
+        fnames = SCHEDULE_FIELDS + (TENTATIVE_FIELDS if tentative else ())
+        rows = []
+        planned_groups = defaultdict(list)
+        for task_id in tasks.ids:
+            task_result = result.get(task_id, {})
+
+            es = to_datetime(task_result.get('early_start'))
+            ef = to_datetime(task_result.get('early_finish'))
+            ls = to_datetime(task_result.get('late_start'))
+            lf = to_datetime(task_result.get('late_finish'))
+
+            row = [task_id, es, ef, ls, lf,
+                   task_result.get('float_days', 0),
+                   task_result.get('is_critical', False)]
             if tentative:
-                vals['tentative_start'] = es
-                vals['tentative_finish'] = ef
-                vals['tentative_active'] = True
+                row += [es, ef, True]
             else:
-                vals['planned_date_begin'] = es
-                vals['date_deadline'] = ef
+                planned_groups[(es, ef)].append(task_id)
+            rows.append(row)
+
+        self._write_schedule_fields(fnames, rows)
+        for (es, ef), task_ids in planned_groups.items():
+            tasks.browse(task_ids).write({
+                'planned_date_begin': es,
+                'date_deadline': ef,
+            })
+
+    def _write_schedule_fields(self, fnames, rows):
+        """
+        Store scheduling fields for all tasks with one UPDATE.
+
+        Bypasses write(): access is checked the same way, pending ORM
+        updates to these fields are flushed first, and afterwards the cache
+        is invalidated and dependent computed fields (such as the
+        project's critical task count) are marked modified.
 
-            task.write(vals)
+        Args:
+            fnames: project.task field names, all in SCHEDULE_FIELDS or TENTATIVE_FIELDS
+            rows: [task_id, value, ...] lists with values in fnames order
+        """
+        if not rows:
+            return
+        Task = self.env['project.task']
+        tasks = Task.browse([row[0] for row in rows])
+        tasks.check_access('write')  # what write() would have enforced
+        fields_ = [Task._fields[fname] for fname in fnames]
+        Task.flush_model(fnames)
+
+        values = [
+            (row[0], *(field.convert_to_column(value, Task) for field, value in zip(fields_, row[1:])))
+            for row in rows
+        ]
+        template = '(%s, ' + ', '.join(f'%s::{field.column_type[1]}' for field in fields_) + ')'
+        self.env.cr.execute(f"""
+            UPDATE project_task AS t
+            SET {', '.join(f'{fname} = v.{fname}' for fname in fnames)},
+                write_uid = %s,
+                write_date = (now() at time zone 'UTC')
+            FROM (VALUES {', '.join([template] * len(values))}) AS v(id, {', '.join(fnames)})
+            WHERE t.id = v.id
+        """, [self.env.uid, *chain.from_iterable(values)])
+
+        tasks.invalidate_recordset(list(fnames) + ['write_uid', 'write_date'])
+        tasks.modified(list(fnames))
 
     def _notification(self, title, message, notif_type='info'):
         """Return notification action."""
@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+# Part of IPAI PPM Clarity. See LICENSE file for full copyright and licensing details.
+
+"""
+Critical Path Method core, independent of the ORM.
+
+Tasks are positions 0..n-1 in a list of durations (days); dependencies are
+(predecessor, successor, type, lag) tuples over those positions. Dates are
+day offsets (floats), so callers convert to datetimes once at the end.
+
+Both passes walk one topological order found with Kahn's algorithm
+(indegree counters and a deque); the backward pass walks it reversed.
+Each task and edge is visited once per pass, O(n + e) overall, and a
+cycle is reported as CycleError instead of looping.
+
+update_from_start and update_from_finish bring a stored result up to
+date after a change, revisiting only tasks whose inputs moved.
+
+Dependency rules:
+- Forward pass, successor start: FS/FF from the predecessor's finish,
+  SS/SF from its start, plus lag
+- Backward pass, predecessor finish: FS/SS from the successor's start,
+  FF/SF from its finish, minus lag
+"""
+
+import heapq
+from collections import deque
+
+# Forward pass: does the successor's start follow the predecessor's finish?
+FROM_FINISH = {'FS': True, 'SS': False, 'FF': True, 'SF': False}
+# Backward pass: is the predecessor's finish bounded by the successor's finish?
+TO_FINISH = {'FS': False, 'SS': False, 'FF': True, 'SF': True}
+
+
+class CycleError(ValueError):
+    """The dependency graph has a cycle; `cycle` lists its task positions in order."""
+
+    def __init__(self, cycle):
+        self.cycle = cycle
+        super().__init__(f'Circular dependency between tasks {cycle}')
+
+
+class ScheduleGraph:
+    """
+    Adjacency lists and a topological order for one set of tasks.
+
+    Args:
+        durations: task durations in days, by position
+        edges: iterable of (pred, succ, dep_type, lag) over positions
+
+    Raises:
+        CycleError: if the dependencies are circular
+    """
+    __slots__ = ('durations', 'incoming', 'outgoing', 'order', 'position')
+
+    def __init__(self, durations, edges):
+        size = len(durations)
+        self.durations = durations
+        self.incoming = [[] for _ in range(size)]   # succ -> [(pred, from_finish, lag)]
+        self.outgoing = [[] for _ in range(size)]   # pred -> [(succ, to_finish, lag)]
+        for pred, succ, dep_type, lag in edges:
+            self.incoming[succ].append((pred, FROM_FINISH[dep_type], lag or 0))
+            self.outgoing[pred].append((succ, TO_FINISH[dep_type], lag or 0))
+        self.order = self._topological_order()
+        self.position = [0] * size   # task -> index in order
+        for index, task in enumerate(self.order):
+            self.position[task] = index
+
+    def _topological_order(self):
+        indegree = [len(preds) for preds in self.incoming]
+        queue = deque(i for i, degree in enumerate(indegree) if not degree)
+        order = []
+        while queue:
+            task = queue.popleft()
+            order.append(task)
+            for succ, _to_finish, _lag in self.outgoing[task]:
+                indegree[succ] -= 1
+                if not indegree[succ]:
+                    queue.append(succ)
+        if len(order) < len(indegree):
+            raise CycleError(self._find_cycle(indegree))
+        return order
+
+    def _find_cycle(self, indegree):
+        # Every task left with indegree > 0 has a predecessor that is also
+        # left, so walking predecessors from one must come back around
+        task = next(i for i, degree in enumerate(indegree) if degree)
+        seen = {}
+        path = []
+        while task not in seen:
+            seen[task] = len(path)
+            path.append(task)
+            task = next(pred for pred, _from_finish, _lag in self.incoming[task] if indegree[pred])
+        cycle = path[seen[task]:]
+        cycle.reverse()
+        return cycle
+
+    def forward_pass(self, start=0.0):
+        """Early start and early finish offsets; tasks without predecessors start at `start`."""
+        durations = self.durations
+        incoming = self.incoming
+        early_start = [start] * len(durations)
+        early_finish = [start] * len(durations)
+        for task in self.order:
+            preds = incoming[task]
+            if preds:
+                es = max((early_finish[pred] if from_finish else early_start[pred]) + lag
+                         for pred, from_finish, lag in preds)
+            else:
+                es = start
+            early_start[task] = es
+            early_finish[task] = es + durations[task]
+        return early_start, early_finish
+
+    def backward_pass(self, end):
+        """Late start and late finish offsets; tasks without successors finish at `end`."""
+        durations = self.durations
+        outgoing = self.outgoing
+        late_start = [end] * len(durations)
+        late_finish = [end] * len(durations)
+        for task in reversed(self.order):
+            succs = outgoing[task]
+            if succs:
+                lf = min((late_finish[succ] if to_finish else late_start[succ]) - lag
+                         for succ, to_finish, lag in succs)
+            else:
+                lf = end
+            late_finish[task] = lf
+            late_start[task] = lf - durations[task]
+        return late_start, late_finish
+
+    def update_forward(self, early_start, early_finish, seeds, start=0.0):
+        """
+        Recompute early dates from `seeds` on, in place.
+
+        Tasks are taken in topological order from a heap, and a task's
+        successors are queued only if its dates changed. Each affected task
+        is computed once, and propagation stops where dates stop moving.
+        Returns the tasks whose dates changed.
+        """
+        incoming, outgoing, position = self.incoming, self.outgoing, self.position
+        queued = set(seeds)
+        heap = [position[task] for task in queued]
+        heapq.heapify(heap)
+        changed = []
+        while heap:
+            task = self.order[heapq.heappop(heap)]
+            preds = incoming[task]
+            if preds:
+                es = max((early_finish[pred] if from_finish else early_start[pred]) + lag
+                         for pred, from_finish, lag in preds)
+            else:
+                es = start
+            ef = es + self.durations[task]
+            if es == early_start[task] and ef == early_finish[task]:
+                continue
+            early_start[task] = es
+            early_finish[task] = ef
+            changed.append(task)
+            for succ, _to_finish, _lag in outgoing[task]:
+                if succ not in queued:
+                    queued.add(succ)
+                    heapq.heappush(heap, position[succ])
+        return changed
+
+    def update_backward(self, late_start, late_finish, seeds, end):
+        """Recompute late dates from `seeds` back, in place; see update_forward."""
+        incoming, outgoing, position = self.incoming, self.outgoing, self.position
+        queued = set(seeds)
+        heap = [-position[task] for task in queued]
+        heapq.heapify(heap)
+        changed = []
+        while heap:
+            task = self.order[-heapq.heappop(heap)]
+            succs = outgoing[task]
+            if succs:
+                lf = min((late_finish[succ] if to_finish else late_start[succ]) - lag
+                         for succ, to_finish, lag in succs)
+            else:
+                lf = end
+            ls = lf - self.durations[task]
+            if lf == late_finish[task] and ls == late_start[task]:
+                continue
+            late_start[task] = ls
+            late_finish[task] = lf
+            changed.append(task)
+            for pred, _from_finish, _lag in incoming[task]:
+                if pred not in queued:
+                    queued.add(pred)
+                    heapq.heappush(heap, -position[pred])
+        return changed
+
+
+def schedule_from_start(durations, edges, start=0.0):
+    """
+    Forward then backward pass from a project start.
+
+    The backward pass ends at the latest early finish (or `start` when
+    there are no tasks). Returns (early_start, early_finish, late_start,
+    late_finish) lists of day offsets.
+    """
+    graph = ScheduleGraph(durations, edges)
+    early_start, early_finish = graph.forward_pass(start)
+    end = max(early_finish, default=start)
+    late_start, late_finish = graph.backward_pass(end)
+    return early_start, early_finish, late_start, late_finish
+
+
+def schedule_from_finish(durations, edges, end=0.0):
+    """
+    Backward pass only, from a project finish.
+
+    Tasks are placed as late as possible, so the early dates equal the
+    late dates. Returns the same four lists as schedule_from_start.
+    """
+    graph = ScheduleGraph(durations, edges)
+    late_start, late_finish = graph.backward_pass(end)
+    return late_start, late_finish, list(late_start), list(late_finish)
+
+
+def update_from_start(graph, dates, forward_seeds, backward_seeds, start=0.0):
+    """
+    Update a schedule_from_start result in place after a change.
+
+    Args:
+        graph: ScheduleGraph of the changed project
+        dates: the four lists of the last result; None for unscheduled tasks,
+            which must be among the seeds
+        forward_seeds: tasks whose early dates may have changed (new
+            duration, predecessor added or removed)
+        backward_seeds: tasks whose late dates may have changed (new
+            duration, successor added or removed)
+
+    Returns:
+        set of tasks whose dates changed
+    """
+    early_start, early_finish, late_start, late_finish = dates
+    old_end = max((finish for finish in early_finish if finish is not None), default=start)
+    changed = set(graph.update_forward(early_start, early_finish, forward_seeds, start))
+    end = max(early_finish, default=start)
+    if end != old_end:
+        # Every task without successors now finishes at the new end
+        backward_seeds = range(len(late_finish))
+    changed.update(graph.update_backward(late_start, late_finish, backward_seeds, end))
+    return changed
+
+
+def update_from_finish(graph, dates, backward_seeds, end=0.0):
+    """
+    Update a schedule_from_finish result in place after a change.
+
+    Only the backward pass runs, so only tasks whose late dates may have
+    changed are seeds. Returns the set of tasks whose dates changed.
+    """
+    early_start, early_finish, late_start, late_finish = dates
+    changed = graph.update_backward(late_start, late_finish, backward_seeds, end)
+    for task in changed:
+        early_start[task] = late_start[task]
+        early_finish[task] = late_finish[task]
+    return set(changed)
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+# Part of IPAI PPM Clarity. See LICENSE file for full copyright and licensing details.
+
+"""
+Benchmark the cpm engines against the re-queue scheduling loop they replaced.
+
+    python services/cpm_bench.py [--sizes 10000 100000] [--legacy-max 10000]
+                                 [--portfolio-size 50]
+
+Projects are synthetic: random durations (some milestones), each task
+depending on up to three earlier tasks of mixed type and lag, listed in
+shuffled order. With --portfolio-size, each size is instead split into
+independent projects of that many tasks, the wide graphs cpm_numpy is
+meant for.
+
+Needs no Odoo. The legacy loop runs on plain dicts with the datetime
+arithmetic the service used, and its dates are checked against cpm.
+
+The "update" column times what AutoscheduleService.update_autoschedule
+does in Python after one task's duration changes: it rebuilds the
+ScheduleGraph, which is O(n + e) on every edit, then runs
+cpm.update_from_start. "propagate" is the update_from_start part alone,
+and "moved" counts the tasks whose dates changed. Neither column counts
+the SQL reads of the graph and stored dates; the saving over a full run
+is in the passes and in writing only the tasks that moved.
+
+When NumPy is installed, cpm_numpy runs too. Its dates must equal cpm's
+exactly in both scheduling directions, and the exit status is 1 if they
+do not.
+"""
+
+import os
+import sys
+import time
+import types
+import random
+import argparse
+from datetime import datetime, timedelta
+
+# Import the engines without the services package __init__, which needs Odoo
+sys.modules['cpm_engines'] = package = types.ModuleType('cpm_engines')
+package.__path__ = [os.path.dirname(os.path.abspath(__file__))]
+from cpm_engines import cpm, cpm_numpy  # noqa: E402
+
+DEP_TYPES = ('FS', 'FS', 'FS', 'SS', 'FF', 'SF')
+
+
+def synthetic_project(size, seed=0):
+    """(durations, edges) for `size` tasks, positions shuffled."""
+    rng = random.Random(seed)
+    durations = [0 if rng.random() < 0.05 else rng.randint(1, 20) for _ in range(size)]
+    edges = []
+    for succ in range(1, size):
+        for pred in {rng.randrange(max(0, succ - 50), succ) for _ in range(rng.randint(1, 3))}:
+            edges.append((pred, succ, rng.choice(DEP_TYPES), rng.choice((0, 0, 0, 1, 2, -1))))
+    shuffled = list(range(size))
+    rng.shuffle(shuffled)
+    durations = [durations[old] for old in sorted(range(size), key=shuffled.__getitem__)]
+    edges = [(shuffled[p], shuffled[s], t, lag) for p, s, t, lag in edges]
+    return durations, edges
+
+
+def synthetic_portfolio(size, project_size):
+    """(durations, edges) for `size` tasks in independent projects of `project_size`."""
+    durations, edges = [], []
+    for seed, base in enumerate(range(0, size, project_size)):
+        project_durations, project_edges = synthetic_project(min(project_size, size - base), seed)
+        durations += project_durations
+        edges += [(pred + base, succ + base, t, lag) for pred, succ, t, lag in project_edges]
+    return durations, edges
+
+
+def timed(fn, *args):
+    began = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - began
+
+
+def legacy_schedule_from_start(durations, edges, project_start):
+    """The pre-cpm forward/backward pass: queue.pop(0) and re-queue until ready."""
+    predecessors, successors = {}, {}
+    for pred, succ, dep_type, lag in edges:
+        predecessors.setdefault(succ, []).append((pred, dep_type, lag))
+        successors.setdefault(pred, []).append((succ, dep_type, lag))
+    result = {i: {'early_start': None, 'early_finish': None,
+                  'late_start': None, 'late_finish': None} for i in range(len(durations))}
+
+    def dependency_date(start, finish, dep_type, lag, is_start):
+        lag_delta = timedelta(days=lag)
+        if is_start:
+            return (finish if dep_type in ('FS', 'FF') else start) + lag_delta
+        return (start if dep_type in ('FS', 'SS') else finish) - lag_delta
+
+    processed = set()
+    queue = [i for i in range(len(durations)) if i not in predecessors]
+    while queue:
+        task = queue.pop(0)
+        if task in processed:
+            continue
+        preds = predecessors.get(task, [])
+        if not all(p[0] in processed for p in preds):
+            queue.append(task)
+            continue
+        early_start = max((dependency_date(result[p]['early_start'], result[p]['early_finish'],
+                                           t, lag, True) for p, t, lag in preds),
+                          default=project_start)
+        result[task]['early_start'] = early_start
+        result[task]['early_finish'] = early_start + timedelta(days=durations[task])
+        processed.add(task)
+        queue.extend(s for s, _, _ in successors.get(task, []) if s not in processed)
+
+    project_end = max(r['early_finish'] for r in result.values())
+    processed = set()
+    queue = [i for i in range(len(durations)) if i not in successors]
+    while queue:
+        task = queue.pop(0)
+        if task in processed:
+            continue
+        succs = successors.get(task, [])
+        if not all(s[0] in processed for s in succs):
+            queue.append(task)
+            continue
+        late_finish = min((dependency_date(result[s]['late_start'], result[s]['late_finish'],
+                                           t, lag, False) for s, t, lag in succs),
+                          default=project_end)
+        result[task]['late_finish'] = late_finish
+        result[task]['late_start'] = late_finish - timedelta(days=durations[task])
+        processed.add(task)
+        queue.extend(p for p, _, _ in predecessors.get(task, []) if p not in processed)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the cpm engines against the legacy scheduling loop.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--legacy-max', type=int, default=10000,
+                        help='skip the legacy loop above this many tasks (it is quadratic)')
+    parser.add_argument('--portfolio-size', type=int,
+                        help='split each size into independent projects of this many tasks')
+    args = parser.parse_args()
+
+    project_start = datetime(2025, 1, 6)
+    failures = 0
+    for size in args.sizes:
+        if args.portfolio_size:
+            durations, edges = synthetic_portfolio(size, args.portfolio_size)
+        else:
+            durations, edges = synthetic_project(size)
+        dates, cpm_seconds = timed(cpm.schedule_from_start, durations, edges)
+        line = f'{size:>7} tasks {len(edges):>7} edges  cpm {cpm_seconds * 1000:9.1f} ms'
+
+        edited = size // 2
+        edited_durations = durations[:edited] + [durations[edited] + 3] + durations[edited + 1:]
+        graph, graph_seconds = timed(cpm.ScheduleGraph, edited_durations, edges)
+        updated = [list(column) for column in dates]
+        moved, propagate_seconds = timed(cpm.update_from_start, graph, updated, [edited], [edited])
+        failures += updated != [list(column) for column in cpm.schedule_from_start(edited_durations, edges)]
+        line += (f'  update {(graph_seconds + propagate_seconds) * 1000:8.1f} ms'
+                 f' (propagate {propagate_seconds * 1000:6.2f} ms) moved {len(moved):>6}')
+
+        if cpm_numpy.available():
+            numpy_dates, numpy_seconds = timed(cpm_numpy.schedule_from_start, durations, edges)
+            equal = (numpy_dates == dates and cpm_numpy.schedule_from_finish(durations, edges)
+                     == cpm.schedule_from_finish(durations, edges))
+            failures += not equal
+            line += (f'  numpy {numpy_seconds * 1000:9.1f} ms x{cpm_seconds / numpy_seconds:.1f}'
+                     f' {"equal" if equal else "DIFFERENT"}')
+
+        if size <= args.legacy_max:
+            legacy, legacy_seconds = timed(legacy_schedule_from_start, durations, edges, project_start)
+            mismatched = sum(
+                1 for i, r in legacy.items()
+                if [r['early_start'], r['early_finish'], r['late_start'], r['late_finish']]
+                != [project_start + timedelta(days=d) for d in (dates[0][i], dates[1][i],
+                                                                 dates[2][i], dates[3][i])]
+            )
+            line += (f'  legacy {legacy_seconds * 1000:10.1f} ms x{legacy_seconds / cpm_seconds:.1f}'
+                     f' mismatched {mismatched}')
+        print(line)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+# Part of IPAI PPM Clarity. See LICENSE file for full copyright and licensing details.
+
+"""
+NumPy engine for the CPM passes, for very large schedules.
+
+Same inputs, outputs and rules as cpm.schedule_from_start and
+cpm.schedule_from_finish. It gives the same float results, because it
+applies the same additions and max/min to the same operands.
+
+Tasks are grouped into topological levels: a task's level is the
+longest chain of dependencies leading to it, so all of its predecessors
+are on lower levels. The forward pass handles one level per step and
+reduces the candidate starts of all edges into that level with
+np.maximum.at. The backward pass walks the levels down and uses
+np.minimum.at. The Python loop runs once per level rather than once per
+task, which pays off on wide graphs such as portfolios of many
+projects, not on long chains.
+
+NumPy is optional: `np` is None when it is not installed, and callers
+check `available()`.
+"""
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from . import cpm
+
+
+def available():
+    return np is not None
+
+
+class LevelGraph:
+    """Edge arrays and topological levels for one set of tasks."""
+
+    def __init__(self, durations, edges):
+        size = len(durations)
+        self.durations = np.asarray(durations, dtype=np.float64)
+        if edges:
+            pred, succ, dep_types, lags = zip(*edges)
+        else:
+            pred = succ = dep_types = lags = ()
+        self.pred = np.asarray(pred, dtype=np.int64)
+        self.succ = np.asarray(succ, dtype=np.int64)
+        dep_types = np.asarray(dep_types, dtype='U2')
+        self.from_finish = np.isin(dep_types, [t for t, f in cpm.FROM_FINISH.items() if f])
+        self.to_finish = np.isin(dep_types, [t for t, f in cpm.TO_FINISH.items() if f])
+        self.lag = np.nan_to_num(np.asarray(lags, dtype=np.float64))  # a missing lag is 0
+        self.level = self._levels(size)
+        if self.level is None:
+            # Let the pure-Python graph find and report the cycle
+            cpm.ScheduleGraph(durations, edges)
+        self.has_pred = np.bincount(self.succ, minlength=size) > 0
+        self.has_succ = np.bincount(self.pred, minlength=size) > 0
+
+    def _levels(self, size):
+        """Level of each task by Kahn's algorithm one layer at a time, or None on a cycle."""
+        indegree = np.bincount(self.succ, minlength=size)
+        by_pred = np.argsort(self.pred, kind='stable')
+        succ_by_pred = self.succ[by_pred]
+        first_edge = np.concatenate(([0], np.cumsum(np.bincount(self.pred, minlength=size))))
+
+        level = np.empty(size, dtype=np.int64)
+        frontier = np.flatnonzero(indegree == 0)
+        depth = placed = 0
+        while frontier.size:
+            level[frontier] = depth
+            placed += frontier.size
+            starts = first_edge[frontier]
+            counts = first_edge[frontier + 1] - starts
+            total = counts.sum()
+            if not total:
+                break
+            # Positions of every edge leaving the frontier, in by_pred order
+            offsets = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(total)
+            targets = succ_by_pred[offsets]
+            indegree -= np.bincount(targets, minlength=size)
+            frontier = np.unique(targets[indegree[targets] == 0])
+            depth += 1
+        return level if placed == size else None
+
+    def _groups(self, keys, depth):
+        """Indices sorted by level, and the bounds of each level's slice."""
+        order = np.argsort(keys, kind='stable')
+        bounds = np.searchsorted(keys[order], np.arange(depth + 1))
+        return order, bounds
+
+    def forward_pass(self, start=0.0):
+        level, pred, succ = self.level, self.pred, self.succ
+        depth = int(level.max()) + 1 if level.size else 0
+        tasks, task_bounds = self._groups(level, depth)
+        edges, edge_bounds = self._groups(level[succ], depth)
+
+        early_start = np.where(self.has_pred, -np.inf, start)
+        early_finish = early_start + self.durations
+        for current in range(1, depth):
+            group = edges[edge_bounds[current]:edge_bounds[current + 1]]
+            p = pred[group]
+            candidates = np.where(self.from_finish[group], early_finish[p], early_start[p]) + self.lag[group]
+            np.maximum.at(early_start, succ[group], candidates)
+            placed = tasks[task_bounds[current]:task_bounds[current + 1]]
+            early_finish[placed] = early_start[placed] + self.durations[placed]
+        return early_start, early_finish
+
+    def backward_pass(self, end):
+        level, pred, succ = self.level, self.pred, self.succ
+        depth = int(level.max()) + 1 if level.size else 0
+        tasks, task_bounds = self._groups(level, depth)
+        edges, edge_bounds = self._groups(level[pred], depth)
+
+        late_finish = np.where(self.has_succ, np.inf, end)
+        late_start = late_finish - self.durations
+        for current in range(depth - 1, -1, -1):
+            group = edges[edge_bounds[current]:edge_bounds[current + 1]]
+            if group.size:
+                s = succ[group]
+                candidates = np.where(self.to_finish[group], late_finish[s], late_start[s]) - self.lag[group]
+                np.minimum.at(late_finish, pred[group], candidates)
+            placed = tasks[task_bounds[current]:task_bounds[current + 1]]
+            late_start[placed] = late_finish[placed] - self.durations[placed]
+        return late_start, late_finish
+
+
+def schedule_from_start(durations, edges, start=0.0):
+    """NumPy counterpart of cpm.schedule_from_start."""
+    graph = LevelGraph(durations, edges)
+    early_start, early_finish = graph.forward_pass(start)
+    end = early_finish.max() if early_finish.size else start
+    late_start, late_finish = graph.backward_pass(end)
+    return early_start.tolist(), early_finish.tolist(), late_start.tolist(), late_finish.tolist()
+
+
+def schedule_from_finish(durations, edges, end=0.0):
+    """NumPy counterpart of cpm.schedule_from_finish."""
+    graph = LevelGraph(durations, edges)
+    late_start, late_finish = graph.backward_pass(end)
+    return late_start.tolist(), late_finish.tolist(), late_start.tolist(), late_finish.tolist()
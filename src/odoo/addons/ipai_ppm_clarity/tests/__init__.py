@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+# Part of IPAI PPM Clarity. See LICENSE file for full copyright and licensing details.
+
+from . import test_autoschedule_queries
+from . import test_autoschedule_update
+from . import test_cpm_numpy
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+# Part of IPAI PPM Clarity. See LICENSE file for full copyright and licensing details.
+
+from datetime import date, datetime, timedelta
+
+from odoo.tests import TransactionCase
+
+from ..services.autoschedule_service import SCHEDULE_FIELDS
+
+
+class TestAutoscheduleQueries(TransactionCase):
+    """The service loads and stores a schedule in a fixed number of queries, whatever its size."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.service = cls.env['ipai.autoschedule.service']
+        cls.small = cls._create_project('Small', 5)
+        cls.large = cls._create_project('Large', 40)
+
+    @classmethod
+    def _create_project(cls, name, size):
+        project = cls.env['project.project'].create({
+            'name': name,
+            'project_start_date': date(2025, 1, 6),
+        })
+        tasks = cls.env['project.task'].create([{
+            'name': f'{name} {i}',
+            'project_id': project.id,
+            'duration_days': i % 4 + 1,
+        } for i in range(size)])
+        cls.env['ipai.task.dependency'].create([{
+            'predecessor_id': tasks[max(0, i - 1 - i % 3)].id,
+            'successor_id': tasks[i].id,
+            'dependency_type': ('FS', 'SS', 'FF')[i % 3],
+            'lag_days': i % 2,
+        } for i in range(1, size)])
+        return project
+
+    def _tasks(self, project):
+        tasks = self.service._get_schedulable_tasks(project)
+        self.env.flush_all()
+        self.env.invalidate_all()
+        return tasks
+
+    def test_graph_load(self):
+        # Warm the ACL caches so only the graph query itself is counted
+        self.service._build_dependency_graph(self._tasks(self.small))
+        for project, edges in ((self.small, 4), (self.large, 39)):
+            tasks = self._tasks(project)
+            with self.assertQueryCount(1):
+                graph = self.service._build_dependency_graph(tasks)
+            self.assertEqual(sum(len(preds) for preds in graph['predecessors'].values()), edges)
+
+    def test_column_read(self):
+        for project in (self.small, self.large):
+            tasks = self._tasks(project)
+            with self.assertQueryCount(1):
+                durations, = self.service._read_task_columns(tasks, ['duration_days'])
+            self.assertEqual(durations, tasks.mapped('duration_days'))
+
+    def test_bulk_write(self):
+        origin = datetime(2025, 1, 6)
+        for project in (self.small, self.large):
+            tasks = self._tasks(project)
+            rows = [
+                [task_id, origin + timedelta(days=i), origin + timedelta(days=i + 1),
+                 origin + timedelta(days=i + 2), origin + timedelta(days=i + 3), 2.0, i % 2 == 0]
+                for i, task_id in enumerate(tasks.ids)
+            ]
+            # One UPDATE, and at most one read of the tasks' projects for modified()
+            with self.assertQueryCount(2):
+                self.service._write_schedule_fields(SCHEDULE_FIELDS, rows)
+            self.assertEqual(tasks.mapped('early_start'), [row[1] for row in rows])
+            self.assertEqual(tasks.mapped('is_critical'), [row[6] for row in rows])
+            self.assertEqual(project.critical_task_count, len(rows[::2]))
+
+    def test_run_autoschedule(self):
+        # Warm the ACL and ormcache caches on a run whose count is not checked
+        self.service.run_autoschedule(self.small, tentative=True)
+        for project in (self.small, self.large):
+            self._tasks(project)
+            # Task search, graph, durations, one bulk UPDATE, the project
+            # read and write: none of it per task
+            with self.assertQueryCount(9):
+                self.service.run_autoschedule(project, tentative=True)
+            self.assertTrue(all(project.task_ids.mapped('tentative_active')))
+            self.assertEqual(project.last_schedule_origin, datetime(2025, 1, 6))
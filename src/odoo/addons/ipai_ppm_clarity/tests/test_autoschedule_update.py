@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+# Part of IPAI PPM Clarity. See LICENSE file for full copyright and licensing details.
+
+from datetime import date
+
+from odoo.tests import TransactionCase
+
+from ..services.autoschedule_service import SCHEDULE_FIELDS, TENTATIVE_FIELDS
+
+
+class TestAutoscheduleUpdate(TransactionCase):
+    """Incremental updates after an edit must store what a full run would."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.service = cls.env['ipai.autoschedule.service']
+        cls.project = cls.env['project.project'].create({
+            'name': 'Incremental',
+            'project_start_date': date(2025, 1, 6),
+        })
+        cls.tasks = cls.env['project.task'].create([{
+            'name': f'Task {i}',
+            'project_id': cls.project.id,
+            'duration_days': duration,
+        } for i, duration in enumerate((3, 2, 4, 1, 5, 2, 3))])
+        cls.Dependency = cls.env['ipai.task.dependency']
+        cls.Dependency.create([{
+            'predecessor_id': cls.tasks[pred].id,
+            'successor_id': cls.tasks[succ].id,
+            'dependency_type': dep_type,
+            'lag_days': lag,
+        } for pred, succ, dep_type, lag in (
+            (0, 1, 'FS', 0), (1, 2, 'FS', 0), (0, 3, 'SS', 1), (3, 4, 'FF', 0),
+            (2, 5, 'FS', 2), (4, 5, 'FS', 0), (5, 6, 'SF', 1),
+        )])
+
+    def _stored(self):
+        """Stored CPM and tentative values by task, read back from the database."""
+        self.env.flush_all()
+        self.env.invalidate_all()
+        return {
+            task.id: tuple(task[fname] for fname in SCHEDULE_FIELDS + TENTATIVE_FIELDS)
+            for task in self.tasks
+        }
+
+    def assertMatchesFullRun(self, before):
+        """The incremental update moved something, and a full run stores the same values."""
+        updated = self._stored()
+        self.assertNotEqual(updated, before)
+        self.service.run_autoschedule(self.project, tentative=True)
+        self.assertEqual(updated, self._stored())
+        return updated
+
+    def test_edits_match_full_run(self):
+        self.service.run_autoschedule(self.project, tentative=True)
+        stored = self._stored()
+
+        self.tasks[1].duration_days = 8
+        stored = self.assertMatchesFullRun(stored)
+
+        dependency = self.Dependency.create({
+            'predecessor_id': self.tasks[4].id,
+            'successor_id': self.tasks[2].id,
+            'dependency_type': 'FS',
+            'lag_days': 6,
+        })
+        stored = self.assertMatchesFullRun(stored)
+
+        dependency.lag_days = 8
+        stored = self.assertMatchesFullRun(stored)
+
+        dependency.unlink()
+        self.assertMatchesFullRun(stored)
+
+    def test_no_update_without_schedule(self):
+        self.service.run_autoschedule(self.project, tentative=True)
+        self.project.last_schedule_origin = False
+        stored = self._stored()
+
+        self.tasks[1].duration_days = 8
+        self.Dependency.create({
+            'predecessor_id': self.tasks[4].id,
+            'successor_id': self.tasks[2].id,
+            'lag_days': 6,
+        })
+        self.assertEqual(self._stored(), stored)
+        self.assertIsNone(self.service.update_autoschedule(self.project, self.tasks.ids, self.tasks.ids))
+        # A full run does pick the edits up
+        self.service.run_autoschedule(self.project, tentative=True)
+        self.assertNotEqual(self._stored(), stored)
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+# Part of IPAI PPM Clarity. See LICENSE file for full copyright and licensing details.
+
+import random
+import unittest
+
+from odoo.tests.common import BaseCase
+
+from ..services import cpm, cpm_numpy
+
+DEP_TYPES = ('FS', 'SS', 'FF', 'SF')
+
+
+def random_dag(rng, size, max_preds=4, window=None):
+    """(durations, edges) over `size` tasks in shuffled positions, acyclic by construction."""
+    durations = [rng.choice((0, 0.5, 1, 2, 3, 5, 8, 13, rng.uniform(0, 30))) for _ in range(size)]
+    edges = []
+    for succ in range(1, size):
+        low = max(0, succ - window) if window else 0
+        for pred in {rng.randrange(low, succ) for _ in range(rng.randint(0, max_preds))}:
+            edges.append((pred, succ, rng.choice(DEP_TYPES), rng.choice((None, 0, 0, 1, 2.5, -1, -3))))
+    # Shuffle positions so the topological order is not the index order
+    shuffled = list(range(size))
+    rng.shuffle(shuffled)
+    durations = [durations[old] for old in sorted(range(size), key=shuffled.__getitem__)]
+    edges = [(shuffled[p], shuffled[s], t, lag) for p, s, t, lag in edges]
+    rng.shuffle(edges)
+    return durations, edges
+
+
+@unittest.skipUnless(cpm_numpy.available(), 'NumPy is not installed')
+class TestCpmNumpy(BaseCase):
+    """cpm_numpy must give exactly the dates cpm gives, and reject the same graphs."""
+
+    def assertSameSchedule(self, durations, edges, start=0.0, end=0.0):
+        for numpy_schedule, schedule, origin in ((cpm_numpy.schedule_from_start, cpm.schedule_from_start, start),
+                                                 (cpm_numpy.schedule_from_finish, cpm.schedule_from_finish, end)):
+            self.assertEqual([list(dates) for dates in numpy_schedule(durations, edges, origin)],
+                             [list(dates) for dates in schedule(durations, edges, origin)])
+
+    def test_random_dags(self):
+        for seed in range(40):
+            rng = random.Random(seed)
+            size = rng.choice((1, 2, 5, 20, 100, 400))
+            shape = rng.choice(({}, {'window': 3}, {'max_preds': 1}, {'max_preds': 8, 'window': 20}))
+            durations, edges = random_dag(rng, size, **shape)
+            with self.subTest(seed=seed, size=size, edges=len(edges)):
+                self.assertSameSchedule(durations, edges, start=rng.choice((0.0, 3.0, -2.5)),
+                                        end=rng.choice((0.0, 40.0, 7.25)))
+
+    def test_portfolio(self):
+        # Independent projects side by side: the wide graphs the engine is for
+        rng = random.Random(7)
+        durations, edges = [], []
+        for _ in range(30):
+            project_durations, project_edges = random_dag(rng, rng.randint(1, 40), window=10)
+            base = len(durations)
+            durations += project_durations
+            edges += [(p + base, s + base, t, lag) for p, s, t, lag in project_edges]
+        self.assertSameSchedule(durations, edges, start=1.0, end=90.0)
+
+    def test_chain(self):
+        durations = [1, 2, 3, 4]
+        edges = [(0, 1, 'FS', 0), (1, 2, 'FS', 1), (2, 3, 'SS', 0)]
+        self.assertSameSchedule(durations, edges)
+        self.assertEqual(cpm_numpy.schedule_from_start(durations, edges)[0], [0, 1, 4, 4])
+
+    def test_parallel_edges(self):
+        # Two dependencies between the same pair; the tighter one wins
+        self.assertSameSchedule([2, 1], [(0, 1, 'FS', 0), (0, 1, 'SS', 5)])
+
+    def test_empty(self):
+        self.assertSameSchedule([], [])
+        self.assertSameSchedule([3, 4], [], start=2.0, end=9.0)
+
+    def test_cycles_rejected(self):
+        cases = [
+            ([1], [(0, 0, 'FS', 0)]),
+            ([1, 1], [(0, 1, 'FS', 0), (1, 0, 'SS', 0)]),
+            ([1, 2, 3, 4], [(0, 1, 'FS', 0), (1, 2, 'FS', 0), (2, 3, 'FS', 0), (3, 1, 'FF', 0)]),
+        ]
+        # A cycle hidden in an otherwise random graph
+        durations, edges = random_dag(random.Random(3), 50)
+        cases.append((durations, edges + [(edges[0][1], edges[0][0], 'FS', 0)]))
+        for durations, edges in cases:
+            for schedule in (cpm.schedule_from_start, cpm.schedule_from_finish,
+                             cpm_numpy.schedule_from_start, cpm_numpy.schedule_from_finish):
+                with self.subTest(edges=len(edges), schedule=f'{schedule.__module__}.{schedule.__name__}'):
+                    with self.assertRaises(cpm.CycleError) as caught:
+                        schedule(durations, edges)
+                    self.assertCycle(caught.exception.cycle, edges)
+
+    def assertCycle(self, cycle, edges):
+        """`cycle` lists tasks in dependency order, each depending on the one before."""
+        self.assertTrue(cycle)
+        pairs = {(pred, succ) for pred, succ, _type, _lag in edges}
+        for index, task in enumerate(cycle):
+            self.assertIn((cycle[index - 1], task), pairs)
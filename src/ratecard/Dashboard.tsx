@@ -16,10 +16,7 @@ export function Dashboard({ requests, userRole }: DashboardProps) {
 
   const totalValue = requests
     .filter((r) => r.state === "approved")
-    .reduce((sum, r) => {
-      const totals = JSON.parse(r.totals_json || "{}");
-      return sum + (totals.grand_total || 0);
-    }, 0);
+    .reduce((sum, r) => sum + (r.grand_total || 0), 0);
 
   const stats = [
     {
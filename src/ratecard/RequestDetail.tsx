@@ -79,7 +79,6 @@ export function RequestDetail({
     });
   };
 
-  const totals = JSON.parse(request.totals_json || "{}");
   const isOwner = request.am_email === userEmail;
   const canSubmit = userRole === "AM" && isOwner && request.state === "draft";
   const canApprove = userRole === "FD" && ["submitted", "fd_review"].includes(request.state);
@@ -208,16 +207,16 @@ export function RequestDetail({
         <CardContent className="pt-6 space-y-2">
           <div className="flex justify-between">
             <span>Subtotal:</span>
-            <span>₱{totals.subtotal?.toLocaleString() || "0"}</span>
+            <span>₱{request.subtotal?.toLocaleString() || "0"}</span>
           </div>
           <div className="flex justify-between">
             <span>Tax (12%):</span>
-            <span>₱{totals.tax?.toLocaleString() || "0"}</span>
+            <span>₱{request.tax?.toLocaleString() || "0"}</span>
           </div>
           <Separator />
           <div className="flex justify-between text-lg" style={{ color: "#D4AC0D" }}>
             <span>Grand Total:</span>
-            <span>₱{totals.grand_total?.toLocaleString() || "0"}</span>
+            <span>₱{request.grand_total?.toLocaleString() || "0"}</span>
           </div>
         </CardContent>
       </Card>
@@ -46,8 +46,6 @@ export function RequestList({ requests, onSelectRequest }: RequestListProps) {
   return (
     <div className="space-y-3">
       {requests.map((request) => {
-        const totals = JSON.parse(request.totals_json || "{}");
-        
         return (
           <Card 
             key={request.id} 
@@ -85,7 +83,7 @@ export function RequestList({ requests, onSelectRequest }: RequestListProps) {
                 <div>
                   <div className="text-xs text-muted-foreground">Grand Total</div>
                   <div className="text-lg" style={{ color: "#D4AC0D" }}>
-                    ₱{totals.grand_total?.toLocaleString() || "0"}
+                    ₱{request.grand_total?.toLocaleString() || "0"}
                   </div>
                 </div>
                 <div className="text-right">
@@ -34,6 +34,11 @@ export interface Request {
   client_name?: string;
   am_email: string;
   state: RequestState;
+  subtotal: number;
+  tax: number;
+  grand_total: number;
+  currency: string;
+  /** Extension fields only; the totals above are typed columns */
   totals_json: string;
   notes?: string;
   created_at: string;